@@ -2,61 +2,33 @@ import pandas as pd
 import numpy as np
 import ROOT 
 import uproot
+from TBAna_Reader import ReadDF, PrefetchDF
+from TBAna_Noise import GetPMTnoise
+from TBAna_Hist import FillROOT
+from TBAna_Func import PolyFunction
+from TBAna_Fit import FitGaus, FitPoly
 
 
 infolder = "/home/storage/data_apareti/TB24/EnergyScan/"
-pedfolder = "/home/storage/data_apareti/TB24/PedestalRuns/"
 treename = "Ftree"
 
-def GetPMTnoise():
-    print("\n... Calculating PMT noise")
-
-    PedestalRuns = ["0771", "0777", "0780", "0781", "0784", "0796"]
-
-    PmtNoiseHistS = ROOT.TH1D("PmtNoiseHistS", "PmtNoiseHistS", 100, -5., 5.)
-    PmtNoiseHistC = ROOT.TH1D("PmtNoiseHistC", "PmtNoiseHistC", 100, -5., 5.)
-
-    for index, run in enumerate(PedestalRuns):
-        filename = "physics_sps2024_run" + run + ".root"
-
-        root_file = uproot.open(pedfolder+filename)
-        tree = root_file[treename]
-        data = tree.arrays(library="pd")    
-
-        print(filename, data)
-        for pmtS, pmtC in zip(data["totPMTSene"], data["totPMTCene"]):
-            PmtNoiseHistS.Fill(pmtS)
-            PmtNoiseHistC.Fill(pmtC)
-
-    cNoise = ROOT.TCanvas("cNoise", "cNoise", 1400, 1200)
-    PmtNoiseHistS.SetLineColor(ROOT.kRed); PmtNoiseHistS.SetLineWidth(2);  PmtNoiseHistS.Draw()      
-    PmtNoiseHistC.SetLineColor(ROOT.kBlue); PmtNoiseHistC.SetLineWidth(2);  PmtNoiseHistC.Draw("same")
-
-    PmtNoiseHistS.Fit("gaus"); PmtNoiseHistC.Fit("gaus")
-    RmsNoiseS = PmtNoiseHistS.GetFunction("gaus").GetParameter(2)
-    RmsNoiseC = PmtNoiseHistC.GetFunction("gaus").GetParameter(2)
-    print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
-
-    cNoise.Draw()
-    cNoise.SaveAs("Noise.png")
-    return(RmsNoiseS, RmsNoiseC)
-
-
+# Variables derived from the Ftree branches in GetDFparametrization
+derivedVars = {
+    # define Asymmetry variable
+    "AsymS" : "(TS11 - TS15) / (TS11 + TS15)",
+    "AsymC" : "(TC11 - TC15) / (TC11 + TC15)",
+    # define partial barycenter variable
+    "BaryS" : "(TS00 - 28.3*TS11 + 28.3*TS15) / (TS00 + TS11 + TS15)",
+    "BaryC" : "(TC00 - 28.3*TC11 + 28.3*TC15) / (TC00 + TC11 + TC15)"
+}
 
+# Other branches used after GetDFparametrization (main())
+readBranches = ["totPMTSene", "totPMTCene", "YDWC2"]
 
 def GetDFparametrization(run, Cut, filename, energy): 
     print("Using file: ", filename, energy)
-    root_file = uproot.open(infolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=Cut, library="pd")
-
-    # define Asymmetry variable 
-    data["AsymS"] = (data["TS11"] - data["TS15"]) / (data["TS11"] + data["TS15"] )
-    data["AsymC"] = (data["TC11"] - data["TC15"]) / (data["TC11"] + data["TC15"] )
-
-    # define partial barycenter variable 
-    data["BaryS"] = (data["TS00"]-28.3*data["TS11"]+28.3*data["TS15"])/(data["TS00"]+data["TS11"]+data["TS15"])
-    data["BaryC"] = (data["TC00"]-28.3*data["TC11"]+28.3*data["TC15"])/(data["TC00"]+data["TC11"]+data["TC15"])
+    # read only the branches used by the cut, the derived variables and main()
+    data = ReadDF(infolder+filename, Cut, derivedVars, readBranches)
 
     # input truth energy to dataframe
     data["TruthE"] = energy
@@ -65,13 +37,11 @@ def GetDFparametrization(run, Cut, filename, energy):
     eneSprof = ROOT.TProfile("eneSprof_{0}GeV".format(energy), "S Energy profile over Asymmetry {0}GeV; TS11-TS15 / TS11 + TS15; totPMTSene/E".format(energy), 100, -1, 1)
     eneCprof = ROOT.TProfile("eneCprof_{0}GeV".format(energy), "C Energy profile over Asymmetry {0}GeV; TC11-TC15 / TC11 + TC15; totPMTCene/E".format(energy), 100, -1, 1)
 
-    for eneS, asymS, eneC, asymC in zip(data["totPMTSene"].values, data["AsymS"].values, data["totPMTCene"].values, data["AsymC"].values):
-        eneSprof.Fill(asymS, eneS/energy)
-        eneCprof.Fill(asymC, eneC/energy)
+    FillROOT(eneSprof, data["AsymS"].values, data["totPMTSene"].values/energy)
+    FillROOT(eneCprof, data["AsymC"].values, data["totPMTCene"].values/energy)
 
     # Fit with 5 degree polynomial
-    eneSprof.Fit("pol5", "", "", -0.9, 0.9)
-    eneCprof.Fit("pol5", "", "", -0.9, 0.9)
+    FitPoly([eneSprof, eneCprof], 5, -0.9, 0.9)
 
     # Get fitted function
     funcS = eneSprof.GetFunction("pol5")
@@ -93,9 +63,8 @@ def DrawEnergyHist(dfs, energies, binning_S, binning_C, varname_S, varname_C):
         histS = ROOT.TH1D("histS{0}".format(energy), "histS{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
         histC = ROOT.TH1D("histC{0}".format(energy), "histC{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
 
-        for varS, varC in zip(df[varname_S], df[varname_C]): 
-            histS.Fill(varS)
-            histC.Fill(varC)
+        FillROOT(histS, df[varname_S].values)
+        FillROOT(histC, df[varname_C].values)
         histS.SetLineColor(i+1)
         histC.SetLineColor(i+1)
 
@@ -187,12 +156,18 @@ def main():
     MeanVec_C=[]; RmsVec_C=[]; MeanErrVec_C=[]; RmsErrVec_C=[] 
     MeanVec_Comb=[]; RmsVec_Comb=[]; MeanErrVec_Comb=[]; RmsErrVec_Comb=[] 
     
+    # cut of each run (with its DWC cuts), the same strings for the prefetching
+    # and the reads of the loop
+    runCuts = [myCut + " & (XDWC2 > {0}) & (XDWC2 < {1}) & (YDWC2 > {2}) & (YDWC2 < {3})".format(cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index]) for index in range(len(runs))]
+    # read the next run in the background while the current one is analysed
+    PrefetchDF([(infolder + "physics_sps2024_run" + run + ".root", runCut, derivedVars, readBranches) for run, runCut in zip(runs, runCuts)])
+
     for index, (run, energy) in enumerate(zip(runs, energies)):
         filename = "physics_sps2024_run" + run + ".root"
         print(filename, energy)
         ROOT.gStyle.SetOptFit(0)
         print("Current cuts on DWCs: ", cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index])
-        CurrentCut = myCut + " & (XDWC2 > {0}) & (XDWC2 < {1}) & (YDWC2 > {2}) & (YDWC2 < {3})".format(cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index]) 
+        CurrentCut = runCuts[index]
 
         df, funcS, funcC, eneSprof, eneCprof = GetDFparametrization(run, CurrentCut, filename, energy)
 
@@ -220,14 +195,14 @@ def main():
         ctest.SaveAs("EnergyProfOverAsymmetry_{0}GeV.png".format(energy))        
 
 
-    fS10  = np.vectorize(FitS[0].Eval); fC10  = np.vectorize(FitC[0].Eval)  
-    fS20  = np.vectorize(FitS[1].Eval); fC20  = np.vectorize(FitC[1].Eval)
-    fS30  = np.vectorize(FitS[2].Eval); fC30  = np.vectorize(FitC[2].Eval)
-    fS40  = np.vectorize(FitS[3].Eval); fC40  = np.vectorize(FitC[3].Eval)
-    fS60  = np.vectorize(FitS[4].Eval); fC60  = np.vectorize(FitC[4].Eval)
-    fS80  = np.vectorize(FitS[5].Eval); fC80  = np.vectorize(FitC[5].Eval)
-    fS100  = np.vectorize(FitS[6].Eval); fC100  = np.vectorize(FitC[6].Eval)
-    fS120  = np.vectorize(FitS[7].Eval); fC120  = np.vectorize(FitC[7].Eval)
+    fS10  = PolyFunction(FitS[0]); fC10  = PolyFunction(FitC[0])  
+    fS20  = PolyFunction(FitS[1]); fC20  = PolyFunction(FitC[1])
+    fS30  = PolyFunction(FitS[2]); fC30  = PolyFunction(FitC[2])
+    fS40  = PolyFunction(FitS[3]); fC40  = PolyFunction(FitC[3])
+    fS60  = PolyFunction(FitS[4]); fC60  = PolyFunction(FitC[4])
+    fS80  = PolyFunction(FitS[5]); fC80  = PolyFunction(FitC[5])
+    fS100  = PolyFunction(FitS[6]); fC100  = PolyFunction(FitC[6])
+    fS120  = PolyFunction(FitS[7]); fC120  = PolyFunction(FitC[7])
 
     binning_S = [0, 25, 53, 97]
     binning_C = [0, 25, 53, 97]
@@ -314,11 +289,10 @@ def main():
         HistCombCorrected = ROOT.TH1D("HistCombcorrected_{0}GeV".format(energy), "Combined Energy (corrected) {0}GeV; E [GeV]; Counts".format(energy), 100, energy-0.4*energy, energy+0.4*energy)
 
 
-        for eneS, pmtS, eneC, pmtC in zip(data["energyS"].values, data["totPMTSene"].values, data["energyC"].values, data["totPMTCene"].values):
-            HistScorrected.Fill(eneS)
-            HistSraw.Fill(pmtS)
-            HistCcorrected.Fill(eneC)
-            HistCraw.Fill(pmtC)
+        FillROOT(HistScorrected, data["energyS"].values)
+        FillROOT(HistSraw, data["totPMTSene"].values)
+        FillROOT(HistCcorrected, data["energyC"].values)
+        FillROOT(HistCraw, data["totPMTCene"].values)
 
 
         dfCorrected_array.append(data)
@@ -328,10 +302,9 @@ def main():
         #data_filtered = data[ (np.abs(data["AsymS"])<AsymCut ) & (np.abs(data["AsymC"])<AsymCut ) & (np.abs(data["BaryS"])<4) & (np.abs(data["BaryC"])<4) ]
         data_filtered = data[ (np.abs(data["AsymS"])<AsymCut ) & (np.abs(data["AsymC"])<AsymCut ) ]
 
-        for eneS, eneC in zip(data_filtered["energyS"].values, data_filtered["energyC"].values):
-            HistScorrected_Asymcut.Fill(eneS)
-            HistCcorrected_Asymcut.Fill(eneC)
-            HistCombCorrected.Fill( (eneS+eneC)/2 )
+        FillROOT(HistScorrected_Asymcut, data_filtered["energyS"].values)
+        FillROOT(HistCcorrected_Asymcut, data_filtered["energyC"].values)
+        FillROOT(HistCombCorrected, (data_filtered["energyS"].values+data_filtered["energyC"].values)/2)
 
 
 
@@ -348,11 +321,10 @@ def main():
 
 
 
-        for pmtS, eneS, pmtC, eneC, ydwc2 in zip(data["totPMTSene"], data["energyS"], data["totPMTCene"], data["energyC"], data["YDWC2"]):
-            SciEneVsYDWCprof.Fill(ydwc2, eneS)
-            SpmtVsYDWCprof.Fill(ydwc2, pmtS)
-            CerEneVsYDWCprof.Fill(ydwc2, eneC)
-            CpmtVsYDWCprof.Fill(ydwc2, pmtC)
+        FillROOT(SciEneVsYDWCprof, data["YDWC2"].values, data["energyS"].values)
+        FillROOT(SpmtVsYDWCprof, data["YDWC2"].values, data["totPMTSene"].values)
+        FillROOT(CerEneVsYDWCprof, data["YDWC2"].values, data["energyC"].values)
+        FillROOT(CpmtVsYDWCprof, data["YDWC2"].values, data["totPMTCene"].values)
 
 
         SciEneVsYDWCprof.SetLineColor(ROOT.kRed); SciEneVsYDWCprof.SetLineWidth(2); SciEneVsYDWCprof.SetMarkerColor(ROOT.kRed); SciEneVsYDWCprof.SetMarkerStyle(55)
@@ -399,15 +371,13 @@ def main():
 
 
 
-        for pmtS, pmtC, ydwc2, barS, barC in zip(data["totPMTSene"], data["totPMTCene"], data["YDWC2"], data["BaryS"], data["BaryC"]):
-            BarycenterEneProfS.Fill(barS, pmtS)
-            YDWCBarycenterProfS.Fill(ydwc2, barS)
-            BarycenterEneProfC.Fill(barC, pmtC)
-            YDWCBarycenterProfC.Fill(ydwc2, barC)
+        FillROOT(BarycenterEneProfS, data["BaryS"].values, data["totPMTSene"].values)
+        FillROOT(YDWCBarycenterProfS, data["YDWC2"].values, data["BaryS"].values)
+        FillROOT(BarycenterEneProfC, data["BaryC"].values, data["totPMTCene"].values)
+        FillROOT(YDWCBarycenterProfC, data["YDWC2"].values, data["BaryC"].values)
 
-        for pmtS, barS, asymS, pmtC, barC, asymC in zip(data["totPMTSene"], data["BaryS"], data["AsymS"], data["totPMTCene"], data["BaryC"], data["AsymC"]):    
-            SpmtAsymBarHist.Fill(asymS, barS, pmtS)
-            CpmtAsymBarHist.Fill(asymC, barC, pmtC)
+        FillROOT(SpmtAsymBarHist, data["AsymS"].values, data["BaryS"].values, data["totPMTSene"].values)
+        FillROOT(CpmtAsymBarHist, data["AsymC"].values, data["BaryC"].values, data["totPMTCene"].values)
 
 
         
@@ -515,21 +485,9 @@ def main():
                    
             
 
-        HistScorrected_Asymcut.Fit("gaus", "Q")
-        fitS = HistScorrected_Asymcut.GetFunction("gaus")
-
-        HistCcorrected_Asymcut.Fit("gaus", "Q")
-        fitC = HistCcorrected_Asymcut.GetFunction("gaus")
-
-        HistCombCorrected.Fit("gaus","Q")
-        fitComb = HistCombCorrected.GetFunction("gaus")
-
-
         ROOT.gStyle.SetOptFit(111)
-        # refit within -1.5 and +3 sigma
-        HistScorrected_Asymcut.Fit("gaus", "Q", "", fitS.GetParameter(1)-1.5*fitS.GetParameter(2), fitS.GetParameter(1)+3*fitS.GetParameter(2)) 
-        HistCcorrected_Asymcut.Fit("gaus", "Q", "", fitC.GetParameter(1)-1.5*fitC.GetParameter(2), fitC.GetParameter(1)+3*fitC.GetParameter(2)) 
-        HistCombCorrected.Fit("gaus", "Q", "", fitComb.GetParameter(1)-1.5*fitComb.GetParameter(2), fitComb.GetParameter(1)+3*fitComb.GetParameter(2)) 
+        # fit, then refit within -1.5 and +3 sigma (all three histograms at once)
+        FitGaus([HistScorrected_Asymcut, HistCcorrected_Asymcut, HistCombCorrected], 1.5, 3)
 
 
         scihist = ROOT.TCanvas("cSciEnergy{0}".format(energy), "cSciEnergy{0}".format(energy), 1400, 1200)
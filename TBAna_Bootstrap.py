@@ -0,0 +1,137 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Bootstrap of the energy resolution  #####
+#############################################
+# Uncertainties of the peak mean and sigma of every energy, and of the
+# stochastic and constant terms of sigma/E = a/sqrt(E) (+) b, from bootstrap
+# replicas: the selected events of each run are resampled with replacement
+# and the whole chain (peak fits, resolution fit) is repeated on each replica.
+# The event arrays are put once in shared memory; the worker processes
+# (TBAna_Parallel) attach to it without copying and run a block of replicas
+# each. Every replica has its own random stream (SeedSequence.spawn), so the
+# replicas are the same for any number of workers.
+# The arrays are sorted once: a resampled array is np.repeat of the sorted
+# values by their number of draws, already sorted for the unbinned peak fit
+# (TBAna_Unbinned).
+# The peaks of the replicas are fitted with the estimator of the quoted values
+# (peakFit, windows and binnings as given by the caller): "binned", the
+# gaussian fits of the histograms (TBAna_Fit, first over the histogram range,
+# then in each window), or "unbinned", the unbinned fits with the histogram
+# range as first fit range.
+
+import numpy as np
+from multiprocessing import shared_memory
+from scipy import optimize
+from TBAna_Parallel import MapRuns, nWorkers
+from TBAna_Unbinned import UnbinnedGausFit
+from TBAna_Hist import Hist1D, Fill
+from TBAna_Fit import IterativeGausFit
+
+# number of replicas and seed of the random streams
+nReplicas = 200
+bootstrapSeed = 2024
+
+
+def ShareArrays(arrays):
+    # Copy the arrays (sorted, float64) to shared memory blocks; return the
+    # blocks (to close and unlink) and the (name, length) of each array
+    blocks = []
+    for array in arrays:
+        array = np.sort(np.asarray(array, dtype=np.float64))
+        block = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+        np.ndarray(array.shape, dtype=np.float64, buffer=block.buf)[:] = array
+        blocks.append(block)
+    return blocks, [(block.name, len(array)) for block, array in zip(blocks, arrays)]
+
+
+def AttachArrays(descriptors):
+    # Arrays of ShareArrays in another process, without copying
+    blocks = [shared_memory.SharedMemory(name=name) for name, length in descriptors]
+    return blocks, [np.ndarray((length,), dtype=np.float64, buffer=block.buf) for block, (name, length) in zip(blocks, descriptors)]
+
+
+def Resolution(energy, a, b):
+    # sigma/E = a/sqrt(E) (+) b
+    return np.sqrt(a*a/energy + b*b)
+
+
+def ResolutionFit(energies, mean, sigma, meanErr, sigmaErr):
+    # Stochastic and constant terms of sigma/mean, with the errors of TBAna_Plot
+    energies = np.asarray(energies, dtype=np.float64)
+    sigmaOverE = sigma/mean
+    errors = np.sqrt((meanErr/mean)**2 + (sigmaErr/sigma)**2)*sigmaOverE
+    try:
+        (a, b), cov = optimize.curve_fit(Resolution, energies, sigmaOverE, p0=[0.1, 0.01], sigma=errors, absolute_sigma=True)
+    except (RuntimeError, ValueError):
+        return np.nan, np.nan
+    return abs(a), abs(b)
+
+
+def PeakFits(samples, peakFit, windows, binnings):
+    # Mean, sigma and their errors (arrays, one value per run) of the peaks of
+    # the samples, with the estimator of the quoted values: binnings are the
+    # (bins, xmin, xmax) of the histograms of the runs (None: no histogram
+    # range for the unbinned fits)
+    if(peakFit == "binned"):
+        hists = [Fill(Hist1D("replica{0}".format(i), "replica{0}".format(i), *binning), values) for i, (values, binning) in enumerate(zip(samples, binnings))]
+        result = IterativeGausFit(hists, windows)
+        return [result[key] for key in ["mean", "sigma", "meanErr", "sigmaErr"]]
+    fits = [UnbinnedGausFit(values, windows, fitRange=None if binnings is None else binnings[i][1:]) for i, values in enumerate(samples)]
+    return [np.array([fit[key] for fit in fits]) for key in ["mean", "sigma", "meanErr", "sigmaErr"]]
+
+
+def Replica(arrays, energies, seed, peakFit="unbinned", windows=[(1.5, 1.5)]*3, binnings=None):
+    # Peak fits of one resampled replica of the runs (see PeakFits), and its
+    # resolution fit
+    rng = np.random.default_rng(seed)
+    samples = []
+    for values in arrays:
+        counts = np.bincount(rng.integers(0, len(values), len(values)), minlength=len(values))
+        samples.append(np.repeat(values, counts))
+    mean, sigma, meanErr, sigmaErr = PeakFits(samples, peakFit, windows, binnings)
+    stochastic, constant = ResolutionFit(energies, mean, sigma, meanErr, sigmaErr)
+    return mean, sigma, stochastic, constant
+
+
+def BootstrapReplicas(descriptors, energies, seeds, estimator):
+    # Worker: the replicas of the given seeds on the shared arrays
+    blocks, arrays = AttachArrays(descriptors)
+    try:
+        replicas = [Replica(arrays, energies, seed, *estimator) for seed in seeds]
+    finally:
+        del arrays
+        for block in blocks:
+            block.close()
+    return replicas
+
+
+def Bootstrap(arrays, energies, replicas=None, workers=None, peakFit="unbinned", windows=[(1.5, 1.5)]*3, binnings=None):
+    # Bootstrap replicas of the runs (one array of selected energies per run),
+    # the peaks fitted as the quoted values (peakFit, windows, binnings: see
+    # PeakFits)
+    # Return a dict: mean and sigma (replicas x runs), stochastic and constant
+    # (replicas)
+    replicas = nReplicas if replicas is None else replicas
+    workers = nWorkers if workers is None else workers
+    seeds = np.random.SeedSequence(bootstrapSeed).spawn(replicas)
+    # one block of replicas per worker
+    seedBlocks = [list(block) for block in np.array_split(np.array(seeds, dtype=object), max(1, min(workers, replicas)))]
+    blocks, descriptors = ShareArrays(arrays)
+    try:
+        estimator = (peakFit, windows, binnings)
+        results = MapRuns(BootstrapReplicas, [descriptors]*len(seedBlocks), [energies]*len(seedBlocks), seedBlocks, [estimator]*len(seedBlocks), workers=workers)
+    finally:
+        for block in blocks:
+            block.close(); block.unlink()
+    results = [replica for block in results for replica in block]
+    return {"mean": np.array([r[0] for r in results]), "sigma": np.array([r[1] for r in results]),
+            "stochastic": np.array([r[2] for r in results]), "constant": np.array([r[3] for r in results])}
+
+
+def BootstrapSummary(values):
+    # Median, standard deviation and 68% interval (16th, 84th percentiles) of
+    # the replicas (along the first axis)
+    values = np.asarray(values, dtype=np.float64)
+    low, median, high = np.nanpercentile(values, [15.865, 50, 84.135], axis=0)
+    return median, np.nanstd(values, axis=0, ddof=1), low, high
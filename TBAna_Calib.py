@@ -0,0 +1,233 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Streaming tower calibration         #####
+#############################################
+# The tower weights w minimise sum_events (A w - E)^2, A the (events x 36)
+# tower energies (TBAna_Towers) and E the beam energy. The sum only depends
+# on the 36x36 matrix A^T A, the vector A^T E and E^T E, which are accumulated
+# chunk by chunk (IterateDF), for one or several calibration runs: every
+# selected event is used, in constant memory, and the system is solved once.
+# The sums are accumulated in double precision. Calibrators of different
+# runs or workers are combined by adding their sums (MergeCalib).
+# Without bounds the weights are the least-squares solution of the normal
+# equations; with bounds, the same problem is solved by lsq_linear on the 36x36
+# Cholesky factor of A^T A (same minimum as lsq_linear on the whole A), or on
+# its eigen-decomposition if A^T A is singular (e.g. a dead tower). A ridge term
+# ridge*|w - prior|^2 can be added to regularise towers with few hits.
+# Every selected event is accumulated by default. Optionally (calibSplit) the
+# events are split by entry number: only a part of them is accumulated, the
+# others (TestEvents) are kept to test the weights on events they were not
+# fitted on.
+# Joint calibration of an energy scan: the sums of each run are accumulated
+# once with a unit target (A^T 1 = sum of A, 1^T 1 = events) and saved in
+# statsfolder; the target energy E of the run only scales them (E A^T 1,
+# E^2 events), so the scan is solved from the saved 36x36 sums of all its runs
+# with any target energies or run weights, and adding a run reads only the
+# events of the new run. With relative=True the residuals of a run are divided
+# by its energy (|A w - E|^2/E^2), so that the high energies do not dominate.
+# The bounded solution can start from previous weights (x0, warm start).
+# CalibrateScan keeps the weights in the parametrisation store (TBAna_ParStore)
+# with a key of the runs and settings, and warm-starts from the latest version.
+
+import os
+import numpy as np
+from scipy import optimize
+from TBAna_Reader import IterateDF, towerBranchesS, towerBranchesC
+from TBAna_Towers import TowerMatrix, TowersS, TowersC
+from TBAna_Store import CacheKey
+from TBAna_ParStore import ParKey, LoadPars, StoredPars
+from TBAna_Parallel import MapRuns
+
+# chunks of the calibration runs
+calibStep = "100 MB"
+# None calibrates on every event; with a number, only the events with
+# entry % calibSplit == 0 calibrate, the others are held out for the tests
+calibSplit = None
+# saved sums of the calibration runs, None to always read the events again
+statsfolder = "/home/storage/data_apareti/TB24/CalibStats/"
+
+
+def Calibrator(nTowers=36):
+    # Empty sums: AtA, Atb, btb, number of events, sum of A (tower means)
+    return {"AtA": np.zeros((nTowers, nTowers)), "Atb": np.zeros(nTowers), "btb": 0., "events": 0, "sumA": np.zeros(nTowers)}
+
+
+def Accumulate(calib, A, b):
+    # Add the events of A (events x towers) with targets b (events) to calib
+    A = np.asarray(A, dtype=np.float64)
+    b = np.broadcast_to(np.asarray(b, dtype=np.float64), (len(A),))
+    calib["AtA"] += A.T @ A
+    calib["Atb"] += A.T @ b
+    calib["btb"] += float(b @ b)
+    calib["events"] += len(A)
+    calib["sumA"] += A.sum(axis=0)
+    return calib
+
+
+def MergeCalib(calib, other):
+    # Add the sums of other to calib
+    for key in ["AtA", "Atb", "btb", "events", "sumA"]:
+        calib[key] = calib[key] + other[key]
+    return calib
+
+
+def TowerMeans(calib):
+    # Mean energy of each tower over the accumulated events
+    return calib["sumA"]/max(calib["events"], 1)
+
+
+def Scaled(calib, energy, weight=1.):
+    # Sums of a unit-target calibrator for the target energy, times weight
+    return {"AtA": weight*calib["AtA"], "Atb": weight*energy*calib["Atb"], "btb": weight*energy*energy*calib["btb"],
+            "events": calib["events"], "sumA": calib["sumA"]}
+
+
+def NormalFactor(M, v):
+    # R, t with w^T M w - 2 v^T w = |R w - t|^2 + constant: R = L^T, t = L^-1 v
+    # for M = L L^T; if M is singular, from the eigenvectors of its nonzero
+    # eigenvalues (R = sqrt(lambda) Q^T, t = Q^T v/sqrt(lambda))
+    try:
+        L = np.linalg.cholesky(M)
+        return L.T, np.linalg.solve(L, v)
+    except np.linalg.LinAlgError:
+        eigenvalues, Q = np.linalg.eigh(M)
+        keep = eigenvalues > eigenvalues.max()*len(M)*np.finfo(np.float64).eps
+        root = np.sqrt(eigenvalues[keep])
+        return root[:, None]*Q[:, keep].T, (Q[:, keep].T @ v)/root
+
+
+def SolveCalib(calib, bounds=None, ridge=0., prior=1., x0=None):
+    # Weights minimising |A w - b|^2 + ridge*|w - prior|^2, within bounds
+    # ((lower, upper) as in lsq_linear) if given
+    # With x0 (e.g. the weights of a previous calibration) the bounded problem
+    # is minimised iteratively starting from x0
+    # Return the weights and the sum of the squared residuals
+    n = len(calib["Atb"])
+    prior = np.broadcast_to(np.asarray(prior, dtype=np.float64), (n,))
+    M = calib["AtA"] + ridge*np.eye(n)
+    v = calib["Atb"] + ridge*prior
+    if(bounds is None):
+        # least-squares solution of the normal equations, the minimum-norm one
+        # if M is singular (e.g. a dead tower, weight 0), as lstsq on A
+        weights = np.linalg.lstsq(M, v, rcond=None)[0]
+    elif(x0 is None):
+        R, t = NormalFactor(M, v)
+        weights = optimize.lsq_linear(R, t, bounds=bounds).x
+    else:
+        # w^T M w - 2 v^T w in the variables u = w*sqrt(diag M) (unit diagonal)
+        d = np.sqrt(np.where(np.diag(M) > 0, np.diag(M), 1.))
+        Mu = M/np.outer(d, d); vu = v/d
+        lower, upper = [np.broadcast_to(np.asarray(bound, dtype=np.float64), (n,))*d for bound in bounds]
+        u0 = np.clip(np.asarray(x0, dtype=np.float64)*d, lower, upper)
+        result = optimize.minimize(lambda u: (u @ Mu @ u - 2*vu @ u, 2*(Mu @ u - vu)), u0, jac=True, method="L-BFGS-B",
+                                   bounds=optimize.Bounds(lower, upper), options={"ftol": 1e-15, "gtol": 1e-10, "maxiter": 10000})
+        weights = result.x/d
+    residuals = calib["btb"] - 2*weights @ calib["Atb"] + weights @ calib["AtA"] @ weights
+    return weights, residuals
+
+
+def CalibEvents(data):
+    # Events of data (indexed by entry number, as ReadDF and IterateDF) used
+    # for the calibration
+    return data if calibSplit is None else data[data.index % calibSplit == 0]
+
+
+def TestEvents(data):
+    # Events of data held out from the calibration
+    return data if calibSplit is None else data[data.index % calibSplit != 0]
+
+
+def StatsFile(filename, key):
+    # e.g. physics_sps2024_run0786_<key>.npz
+    run = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(statsfolder, "{0}_{1}.npz".format(run, key[:16]))
+
+
+def LoadStats(filename, key):
+    # Saved S and C sums of the run, or None
+    if(statsfolder is None or not os.path.exists(StatsFile(filename, key))):
+        return None
+    with np.load(StatsFile(filename, key)) as saved:
+        return [{name: saved[channel + name][()] for name in ["AtA", "Atb", "btb", "events", "sumA"]} for channel in ["S", "C"]]
+
+
+def SaveStats(filename, key, stats):
+    # Written to a temporary file and renamed, as the event cache (TBAna_Store)
+    if(statsfolder is None):
+        return
+    os.makedirs(statsfolder, exist_ok=True)
+    path = StatsFile(filename, key)
+    tmp = "{0}.{1}.tmp.npz".format(path[:-4], os.getpid())
+    np.savez(tmp, **{channel + name: calib[name] for channel, calib in zip(["S", "C"], stats) for name in calib})
+    os.replace(tmp, path)
+
+
+def RunStats(filename, Cut, step=None):
+    # S and C sums of the selected calibration events (CalibEvents) of a run
+    # with a unit target, read from statsfolder or accumulated in chunks of
+    # step and saved
+    key = CacheKey(filename, Cut, towerBranchesS + towerBranchesC + ["calibSplit = {0!r}".format(calibSplit)])
+    stats = LoadStats(filename, key)
+    if(stats is not None):
+        return stats
+    print("Calibration events from: ", filename)
+    statsS = Calibrator(); statsC = Calibrator()
+    for chunk in IterateDF(filename, Cut, branches=towerBranchesS + towerBranchesC, step_size=step or calibStep):
+        towers = TowerMatrix(CalibEvents(chunk))
+        Accumulate(statsS, TowersS(towers), 1.)
+        Accumulate(statsC, TowersC(towers), 1.)
+    SaveStats(filename, key, [statsS, statsC])
+    return [statsS, statsC]
+
+
+def ScanStats(filenames, Cut, step=None, workers=None):
+    # RunStats of every run, the runs without saved sums read in parallel
+    return MapRuns(RunStats, filenames, [Cut]*len(filenames), [step]*len(filenames), workers=workers)
+
+
+def JointCalib(stats, energies, relative=False, balance=False):
+    # Calibrator of the whole scan from the RunStats of its runs and their
+    # target energies; relative divides the residuals of a run by its energy,
+    # balance gives the same weight to every run whatever its events
+    calib = Calibrator(len(stats[0]["Atb"]))
+    total = sum(run["events"] for run in stats)
+    for run, energy in zip(stats, energies):
+        weight = 1.
+        if(relative):
+            weight /= energy*energy
+        if(balance):
+            weight *= total/(len(stats)*max(run["events"], 1))
+        MergeCalib(calib, Scaled(run, energy, weight))
+    return calib
+
+
+def CalibrateRuns(filenames, Cut, energies, step=None, relative=False, balance=False, workers=None):
+    # S and C calibrators of the selected events of the runs (filenames, with
+    # their beam energies), see JointCalib
+    stats = ScanStats(filenames, Cut, step, workers)
+    return [JointCalib([run[channel] for run in stats], energies, relative, balance) for channel in [0, 1]]
+
+
+def CalibrateScan(filenames, Cut, energies, label=None, relative=True, balance=False, bounds=None, ridge=0., step=None, workers=None):
+    # S and C tower weights calibrated jointly on the runs of a scan (see
+    # JointCalib and SolveCalib), and the S and C calibrators
+    # With a label, the weights are taken from the parametrisation store if
+    # the runs and settings did not change; otherwise they are solved starting
+    # from the latest stored weights and saved as a new version
+    calibS, calibC = CalibrateRuns(filenames, Cut, energies, step, relative, balance, workers)
+
+    def Solve():
+        previous = LoadPars(label) if label is not None else None
+        return {channel: SolveCalib(calib, bounds, ridge, x0=previous[channel] if previous else None)[0].tolist()
+                for channel, calib in [("S", calibS), ("C", calibC)]}
+
+    if(label is None):
+        weights = Solve()
+    else:
+        settings = {"runs": [CacheKey(filename, Cut, []) for filename in filenames], "energies": list(energies),
+                    "relative": relative, "balance": balance, "bounds": bounds, "ridge": ridge,
+                    "calibSplit": calibSplit, "towers": towerBranchesS + towerBranchesC}
+        weights = StoredPars(label, ParKey(filenames[0], Cut, settings), Solve,
+                             {"files": list(filenames), "energies": list(energies), "cut": Cut, "settings": repr(settings)})
+    return np.array(weights["S"]), np.array(weights["C"]), calibS, calibC
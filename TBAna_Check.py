@@ -0,0 +1,240 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Reference checks of the fast paths  #####
+#############################################
+# The array fills, batch fits and calibration solvers replace per-event loops,
+# Minuit fits and lsq_linear on the whole event matrix. This script compares
+# each of them with its reference on random inputs (fixed seed) and prints the
+# largest deviation; it fails (exit code 1) if one is above its limit.
+# Run it after changing one of these modules:
+#   python TBAna_Check.py              all the checks
+#   python TBAna_Check.py --check gaus only the gaussian fits (hist, gaus, ...)
+
+import sys
+import argparse
+import numpy as np
+import ROOT
+from scipy import optimize
+from TBAna_Hist import Hist1D, Hist2D, Profile, Fill, FillROOT, NewROOT, ToROOT, FromROOT
+from TBAna_Fit import IterativeGausFit, PolyFit
+from TBAna_Calib import Calibrator, Accumulate, SolveCalib, JointCalib
+
+# seed of the random inputs
+checkSeed = 2024
+# events of the random inputs
+nCheck = 20000
+
+ROOT.gROOT.SetBatch(True)
+
+
+def Deviation(ref, test):
+    # Largest difference between the arrays, relative to the largest |ref|
+    ref = np.asarray(ref, dtype=np.float64); test = np.asarray(test, dtype=np.float64)
+    if(ref.shape != test.shape):
+        return np.inf
+    scale = max(np.max(np.abs(ref)) if ref.size else 0., 1e-300)
+    return np.max(np.abs(test - ref))/scale if ref.size else 0.
+
+
+def Report(name, deviation, limit):
+    passed = bool(deviation <= limit)
+    print("{0:<56} {1:10.3g}  (limit {2:.0e})  {3}".format(name, deviation, limit, "ok" if passed else "FAILED"))
+    return passed
+
+
+def HistDeviation(ref, test):
+    # Largest deviation between the cells, entries and statistics of the ROOT
+    # objects ref and test
+    ref = FromROOT(ref); test = FromROOT(test)
+    deviations = []
+    for key in ["array", "sumw2", "binentries", "binsumw2"]:
+        if(ref.get(key) is None and test.get(key) is None):
+            continue
+        if(ref.get(key) is None or test.get(key) is None):
+            return np.inf
+        deviations.append(Deviation(ref[key], test[key]))
+    deviations.append(Deviation([ref["entries"]], [test["entries"]]))
+    deviations.append(Deviation(ref["stats"], test["stats"]))
+    return max(deviations)
+
+
+def FillEvents(obj, x, y=None, w=None):
+    # Reference: one Fill call per event
+    for i in range(len(x)):
+        args = [x[i]] + ([] if y is None else [y[i]]) + ([] if w is None else [w[i]])
+        obj.Fill(*args)
+    return obj
+
+
+def CheckHist():
+    # Fill (TBAna_Hist) against TH1D/TH2D/TProfile::Fill called per event,
+    # with and without weights, values on the bin edges and outside the axes,
+    # and FillROOT on an object already filled per event
+    rng = np.random.default_rng(checkSeed)
+    x = np.concatenate([rng.normal(0., 1.5, nCheck), np.linspace(-4., 4., 17)])
+    y = np.concatenate([rng.normal(1., 2., nCheck), np.linspace(-4., 4., 17)])
+    w = rng.uniform(0.5, 2., len(x))
+    cases = [("TH1D", lambda name: Hist1D(name, name, 40, -4., 4.)),
+             ("TH2D", lambda name: Hist2D(name, name, 40, -4., 4., 30, -3., 3.)),
+             ("TProfile", lambda name: Profile(name, name, 40, -4., 4.)),
+             ("TProfile y range", lambda name: Profile(name, name, 40, -4., 4., -2., 3.))]
+    passed = True
+    for kind, Make in cases:
+        twoD = kind != "TH1D"
+        for weighted in [False, True]:
+            name = "check{0}{1}".format(kind.replace(" ", ""), "W" if weighted else "")
+            args = (x, y if twoD else None, w if weighted else None)
+            ref = FillEvents(NewROOT(Make(name + "Ref")), *args)
+            test = ToROOT(Fill(Make(name + "Fill"), *args))
+            passed &= Report("Fill {0}{1}".format(kind, " weighted" if weighted else ""), HistDeviation(ref, test), 1e-12)
+
+            # half per event, then the other half with FillROOT
+            half = len(x)//2
+            test = FillEvents(NewROOT(Make(name + "FillROOT")), *[a if a is None else a[:half] for a in args])
+            FillROOT(test, *[a if a is None else a[half:] for a in args])
+            passed &= Report("FillROOT {0}{1}".format(kind, " weighted" if weighted else ""), HistDeviation(ref, test), 1e-12)
+    return passed
+
+
+def FitDeviation(values, errors, refValues, refErrors):
+    # Largest difference between the fitted parameters, in units of their
+    # errors, and between the errors (relative)
+    values = np.asarray(values); refValues = np.asarray(refValues)
+    errors = np.asarray(errors); refErrors = np.asarray(refErrors)
+    return max(np.max(np.abs(values - refValues)/refErrors), np.max(np.abs(errors - refErrors)/refErrors))
+
+
+def RootGausFit(hist, low, high):
+    # Reference: the "gaus" fits of TH1::Fit (Minuit) over the whole range,
+    # then in [mean - low*sigma, mean + high*sigma]
+    result = hist.Fit("gaus", "Q0S")
+    mean, sigma = result.Parameter(1), abs(result.Parameter(2))
+    result = hist.Fit("gaus", "Q0S", "", mean - low*sigma, mean + high*sigma)
+    pars = [result.Parameter(par) for par in range(3)]
+    pars[2] = abs(pars[2])
+    return pars, [result.ParError(par) for par in range(3)], result.Chi2()
+
+
+def CheckGaus():
+    # IterativeGausFit (TBAna_Fit) against the Minuit fits of ROOT, for peaks
+    # of different statistics, with a flat background, binned as the energy
+    # histograms (100 bins in E +- 0.7 E)
+    rng = np.random.default_rng(checkSeed)
+    low, high = 1.5, 3.
+    samples = [(40., 0.10, 200, 0), (40., 0.10, 2000, 0), (40., 0.10, nCheck, 0),
+               (10., 0.15, nCheck, nCheck//5), (120., 0.08, nCheck, nCheck//20)]
+    hists = []
+    for i, (energy, resolution, events, background) in enumerate(samples):
+        values = np.concatenate([rng.normal(energy, resolution*energy, events), rng.uniform(0.3*energy, 1.7*energy, background)])
+        hists.append(Fill(Hist1D("checkGaus{0}".format(i), "checkGaus{0}".format(i), 100, 0.3*energy, 1.7*energy), values))
+    result = IterativeGausFit(hists, [(low, high)])
+
+    passed = True
+    for i, hist in enumerate(hists):
+        energy, resolution, events, background = samples[i]
+        pars, errors, chi2 = RootGausFit(ToROOT(hist), low, high)
+        keys = ["constant", "mean", "sigma"]
+        name = "gaus E={0:g} events={1} background={2}".format(energy, events, background)
+        passed &= Report(name + " (pars/errors)", FitDeviation([result[key][i] for key in keys], [result[key+"Err"][i] for key in keys], pars, errors), 1e-2)
+        passed &= Report(name + " (chi2)", Deviation([chi2], [result["chi2"][i]]), 1e-4)
+    return passed
+
+
+def RootPolyFit(prof, degree, xmin, xmax):
+    # Reference: the polN fit of TH1::Fit in [xmin, xmax]
+    result = prof.Fit("pol{0}".format(degree), "Q0S", "", xmin, xmax)
+    return [result.Parameter(par) for par in range(degree+1)], [result.ParError(par) for par in range(degree+1)], result.Chi2()
+
+
+def CheckPoly():
+    # PolyFit (TBAna_Fit) against the fits of ROOT, for profiles as the
+    # asymmetry (pol5 in -0.9..0.9) and TDC (pol1 in 620..680) profiles, one of
+    # them with few events (empty bins and bins with one entry)
+    rng = np.random.default_rng(checkSeed)
+    samples = [(5, (100, -1., 1.), (-0.9, 0.9), [1., 0.05, -0.1, 0.02, 0.03, -0.01], nCheck),
+               (5, (100, -1., 1.), (-0.9, 0.9), [1., 0.05, -0.1, 0.02, 0.03, -0.01], 300),
+               (1, (100, 600., 720.), (620., 680.), [1.3, -5e-4], nCheck)]
+    passed = True
+    for i, (degree, axis, fitRange, coefficients, events) in enumerate(samples):
+        x = rng.uniform(axis[1], axis[2], events)
+        y = np.polyval(coefficients[::-1], x) + rng.normal(0., 0.05, events)
+        prof = Fill(Profile("checkPoly{0}".format(i), "checkPoly{0}".format(i), *axis), x, y)
+        result = PolyFit([prof], degree, *fitRange)
+        pars, errors, chi2 = RootPolyFit(ToROOT(prof), degree, *fitRange)
+        name = "pol{0} in {1:g}..{2:g} events={3}".format(degree, fitRange[0], fitRange[1], events)
+        passed &= Report(name + " (pars/errors)", FitDeviation(result["coefficients"][0], result["errors"][0], pars, errors), 1e-4)
+        passed &= Report(name + " (chi2)", Deviation([chi2], [result["chi2"][0]]), 1e-6)
+    return passed
+
+
+def CalibDeviation(weights, residuals, A, b, ref, live):
+    # Largest deviation between the weights of the live towers (relative) and
+    # between the sums of the squared residuals of SolveCalib and of the
+    # reference weights ref
+    refResiduals = np.sum((A @ ref - b)**2)
+    return max(Deviation(ref[live], weights[live]), Deviation([refResiduals], [residuals]))
+
+
+def CheckCalib():
+    # SolveCalib and JointCalib (TBAna_Calib) against the solution on the
+    # whole event matrix (lstsq without bounds, lsq_linear with bounds), with
+    # a dead tower (singular A^T A), from a warm start and with a ridge term
+    rng = np.random.default_rng(checkSeed)
+    nTowers = 36
+    truth = rng.uniform(0.8, 1.2, nTowers)
+    A = rng.gamma(0.5, 2., (nCheck, nTowers))
+    A[:, 7] = 0.
+    b = A @ truth + rng.normal(0., 0.5, nCheck)
+    live = np.any(A != 0, axis=0)
+    calib = Accumulate(Calibrator(nTowers), A, b)
+    bounds = (0.9, 1.1)
+    passed = True
+
+    weights, residuals = SolveCalib(calib)
+    passed &= Report("calib no bounds, dead tower", CalibDeviation(weights, residuals, A, b, np.linalg.lstsq(A, b, rcond=None)[0], live), 1e-8)
+    passed &= Report("calib no bounds, dead tower (weight)", abs(weights[7]), 1e-12)
+    weights, residuals = SolveCalib(calib, bounds)
+    ref = optimize.lsq_linear(A, b, bounds=bounds, tol=1e-12).x
+    passed &= Report("calib bounds, dead tower", CalibDeviation(weights, residuals, A, b, ref, live), 1e-6)
+    weights, residuals = SolveCalib(calib, bounds, x0=np.ones(nTowers))
+    passed &= Report("calib bounds, warm start", CalibDeviation(weights, residuals, A, b, ref, live), 1e-6)
+
+    # ridge: A with the rows sqrt(ridge)*(w - prior) added
+    ridge = 50.
+    Ar = np.vstack([A, np.sqrt(ridge)*np.eye(nTowers)]); br = np.concatenate([b, np.sqrt(ridge)*np.ones(nTowers)])
+    weights, residuals = SolveCalib(calib, ridge=ridge)
+    passed &= Report("calib ridge", CalibDeviation(weights, residuals, A, b, np.linalg.lstsq(Ar, br, rcond=None)[0], np.ones(nTowers, dtype=bool)), 1e-8)
+    weights, residuals = SolveCalib(calib, bounds, ridge=ridge)
+    ref = optimize.lsq_linear(Ar, br, bounds=bounds, tol=1e-12).x
+    passed &= Report("calib ridge, bounds", CalibDeviation(weights, residuals, A, b, ref, np.ones(nTowers, dtype=bool)), 1e-6)
+
+    # energy scan: unit-target sums of each run, residuals divided by the energy
+    energies = [10., 40., 120.]
+    runs = [rng.gamma(0.5, 2., (nCheck//3, nTowers))*energy/10. for energy in energies]
+    stats = [Accumulate(Calibrator(nTowers), run, 1.) for run in runs]
+    weights, residuals = SolveCalib(JointCalib(stats, energies, relative=True))
+    As = np.vstack([run/energy for run, energy in zip(runs, energies)]); bs = np.ones(len(As))
+    passed &= Report("calib joint scan, relative", CalibDeviation(weights, residuals, As, bs, np.linalg.lstsq(As, bs, rcond=None)[0], np.ones(nTowers, dtype=bool)), 1e-8)
+    return passed
+
+
+# checks run by --check
+checks = {"hist": CheckHist, "gaus": CheckGaus, "poly": CheckPoly, "calib": CheckCalib}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Reference checks of the fast paths")
+    parser.add_argument("--check", choices=sorted(checks), action="append", help="check to run (default all)")
+    args = parser.parse_args()
+
+    passed = True
+    for name in args.check or list(checks):
+        print("\n... Checking", name)
+        passed &= checks[name]()
+    print("\nAll checks passed" if passed else "\nSome checks FAILED")
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Compiled selections and cutflow     #####
+#############################################
+# A cut string such as myCut is parsed once into its "&" terms, each compiled
+# to a code object. The terms are evaluated from the cheapest (fewest branches)
+# to the most expensive one, each only on the events which survived the
+# previous terms, so the branches of the later terms are only looked up for
+# those events. The number of events left after each term is the cutflow.
+# Strings which are not a plain "&" of comparisons (e.g. "A & (B)<1100", where
+# python applies "&" before "<") are kept as a single term, so the selected
+# events are always the same as with the uproot cut.
+
+import os
+import ast
+import hashlib
+import numpy as np
+from TBAna_Store import NpyFolder, NpyStamp, LoadNpy
+
+# functions allowed in the cut strings, as in the uproot cuts
+cutFunctions = {"abs": np.abs}
+
+
+def SplitCut(Cut):
+    # Return the "&" terms of Cut as strings, or [Cut] if it is not a "&" chain
+    # of comparisons
+    tree = ast.parse(Cut.strip(), mode="eval").body
+    if(isinstance(tree, ast.Compare) and isinstance(tree.left, ast.BinOp) and isinstance(tree.left.op, ast.BitAnd)):
+        print("Warning: in cut '{0}' the '&' is applied before the comparison, add parentheses".format(Cut))
+    terms = []
+    def Walk(node):
+        if(isinstance(node, ast.BinOp) and isinstance(node.op, ast.BitAnd)):
+            Walk(node.left); Walk(node.right)
+        else:
+            terms.append(node)
+    Walk(tree)
+    if(not all(isinstance(term, ast.Compare) for term in terms)):
+        return [Cut.strip()]
+    return [ast.unparse(term) for term in terms]
+
+
+def CompileCut(Cut, keys):
+    # Compile the terms of Cut, ordered by cost (number of branches of keys
+    # they use, original order for equal cost)
+    # Each term is a dict with the expression, its code and its branches
+    keys = set(keys)
+    terms = []
+    for expr in SplitCut(Cut):
+        code = compile(expr, "<cut>", "eval")
+        branches = [name for name in dict.fromkeys(code.co_names) if name in keys]
+        terms.append({"expr": expr, "code": code, "branches": branches})
+    return sorted(terms, key=lambda term: len(term["branches"]))
+
+
+def ApplyCut(terms, GetBranch, nEntries):
+    # Entry numbers of the events passing all terms, and the cutflow as a list
+    # of (term, events left after it), starting from ("all", nEntries)
+    # GetBranch(name) returns the full array of a branch (e.g. a memory-mapped
+    # one): only the surviving events of it are used
+    entries = np.arange(nEntries)
+    cutflow = [("all", nEntries)]
+    for term in terms:
+        if(len(entries) == nEntries):
+            arrays = {name: np.asarray(GetBranch(name)) for name in term["branches"]}
+        else:
+            arrays = {name: np.asarray(GetBranch(name))[entries] for name in term["branches"]}
+        mask = eval(term["code"], cutFunctions, arrays)
+        entries = entries[np.broadcast_to(np.asarray(mask, dtype=bool), entries.shape)]
+        cutflow.append((term["expr"], len(entries)))
+    return entries, cutflow
+
+
+def PrintCutflow(cutflow):
+    # Table of the events left after each term, with the efficiency of the term
+    print("\n{0:<60} {1:>10} {2:>8}".format("Cut", "Events", "Eff"))
+    previous = cutflow[0][1]
+    for term, events in cutflow:
+        eff = events/previous if previous else 0.
+        print("{0:<60} {1:>10} {2:>8.3f}".format(term, events, eff))
+        previous = events
+
+
+# Per-run selection index: every elementary term (comparison) of a cut is
+# evaluated once on the whole run and stored as a packed bitset (np.packbits)
+# in the .npy store of the run, NpyFolder(run)/cuts/<hash of term>.npy.
+# Any "&", "|", "^", "~" combination of terms is then resolved on the packed
+# bytes, without reading any branch. The bitsets are removed when the store is
+# re-exported (ntuple changed).
+
+# bitsets already loaded in this process, by (folder, ntuple stamp, term)
+loadedBits = {}
+# number of events of the runs, by (folder, ntuple stamp)
+loadedEntries = {}
+
+
+def IsBoolNode(node):
+    # Comparisons and their "&", "|", "^", "~" combinations are masks
+    if(isinstance(node, ast.Compare)):
+        return True
+    if(isinstance(node, ast.BinOp) and isinstance(node.op, (ast.BitAnd, ast.BitOr, ast.BitXor))):
+        return IsBoolNode(node.left) and IsBoolNode(node.right)
+    if(isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert)):
+        return IsBoolNode(node.operand)
+    return False
+
+
+def TermBits(filename, expr):
+    # Packed bitset of one elementary term on the whole run (computed and
+    # stored the first time)
+    folder = os.path.join(NpyFolder(filename), "cuts")
+    key = (folder, NpyStamp(filename), expr)
+    if(key in loadedBits):
+        return loadedBits[key]
+    arrays = LoadNpy(filename)
+    path = os.path.join(folder, hashlib.sha1(expr.encode()).hexdigest()[:16] + ".npy")
+    if(not os.path.exists(path)):
+        code = compile(expr, "<cut>", "eval")
+        names = [name for name in dict.fromkeys(code.co_names) if name in arrays]
+        nEntries = len(next(iter(arrays.values())))
+        mask = np.broadcast_to(np.asarray(eval(code, cutFunctions, {name: arrays[name] for name in names}), dtype=bool), (nEntries,))
+        os.makedirs(folder, exist_ok=True)
+        tmp = "{0}.{1}.tmp.npy".format(path[:-4], os.getpid())
+        np.save(tmp, np.packbits(mask))
+        os.replace(tmp, path)
+    loadedBits[key] = np.load(path)
+    return loadedBits[key]
+
+
+def CombineBits(filename, node):
+    # Packed bitset of a mask node, combining the bitsets of its terms
+    if(isinstance(node, ast.BinOp) and IsBoolNode(node)):
+        left = CombineBits(filename, node.left); right = CombineBits(filename, node.right)
+        if(isinstance(node.op, ast.BitAnd)): return left & right
+        if(isinstance(node.op, ast.BitOr)): return left | right
+        return left ^ right
+    if(isinstance(node, ast.UnaryOp) and IsBoolNode(node)):
+        return ~CombineBits(filename, node.operand)
+    # comparison, or an expression which is not a combination of masks:
+    # evaluated as a whole
+    return TermBits(filename, ast.unparse(node))
+
+
+def IndexMask(filename, Cut):
+    # Boolean mask of the events of the run passing Cut, from the bitset index
+    key = (NpyFolder(filename), NpyStamp(filename))
+    if(key not in loadedEntries):
+        loadedEntries[key] = len(next(iter(LoadNpy(filename).values())))
+    nEntries = loadedEntries[key]
+    bits = CombineBits(filename, ast.parse(Cut.strip(), mode="eval").body)
+    return np.unpackbits(bits, count=nEntries).astype(bool)
+
+
+def IndexEntries(filename, Cut):
+    # Entry numbers of the events of the run passing Cut, from the bitset index
+    return np.flatnonzero(IndexMask(filename, Cut))
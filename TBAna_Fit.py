@@ -0,0 +1,277 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Batch Gaussian fits of histograms   #####
+#############################################
+# The energy peaks are fitted with "gaus" over the whole histogram and then
+# refitted in a window around the peak, [mu - low*sigma, mu + high*sigma].
+# Instead of two Minuit fits per histogram, all the histograms of a block are
+# stacked in (histograms x bins) arrays and fitted together: the chi2 of every
+# histogram (bins with error > 0, bin centres in the fit range, as TH1::Fit) is
+# minimised with Levenberg-Marquardt steps computed for the whole batch at once.
+# Parameter errors come from the covariance (J^T W J)^-1 at the minimum, as the
+# chi2 errors of the fit. The same minimum as Minuit is found, within its
+# tolerance. A TF1 "gaus" is only made (AttachGaus) for the fits that are drawn
+# or read back with GetFunction.
+# The polynomial fits of the profiles (pol1, pol5) are linear least squares:
+# they are solved directly from the bin means and errors, for all the profiles
+# at once, with the covariance of the coefficients for the error bands.
+
+import numpy as np
+import ROOT
+from math import comb
+from TBAna_Hist import FromROOT
+from TBAna_Func import Poly
+
+maxIterations = 200
+# relative change of chi2 below which a fit has converged
+tolerance = 1e-10
+
+
+def BinContents(hist):
+    # Contents and errors of the bins, as GetBinContent/GetBinError: for a
+    # profile the mean of y and its error (spread/sqrt(effective entries))
+    if(hist["kind"] == "TProfile"):
+        sumw = hist["binentries"]
+        sumw2 = sumw if hist["binsumw2"] is None else hist["binsumw2"]
+        filled = sumw != 0
+        mean = np.where(filled, hist["array"]/np.where(filled, sumw, 1), 0.)
+        spread2 = np.where(filled, np.abs(hist["sumw2"]/np.where(filled, sumw, 1) - mean*mean), 0.)
+        neff = np.where(filled, sumw*sumw/np.where(sumw2 != 0, sumw2, 1), 1.)
+        return mean, np.sqrt(spread2/neff)
+    sumw2 = hist["array"] if hist["sumw2"] is None else hist["sumw2"]
+    return hist["array"], np.sqrt(np.abs(sumw2))
+
+
+def HistArrays(hists):
+    # Bin centres, contents and errors of the histograms or profiles (ROOT or
+    # histogram dicts), as (histograms x bins) arrays padded with empty bins
+    hists = [hist if isinstance(hist, dict) else FromROOT(hist) for hist in hists]
+    nMax = max(hist["x"][0] for hist in hists)
+    x = np.zeros((len(hists), nMax)); y = np.zeros((len(hists), nMax)); e = np.zeros((len(hists), nMax))
+    for i, hist in enumerate(hists):
+        nbins, xmin, xmax = hist["x"]
+        width = (xmax-xmin)/nbins
+        x[i, :nbins] = xmin + width*(np.arange(nbins)+0.5)
+        content, error = BinContents(hist)
+        y[i, :nbins] = content[1:nbins+1]
+        e[i, :nbins] = error[1:nbins+1]
+    return x, y, e
+
+
+def GausJacobian(p, x):
+    # Gaussian constant*exp(-0.5*((x-mean)/sigma)^2) and its derivatives
+    constant, mean, sigma = p[:, 0:1], p[:, 1:2], p[:, 2:3]
+    z = (x-mean)/sigma
+    g = np.exp(-0.5*z*z)
+    f = constant*g
+    return f, np.stack([g, f*z/sigma, f*z*z/sigma], axis=-1)
+
+
+def Chi2(p, x, y, w):
+    f, J = GausJacobian(p, x)
+    return np.sum(w*(y-f)**2, axis=1)
+
+
+def GausFitBatch(x, y, e, xmin, xmax, p0):
+    # Chi2 fit of a gaussian to every row of (x, y, e) in [xmin, xmax] (one
+    # value per row), starting from the parameters p0 (rows x 3)
+    # Return the parameters, their errors, the chi2 and the degrees of freedom
+    inRange = (e > 0) & (x >= xmin[:, None]) & (x <= xmax[:, None])
+    w = np.where(inRange, 1/np.where(e > 0, e, 1)**2, 0.)
+    p = np.array(p0, dtype=np.float64)
+    chi2 = Chi2(p, x, y, w)
+    lam = np.full(len(p), 1e-3)
+    active = inRange.sum(axis=1) >= 3
+    for iteration in range(maxIterations):
+        if(not active.any()):
+            break
+        f, J = GausJacobian(p, x)
+        JW = J*w[:, :, None]
+        H = np.einsum("bni,bnj->bij", JW, J)
+        grad = np.einsum("bni,bn->bi", JW, y-f)
+        # Marquardt: damping proportional to the diagonal of J^T W J
+        damped = H + lam[:, None, None]*(H*np.eye(3))
+        damped[~active] = np.eye(3)
+        step = np.linalg.solve(damped, grad[:, :, None])[:, :, 0]
+        newP = p + np.where(active[:, None], step, 0.)
+        newChi2 = Chi2(newP, x, y, w)
+        better = active & np.isfinite(newChi2) & (newChi2 <= chi2)
+        converged = better & (chi2 - newChi2 <= tolerance*chi2)
+        p[better] = newP[better]
+        chi2 = np.where(better, newChi2, chi2)
+        lam = np.where(better, lam/10, lam*10)
+        active &= ~converged & (lam < 1e12)
+
+    f, J = GausJacobian(p, x)
+    JW = J*w[:, :, None]
+    H = np.einsum("bni,bnj->bij", JW, J)
+    errors = np.full(p.shape, np.nan)
+    fitted = inRange.sum(axis=1) >= 3
+    if(fitted.any()):
+        errors[fitted] = np.sqrt(np.abs(np.diagonal(np.linalg.inv(H[fitted]), axis1=1, axis2=2)))
+    p[~fitted] = np.nan
+    p[:, 2] = np.abs(p[:, 2])
+    return p, errors, chi2, inRange.sum(axis=1) - 3
+
+
+def StartValues(x, y, e, xmin, xmax):
+    # Constant, mean and RMS of the bins in [xmin, xmax] (as the initial
+    # values of the "gaus" fit)
+    inRange = (e > 0) & (x >= xmin[:, None]) & (x <= xmax[:, None])
+    w = np.where(inRange, y, 0.)
+    total = np.maximum(w.sum(axis=1), 1e-300)
+    mean = (w*x).sum(axis=1)/total
+    rms = np.sqrt(np.maximum((w*(x-mean[:, None])**2).sum(axis=1)/total, 1e-300))
+    return np.stack([w.max(axis=1), mean, rms], axis=1)
+
+
+def IterativeGausFit(hists, windows=[(1.5, 3.)]):
+    # Fit "gaus" to every histogram over its whole range, then refit in
+    # [mean - low*sigma, mean + high*sigma] for each (low, high) of windows
+    # Return a dict of arrays (one value per histogram): constant, mean, sigma,
+    # their errors (...Err), chi2, ndf and the last fit range (xmin, xmax)
+    x, y, e = HistArrays(hists)
+    xmin = np.full(len(x), -np.inf); xmax = np.full(len(x), np.inf)
+    p, errors, chi2, ndf = GausFitBatch(x, y, e, xmin, xmax, StartValues(x, y, e, xmin, xmax))
+    for low, high in windows:
+        xmin = p[:, 1] - low*p[:, 2]; xmax = p[:, 1] + high*p[:, 2]
+        p, errors, chi2, ndf = GausFitBatch(x, y, e, xmin, xmax, p)
+    # the whole range of the first fit is the histogram range
+    if(not windows):
+        xmin = np.array([hist["x"][1] if isinstance(hist, dict) else hist.GetXaxis().GetXmin() for hist in hists])
+        xmax = np.array([hist["x"][2] if isinstance(hist, dict) else hist.GetXaxis().GetXmax() for hist in hists])
+    return {"constant": p[:, 0], "mean": p[:, 1], "sigma": p[:, 2],
+            "constantErr": errors[:, 0], "meanErr": errors[:, 1], "sigmaErr": errors[:, 2],
+            "chi2": chi2, "ndf": ndf, "xmin": xmin, "xmax": xmax}
+
+
+def FitTF1(name, formula, xmin, xmax):
+    # TF1 of a fit, kept out of the global list of functions (gROOT): a TF1
+    # named "gaus" or "pol5" there replaces the predefined function of ROOT
+    # used by later Fit("gaus") calls, and is deleted with its histogram
+    previous = ROOT.TF1.DefaultAddToGlobalList(False)
+    try:
+        return ROOT.TF1(name, formula, xmin, xmax)
+    finally:
+        ROOT.TF1.DefaultAddToGlobalList(previous)
+
+
+def AttachGaus(hist, result, i):
+    # Make the TF1 "gaus" of fit i of result and attach it to the ROOT
+    # histogram hist, as TH1::Fit does (drawn with it, hist.GetFunction("gaus"))
+    func = FitTF1("gaus", "gaus", result["xmin"][i], result["xmax"][i])
+    for par, key in enumerate(["constant", "mean", "sigma"]):
+        func.SetParameter(par, result[key][i]); func.SetParError(par, result[key+"Err"][i])
+    func.SetChisquare(result["chi2"][i]); func.SetNDF(int(result["ndf"][i]))
+    functions = hist.GetListOfFunctions()
+    previous = functions.FindObject("gaus")
+    if(previous):
+        functions.Remove(previous)
+    ROOT.SetOwnership(func, False)
+    functions.Add(func)
+    return func
+
+
+def FitGaus(hists, low=1.5, high=3.):
+    # IterativeGausFit of the ROOT histograms with one window, attaching every
+    # fit to its histogram; return the results
+    result = IterativeGausFit(hists, [(low, high)])
+    for i, hist in enumerate(hists):
+        AttachGaus(hist, result, i)
+    return result
+
+
+def PolyFitBatch(x, y, e, xmin, xmax, degree):
+    # Chi2 fit of a polynomial of the given degree to every row of (x, y, e)
+    # in [xmin, xmax] (bins with error > 0, as TH1::Fit)
+    # Return the coefficients (p0, p1, ...), their covariance, chi2 and ndf
+    inRange = (e > 0) & (x >= xmin[:, None]) & (x <= xmax[:, None])
+    w = np.where(inRange, 1/np.where(e > 0, e, 1)**2, 0.)
+    # fit in t = (x - centre)/scale, in [-1, 1], for a well conditioned system
+    centre = (xmin + xmax)/2; scale = (xmax - xmin)/2
+    t = (x - centre[:, None])/scale[:, None]
+    T = t[:, :, None]**np.arange(degree+1)
+    TW = T*w[:, :, None]
+    H = np.einsum("bni,bnj->bij", TW, T)
+    fitted = inRange.sum(axis=1) >= degree+1
+    H[~fitted] = np.eye(degree+1)
+    covT = np.linalg.inv(H)
+    pT = np.einsum("bij,bj->bi", covT, np.einsum("bni,bn->bi", TW, y))
+    chi2 = np.sum(w*(y - np.einsum("bni,bi->bn", T, pT))**2, axis=1)
+    # back to the powers of x: t^k = sum_j C(k,j) x^j (-centre)^(k-j) / scale^k
+    k = np.arange(degree+1)
+    binomial = np.array([[comb(kk, j) for kk in k] for j in k], dtype=np.float64)
+    power = np.clip(k[None, :] - k[:, None], 0, None)
+    M = binomial*(-centre[:, None, None])**power/scale[:, None, None]**k
+    p = np.einsum("bjk,bk->bj", M, pT)
+    cov = np.einsum("bij,bjk,blk->bil", M, covT, M)
+    p[~fitted] = np.nan; cov[~fitted] = np.nan
+    return p, cov, chi2, inRange.sum(axis=1) - (degree+1)
+
+
+def PolyFit(profiles, degree, xmin, xmax):
+    # Fit of polN (N = degree) to every profile (or histogram) in [xmin, xmax]
+    # (numbers, or one value per profile)
+    # Return a dict of arrays (one row per profile): coefficients, covariance,
+    # errors, chi2, ndf, and the range
+    x, y, e = HistArrays(profiles)
+    xmin = np.broadcast_to(np.asarray(xmin, dtype=np.float64), (len(x),)).copy()
+    xmax = np.broadcast_to(np.asarray(xmax, dtype=np.float64), (len(x),)).copy()
+    p, cov, chi2, ndf = PolyFitBatch(x, y, e, xmin, xmax, degree)
+    return {"name": "pol{0}".format(degree), "coefficients": p, "covariance": cov,
+            "errors": np.sqrt(np.abs(np.diagonal(cov, axis1=1, axis2=2))), "chi2": chi2, "ndf": ndf, "xmin": xmin, "xmax": xmax}
+
+
+def PolyBand(result, i, x):
+    # Value of fit i of PolyFit at x (array) and its error
+    # sqrt(v^T C v), v = (1, x, x^2, ...), for the error band
+    x = np.asarray(x, dtype=np.float64)
+    V = x[..., None]**np.arange(result["coefficients"].shape[1])
+    return V @ result["coefficients"][i], np.sqrt(np.abs(np.einsum("...i,ij,...j->...", V, result["covariance"][i], V)))
+
+
+def PolyOfFit(result, i):
+    # Poly (TBAna_Func) of fit i of PolyFit
+    return Poly(result["coefficients"][i], result["xmin"][i], result["xmax"][i], result["name"])
+
+
+def AttachPoly(hist, result, i):
+    # Make the TF1 polN of fit i of result and attach it to the ROOT profile
+    # hist, as TH1::Fit does
+    func = FitTF1(result["name"], result["name"], result["xmin"][i], result["xmax"][i])
+    for par in range(result["coefficients"].shape[1]):
+        func.SetParameter(par, result["coefficients"][i][par]); func.SetParError(par, result["errors"][i][par])
+    func.SetChisquare(result["chi2"][i]); func.SetNDF(int(result["ndf"][i]))
+    functions = hist.GetListOfFunctions()
+    previous = functions.FindObject(result["name"])
+    if(previous):
+        functions.Remove(previous)
+    ROOT.SetOwnership(func, False)
+    functions.Add(func)
+    return func
+
+
+def FitPoly(profiles, degree, xmin, xmax):
+    # PolyFit of the ROOT profiles, attaching every fit to its profile;
+    # return the results
+    result = PolyFit(profiles, degree, xmin, xmax)
+    for i, prof in enumerate(profiles):
+        AttachPoly(prof, result, i)
+    return result
+
+
+def AttachStoredPoly(hist, poly):
+    # Make the TF1 polN of a stored Poly (TBAna_Func, e.g. from the
+    # parametrisation store) and attach it to the ROOT profile hist in place
+    # of a fit, so that it is drawn and read back with GetFunction as a fit
+    func = FitTF1(poly["name"], poly["name"], poly["xmin"], poly["xmax"])
+    for par, coefficient in enumerate(poly["coefficients"]):
+        func.SetParameter(par, coefficient)
+    functions = hist.GetListOfFunctions()
+    previous = functions.FindObject(poly["name"])
+    if(previous):
+        functions.Remove(previous)
+    ROOT.SetOwnership(func, False)
+    functions.Add(func)
+    return func
@@ -0,0 +1,66 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Polynomial correction functions     #####
+#############################################
+# The asymmetry and TDC corrections are polynomials (pol1, pol5) fitted to
+# profiles. Instead of np.vectorize(TF1.Eval), one PyROOT call per event,
+# the coefficients and the fit range are taken from the TF1 once and the
+# polynomial is evaluated with the Horner scheme on whole arrays.
+# The values are those of TF1::Eval up to the rounding of the last digit.
+# As TF1::Eval, the polynomial is also evaluated outside of its range (the
+# range is kept as the validity range of the correction, see InRange).
+# A polynomial is a dict of plain numbers, saved to and read from JSON
+# without ROOT.
+
+import re
+import json
+import numpy as np
+
+
+def Poly(coefficients, xmin=-np.inf, xmax=np.inf, name=""):
+    # p0 + p1*x + p2*x^2 + ..., valid in [xmin, xmax]
+    return {"name": name, "coefficients": [float(c) for c in coefficients], "xmin": float(xmin), "xmax": float(xmax)}
+
+
+def PolyFromTF1(func):
+    # Coefficients and range of a fitted polN TF1 (e.g. prof.GetFunction("pol5"))
+    if(not re.fullmatch(r"pol\d+", func.GetName())):
+        raise ValueError("{0}: only polN functions can be converted".format(func.GetName()))
+    xmin, xmax = func.GetXmin(), func.GetXmax()
+    return Poly([func.GetParameter(i) for i in range(func.GetNpar())], xmin, xmax, func.GetName())
+
+
+def EvalPoly(poly, x):
+    # Polynomial at every value of x (array), Horner scheme
+    x = np.asarray(x, dtype=np.float64)
+    coefficients = poly["coefficients"]
+    y = np.full(x.shape, coefficients[-1])
+    for c in coefficients[-2::-1]:
+        y = y*x + c
+    return y
+
+
+def InRange(poly, x):
+    # Mask of the values of x inside the validity range of poly
+    x = np.asarray(x, dtype=np.float64)
+    return (x >= poly["xmin"]) & (x <= poly["xmax"])
+
+
+def PolyFunction(func):
+    # Drop-in replacement of np.vectorize(func.Eval) for a fitted polN TF1
+    # (or a Poly dict)
+    poly = func if isinstance(func, dict) else PolyFromTF1(func)
+    return lambda x: EvalPoly(poly, x)
+
+
+def SavePolys(filename, polys):
+    # Write {label: Poly} to a JSON file
+    with open(filename, "w") as out:
+        json.dump(polys, out, indent=1)
+
+
+def LoadPolys(filename):
+    # {label: Poly} from a JSON file written by SavePolys
+    with open(filename) as infile:
+        return json.load(infile)
@@ -9,19 +9,50 @@ import pandas as pd
 import numpy as np
 import ROOT 
 import uproot
-from scipy import optimize
+from TBAna_Reader import ReadDF, IterateDF, AddDerivedVars, towerBranchesS, towerBranchesC
+from TBAna_Parallel import MapRuns
+from TBAna_Cut import PrintCutflow
+from TBAna_Noise import GetPMTnoise
+from TBAna_Towers import TowerMatrix, TowersS, TowersC
+from TBAna_Hist import Fill, FillROOT, Hist1D, Hist2D, Profile, Book, FillBooked, ToROOT, FromROOT, WriteROOT, HistKey
+from TBAna_RDF import ReadRDF
+from TBAna_Quantile import Sketch, Update, SigmaEff, IQRSigma
+from TBAna_Func import PolyFunction, PolyFromTF1
+from TBAna_Fit import FitGaus, FitPoly, AttachStoredPoly
+from TBAna_Unbinned import UnbinnedGausFit
+from TBAna_Bootstrap import Bootstrap, BootstrapSummary
+from TBAna_ParStore import ParKey, LoadPars, SavePars
+from TBAna_Calib import CalibrateScan
 
 calibfolder = "/home/storage/data_apareti/TB24/ElectronEnergyScan/"
 #infolder = "/home/storage/data_apareti/TB24/PionScan_OldHVsaturated/"
 infolder = "/home/storage/data_apareti/TB24/PionEnergyScan/"
 #infolder = "/home/storage/data_apareti/TB24/PionScanCorrected/pion24/"
-pedfolder = "/home/storage/data_apareti/TB24/PedestalRuns/"
 treename = "Ftree"
 
 #chi_value = 0.35
 #chi_value = 0.25
 chi_value = 0.44
 
+# Asymmetry and TDC corrections of the first loop. They are also the settings
+# in the key of the stored parametrisations (TBAna_ParStore), so a change here
+# gives a new version
+# bins and range (energy - low*energy, energy + high*energy) of the energy
+# histograms whose most probable values normalise the profiles
+mpvBins = (100, 0.9, 1.2)
+# asymmetry profiles, degree and fit range of their polynomials
+asymProfBins = (100, -1, 1)
+asymFitDegree = 5; asymFitRange = (-0.9, 0.9)
+# TDC selection: all the tdcBranches above tdcMin, TDC_TS11 below tdcMaxS11,
+# TDC_TC11 below tdcMaxC11
+tdcBranches = ["TDC_TS00", "TDC_TS11", "TDC_TS15", "TDC_TC11", "TDC_TC15", "TDC_TC00"]
+tdcMin = 600; tdcMaxS11 = 720; tdcMaxC11 = 675
+# TDC offset of some runs, subtracted from all the tdcBranches
+tdcShift = {"1000": 60}
+# TDC profiles, degree and fit range of their polynomials
+tdcProfBins = (100, 600, 720)
+tdcFitDegree = 1; tdcFitRange = (620, 680)
+
 
 # Mean Z barycenter for electromagnetic showers at 40 GeV
 meanZbarS_ele = 227.718  # in mm
@@ -42,68 +73,111 @@ att_length_C = 4000.
 S_attenuation_correction = (ROOT.TMath.Exp(-(2500-meanZbarS_had)/att_length_S) ) / (ROOT.TMath.Exp(-(2500-meanZbarS_ele)/att_length_S) );
 C_attenuation_correction = (ROOT.TMath.Exp(-(2500-meanZbarC_had)/att_length_C) ) / (ROOT.TMath.Exp(-(2500-meanZbarC_ele)/att_length_C) );
 
-
-
-
-def GetPMTnoise():
-    print("\n... Calculating PMT noise")
-
-    PedestalRuns = ["0771", "0777", "0780", "0781", "0784", "0796"]
-
-    PmtNoiseHistS = ROOT.TH1D("PmtNoiseHistS", "PmtNoiseHistS", 100, -5., 5.)
-    PmtNoiseHistC = ROOT.TH1D("PmtNoiseHistC", "PmtNoiseHistC", 100, -5., 5.)
-
-    for index, run in enumerate(PedestalRuns):
-        filename = "physics_sps2024_run" + run + ".root"
-
-        root_file = uproot.open(pedfolder+filename)
-        tree = root_file[treename]
-        data = tree.arrays(library="pd")    
-
-        print(filename, data)
-        for pmtS, pmtC in zip(data["totPMTSene"], data["totPMTCene"]):
-            PmtNoiseHistS.Fill(pmtS)
-            PmtNoiseHistC.Fill(pmtC)
-
-    cNoise = ROOT.TCanvas("cNoise", "cNoise", 1400, 1200)
-    PmtNoiseHistS.SetLineColor(ROOT.kRed); PmtNoiseHistS.SetLineWidth(2);  PmtNoiseHistS.Draw()      
-    PmtNoiseHistC.SetLineColor(ROOT.kBlue); PmtNoiseHistC.SetLineWidth(2);  PmtNoiseHistC.Draw("same")
-
-    PmtNoiseHistS.Fit("gaus"); PmtNoiseHistC.Fit("gaus")
-    RmsNoiseS = PmtNoiseHistS.GetFunction("gaus").GetParameter(2)
-    RmsNoiseC = PmtNoiseHistC.GetFunction("gaus").GetParameter(2)
-    print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
-
-    cNoise.Draw()
-    cNoise.SaveAs("Noise.png")
-    return(RmsNoiseS, RmsNoiseC)
+# Variables derived from the Ftree branches in GetDF
+derivedVars = {
+    # define Asymmetry variable
+    "AsymS" : "(TS24 - TS21) / (TS24 + TS21)",
+    "AsymC" : "(TC24 - TC21) / (TC24 + TC21)",
+    # define partial barycenter variable
+    "BaryS" : "(TS00 - 28.3*TS11 + 28.3*TS15) / (TS00 + TS11 + TS15)",
+    "BaryC" : "(TC00 - 28.3*TC11 + 28.3*TC15) / (TC00 + TC11 + TC15)",
+    # dual-readout energy
+    "totDRene" : "(totPMTSene - {0}*totPMTCene) / (1 - {0})".format(chi_value)
+}
+
+# Other branches used after GetDF (TDC cleanup); the tower branches are not
+# read, the recalibration of the pion runs is not applied
+readBranches = ["totPMTSene", "totPMTCene", "TDC_TS00", "TDC_TS11", "TDC_TS15", "TDC_TC00", "TDC_TC11", "TDC_TC15"]
+
+# Streaming mode: when set, each run is read in chunks of streamStep (entries or
+# memory size, e.g. "100 MB") with the first-loop histograms filled chunk by chunk,
+# and only the keepColumns are stored for the later loops (no tower matrices).
+# None reads each run in one go
+streamStep = None
+# Backend of the first read of the runs (without streamStep):
+# "pandas": ReadDF, the runs read in parallel processes (TBAna_Parallel)
+# "rdf": one RDataFrame graph per run with implicit multithreading (TBAna_RDF),
+# all the cores on one run at a time; the dataframes, and so DRcaloData.csv,
+# are the same
+backend = "pandas"
+# Fit of the energy peaks stored in DRcaloData.csv:
+# "binned": gaussian fits of the 100-bin histograms (TBAna_Fit)
+# "unbinned": maximum-likelihood gaussian fits of the event energies with the
+# same procedure (TBAna_Unbinned): a first fit in the histogram range, then one
+# refit in +-1.5 sigma, without binning
+peakFit = "binned"
+# Bootstrap replicas of the TDC-corrected S, C and DR energies of every run for
+# the uncertainties of the peaks and of the resolution terms (TBAna_Bootstrap),
+# written to DRcaloBootstrap.csv; 0 for none
+nBootstrap = 0
+# entry of the tower weights in the parametrisation store, separate from the
+# one of TBAna_OfflineCalib (different settings)
+weightsLabel = "TBAna_Had tower weights"
+keepColumns = ["totPMTSene", "totPMTCene", "TDC_TS00", "TDC_TS11", "TDC_TS15", "TDC_TC00", "TDC_TC11", "TDC_TC15",
+               "pmtS_cont", "pmtC_cont", "pmtS_cont_att", "pmtC_cont_att", "totDRene_cont", "totDRene_cont_att", "TruthE"] + list(derivedVars)
 
 
 
 
 def GetDF(run, Cut, filename, energy, containment): 
     print("Using file: ", filename, energy)
-    root_file = uproot.open(infolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=Cut, library="pd")
-
-    # define Asymmetry variable 
-    data["AsymS"] = (data["TS24"] - data["TS21"]) / (data["TS24"] + data["TS21"] )
-    data["AsymC"] = (data["TC24"] - data["TC21"]) / (data["TC24"] + data["TC21"] )
-
-    # define partial barycenter variable 
-    data["BaryS"] = (data["TS00"]-28.3*data["TS11"]+28.3*data["TS15"])/(data["TS00"]+data["TS11"]+data["TS15"])
-    data["BaryC"] = (data["TC00"]-28.3*data["TC11"]+28.3*data["TC15"])/(data["TC00"]+data["TC11"]+data["TC15"])
-
-    data["pmtS_cont"] = data["totPMTSene"]/containment
-    data["pmtC_cont"] = data["totPMTCene"]/containment
+    # read only the branches used by the cut, the derived variables and main()
+    cutflow = []
+    data = ReadDF(infolder+filename, Cut, derivedVars, readBranches, cutflow=cutflow)
+    if(cutflow): PrintCutflow(cutflow)
+    # only keepColumns are returned (and sent back by the worker processes)
+    return AddContainmentVars(data, energy, containment)[keepColumns]
+
+
+def GetDFstream(run, Cut, filename, energy, containment, hists, sketches=[]):
+    # Same as GetDF, reading the run in chunks of streamStep
+    # hists is a list of (histogram, column) filled chunk by chunk, sketches a
+    # list of (quantile sketch, column) updated chunk by chunk (TBAna_Quantile),
+    # only keepColumns are stored in the returned dataframe
+    print("Streaming file: ", filename, energy)
+    chunks = []; cutflow = []
+    for data in IterateDF(infolder+filename, Cut, derivedVars, readBranches, streamStep, cutflow):
+        data = AddContainmentVars(data, energy, containment)
+        for hist, var in hists:
+            FillROOT(hist, data[var].values)
+        for sketch, var in sketches:
+            Update(sketch, data[var].values)
+        chunks.append(data[keepColumns])
+    if(cutflow): PrintCutflow(cutflow)
+    # chunks keep the entry numbers as index, as the dataframe of GetDF
+    return pd.concat(chunks)
+
+
+def ContainmentVars(containment):
+    # Energies corrected for the expected containment (and attenuation),
+    # as derived-variable definitions (pandas or RDataFrame)
+    containment = float(containment)
+    return {
+        "pmtS_cont" : "totPMTSene/{0!r}".format(containment),
+        "pmtC_cont" : "totPMTCene/{0!r}".format(containment),
+        "pmtS_cont_att" : "totPMTSene/{0!r}/{1!r}".format(containment, S_attenuation_correction),
+        "pmtC_cont_att" : "totPMTCene/{0!r}/{1!r}".format(containment, C_attenuation_correction),
+        "totDRene_cont" : "totDRene/{0!r}".format(containment),
+        "totDRene_cont_att" : "(totPMTSene/{1!r}-{3!r}*totPMTCene/{2!r}) / (1-{3!r}) / {0!r}".format(containment, S_attenuation_correction, C_attenuation_correction, chi_value)
+    }
+
+
+def GetDFrdf(run, Cut, filename, energy, containment, hists):
+    # Same as GetDF, with the cut, the derived variables and the containment
+    # variables run as an RDataFrame graph (TBAna_RDF)
+    # hists is a list of (histogram, column) filled in the same event loop
+    print("Using file (RDataFrame): ", filename, energy)
+    cutflow = []
+    derived = dict(derivedVars, **ContainmentVars(containment))
+    data = ReadRDF(infolder+filename, Cut, derived, readBranches, hists, cutflow)
+    if(cutflow): PrintCutflow(cutflow)
+    # input truth energy to dataframe
+    data["TruthE"] = energy
+    return data
 
-    data["pmtS_cont_att"] = data["totPMTSene"]/containment/S_attenuation_correction
-    data["pmtC_cont_att"] = data["totPMTCene"]/containment/C_attenuation_correction
 
-    data["totDRene"] = (data["totPMTSene"]-chi_value*data["totPMTCene"]) / (1-chi_value)
-    data["totDRene_cont"] = data["totDRene"]/containment
-    data["totDRene_cont_att"] = (data["totPMTSene"]/S_attenuation_correction-chi_value*data["totPMTCene"]/C_attenuation_correction) / (1-chi_value) / containment
+def AddContainmentVars(data, energy, containment):
+    data = AddDerivedVars(data, ContainmentVars(containment))
 
     # input truth energy to dataframe
     data["TruthE"] = energy
@@ -111,43 +185,59 @@ def GetDF(run, Cut, filename, energy, containment):
 
 
 
-#def GetAsymProfiles(data, energy):
-def GetAsymProfilesMPV(data, energy, mpv_sci, mpv_cer, mpv_dr):
+def RunExpressions(containment, variables):
+    # Expressions of the variables of GetDF (and of the derived variables they
+    # may use), for the keys of the histogram cache
+    definitions = dict(derivedVars, **ContainmentVars(containment))
+    return ["{0} = {1}".format(var, definitions.get(var, var)) for var in variables] + list(derivedVars.values())
+
+
+def AsymProfiles(data, energy, norm_dr, norm_sci, norm_cer, source=None):
+    # The four asymmetry profiles of GetAsymProfiles(MPV), filled with the events
+    # of data and normalised to norm_dr/norm_sci/norm_cer, as histogram dicts
+    # (TBAna_Hist): profiles filled on chunks of a run or in worker processes
+    # are combined with Merge (or ToBuffer/MergeBuffers) before the fit
+    # source: (file, cut, containment) data was read with, to take the profiles
+    # from the histogram cache (None: always filled)
     # Profile normalised energy Vs Asymmetry
-    DReneAsymSprof = ROOT.TProfile("DReneAsymSprof_{0}GeV".format(energy), r" DR Energy profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; E_DR/E".format(energy), 100, -1, 1)
-    DReneAsymCprof = ROOT.TProfile("DReneAsymCprof_{0}GeV".format(energy), r"DR Energy profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; E_DR/E".format(energy), 100, -1, 1)
+    DReneAsymSprof = Profile("DReneAsymSprof_{0}GeV".format(energy), r" DR Energy profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; E_DR/E".format(energy), *asymProfBins)
+    DReneAsymCprof = Profile("DReneAsymCprof_{0}GeV".format(energy), r"DR Energy profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; E_DR/E".format(energy), *asymProfBins)
 
     # Profile normalised energy Vs Asymmetry
-    SciAsymprof = ROOT.TProfile("sciprof_{0}GeV".format(energy), "totPMTSene profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; totPMTSene/E".format(energy), 100, -1, 1)
-    CerAsymprof = ROOT.TProfile("cerprof_{0}GeV".format(energy), "totPMTCene profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; totPMTCene/E".format(energy), 100, -1, 1)
-
-    for DRene, asymS,  asymC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values):
-        # profile with truth energy
-        #DReneAsymSprof.Fill(asymS, DRene/energy)
-        #DReneAsymCprof.Fill(asymC, DRene/energy)
-        # profile with channel most probable value
-        DReneAsymSprof.Fill(asymS, DRene/mpv_dr)
-        DReneAsymCprof.Fill(asymC, DRene/mpv_dr)
-
-
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        # profile with truth energy
-        #SciAsymprof.Fill(asymS, pmtS/energy)
-        #CerAsymprof.Fill(asymC, pmtC/energy)
-        # profile with channel most probable value
-        SciAsymprof.Fill(asymS, pmtS/mpv_sci)
-        CerAsymprof.Fill(asymC, pmtC/mpv_cer)
-
-    # Fit asymmetry with 5 degree polynomial
-    DReneAsymSprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    DReneAsymCprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    SciAsymprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    CerAsymprof.Fit("pol5", "Q", "", -0.9, 0.9) 
+    SciAsymprof = Profile("sciprof_{0}GeV".format(energy), "totPMTSene profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; totPMTSene/E".format(energy), *asymProfBins)
+    CerAsymprof = Profile("cerprof_{0}GeV".format(energy), "totPMTCene profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; totPMTCene/E".format(energy), *asymProfBins)
+
+    # the four profiles are filled together, in one pass over the columns
+    booking = []
+    for prof, varX, varY, norm in [(DReneAsymSprof, "AsymS", "totDRene_cont", norm_dr), (DReneAsymCprof, "AsymC", "totDRene_cont", norm_dr),
+                                   (SciAsymprof, "AsymS", "pmtS_cont", norm_sci), (CerAsymprof, "AsymC", "pmtC_cont", norm_cer)]:
+        key = None
+        if(source is not None):
+            filename, Cut, containment = source
+            key = HistKey(filename, Cut, prof, RunExpressions(containment, [varX, varY]) + ["{0}/{1!r}".format(varY, float(norm))])
+        Book(booking, prof, data[varX], lambda varY=varY, norm=norm: data[varY].values/norm, key=key)
+    return FillBooked(booking, toROOT=False)
+
+
+#def GetAsymProfiles(data, energy):
+def GetAsymProfilesMPV(data, energy, mpv_sci, mpv_cer, mpv_dr, source=None, stored=None):
+    # profile with channel most probable value
+    # stored: the four polynomials (TBAna_Func) of the parametrisation store,
+    # attached to the profiles instead of refitting them
+    profiles = AsymProfiles(data, energy, mpv_dr, mpv_sci, mpv_cer, source)
+    DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof = [ToROOT(prof) for prof in profiles]
+
+    if(stored is None):
+        # Fit asymmetry with 5 degree polynomial, the four profiles at once
+        FitPoly([DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof], asymFitDegree, *asymFitRange)
+    else:
+        for prof, poly in zip([DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof], stored):
+            AttachStoredPoly(prof, poly)
     # Get fitted function
-    fDReneAsymS = DReneAsymSprof.GetFunction("pol5")
-    fDReneAsymC = DReneAsymCprof.GetFunction("pol5")
-    fPMTSeneAsym = SciAsymprof.GetFunction("pol5")
-    fPMTCeneAsym = CerAsymprof.GetFunction("pol5")
+    fDReneAsymS = DReneAsymSprof.GetFunction("pol{0}".format(asymFitDegree))
+    fDReneAsymC = DReneAsymCprof.GetFunction("pol{0}".format(asymFitDegree))
+    fPMTSeneAsym = SciAsymprof.GetFunction("pol{0}".format(asymFitDegree))
+    fPMTCeneAsym = CerAsymprof.GetFunction("pol{0}".format(asymFitDegree))
 
 
     ROOT.gStyle.SetOptStat(0)
@@ -170,41 +260,17 @@ def GetAsymProfilesMPV(data, energy, mpv_sci, mpv_cer, mpv_dr):
 
 
 def GetAsymProfiles(data, energy):
-    # Profile normalised energy Vs Asymmetry
-    DReneAsymSprof = ROOT.TProfile("DReneAsymSprof_{0}GeV".format(energy), r" DR Energy profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; E_DR/E".format(energy), 100, -1, 1)
-    DReneAsymCprof = ROOT.TProfile("DReneAsymCprof_{0}GeV".format(energy), r"DR Energy profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; E_DR/E".format(energy), 100, -1, 1)
+    # profile with truth energy
+    profiles = AsymProfiles(data, energy, energy, energy, energy)
+    DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof = [ToROOT(prof) for prof in profiles]
 
-    # Profile normalised energy Vs Asymmetry
-    SciAsymprof = ROOT.TProfile("sciprof_{0}GeV".format(energy), "totPMTSene profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; totPMTSene/E".format(energy), 100, -1, 1)
-    CerAsymprof = ROOT.TProfile("cerprof_{0}GeV".format(energy), "totPMTCene profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; totPMTCene/E".format(energy), 100, -1, 1)
-
-    for DRene, asymS,  asymC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values):
-        # profile with truth energy
-        DReneAsymSprof.Fill(asymS, DRene/energy)
-        DReneAsymCprof.Fill(asymC, DRene/energy)
-        # profile with channel most probable value
-        #DReneAsymSprof.Fill(asymS, DRene/mpv_dr)
-        #DReneAsymCprof.Fill(asymC, DRene/mpv_dr)
-
-
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        # profile with truth energy
-        SciAsymprof.Fill(asymS, pmtS/energy)
-        CerAsymprof.Fill(asymC, pmtC/energy)
-        # profile with channel most probable value
-        #SciAsymprof.Fill(asymS, pmtS/mpv_sci)
-        #CerAsymprof.Fill(asymC, pmtC/mpv_cer)
-
-    # Fit asymmetry with 5 degree polynomial
-    DReneAsymSprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    DReneAsymCprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    SciAsymprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    CerAsymprof.Fit("pol5", "Q", "", -0.9, 0.9) 
+    # Fit asymmetry with 5 degree polynomial, the four profiles at once
+    FitPoly([DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof], asymFitDegree, *asymFitRange)
     # Get fitted function
-    fDReneAsymS = DReneAsymSprof.GetFunction("pol5")
-    fDReneAsymC = DReneAsymCprof.GetFunction("pol5")
-    fPMTSeneAsym = SciAsymprof.GetFunction("pol5")
-    fPMTCeneAsym = CerAsymprof.GetFunction("pol5")
+    fDReneAsymS = DReneAsymSprof.GetFunction("pol{0}".format(asymFitDegree))
+    fDReneAsymC = DReneAsymCprof.GetFunction("pol{0}".format(asymFitDegree))
+    fPMTSeneAsym = SciAsymprof.GetFunction("pol{0}".format(asymFitDegree))
+    fPMTCeneAsym = CerAsymprof.GetFunction("pol{0}".format(asymFitDegree))
 
 
     ROOT.gStyle.SetOptStat(0)
@@ -226,53 +292,64 @@ def GetAsymProfiles(data, energy):
     return data, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof, fPMTSeneAsym, fPMTCeneAsym, SciAsymprof, CerAsymprof
 
 
-def DrawColzPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax):
-    cCanva = ROOT.TCanvas(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), 1400, 1200)
-    colHist = ROOT.TH2D(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), nbinX, xmin, xmax, nbinY, ymin, ymax)
-    for xval, yval in zip(varX, varY):
-        colHist.Fill(xval, yval)
-    colHist.Draw("colz")
-    cCanva.SaveAs(outfile)
+def PlotKey(source, hist, outfile, varX, varY):
+    # Key of a plot in the histogram cache (TBAna_Hist), None without source:
+    # source is the (file, cut, expressions) of the events, the columns are
+    # identified by their name and the plot by its output file
+    if(source is None):
+        return None
+    filename, Cut, expressions = source
+    return HistKey(filename, Cut, hist, expressions + ["plot = {0}".format(outfile), "x = {0}".format(varX.name), "y = {0}".format(varY.name)])
+
+
+def DrawColzPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=None, source=None):
+    # With a booking list, the plot is only declared here: it is filled and
+    # drawn by FillBooked, in one pass with the other booked plots
+    # source: see PlotKey, to take the plot from the histogram cache
+    colHist = Hist2D(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), nbinX, xmin, xmax, nbinY, ymin, ymax)
+    def Draw(colHist):
+        cCanva = ROOT.TCanvas(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), 1400, 1200)
+        colHist.Draw("colz")
+        cCanva.SaveAs(outfile)
+    Book(booking, colHist, varX, varY, then=Draw, key=PlotKey(source, colHist, outfile, varX, varY))
 
 
-def DrawProfPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, markerStyle=20, markerColor=ROOT.kBlue):
-    cCanva = ROOT.TCanvas(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), 1400, 1200)
-    myProf = ROOT.TProfile(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), nbinX, xmin, xmax)
-    for xval, yval in zip(varX, varY):
-        myProf.Fill(xval, yval)
-    myProf.SetMarkerStyle(markerStyle); myProf.SetMarkerColor(markerColor)
-    myProf.Draw("colz")
-    cCanva.SaveAs(outfile)
+def DrawProfPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, markerStyle=20, markerColor=ROOT.kBlue, booking=None, source=None):
+    # booking, source: as in DrawColzPlot
+    myProf = Profile(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), nbinX, xmin, xmax)
+    def Draw(myProf):
+        cCanva = ROOT.TCanvas(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), 1400, 1200)
+        myProf.SetMarkerStyle(markerStyle); myProf.SetMarkerColor(markerColor)
+        myProf.Draw("colz")
+        cCanva.SaveAs(outfile)
+    Book(booking, myProf, varX, varY, then=Draw, key=PlotKey(source, myProf, outfile, varX, varY))
 
 
 def GetTDCProfiles(data, energy):
     # profile energy over TS11 or TC11 TDC information
-    DReneStdcProf = ROOT.TProfile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), 100, 600, 720)
-    DReneCtdcProf = ROOT.TProfile("DReneCtdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_DR/E".format(energy), 100, 600, 720)
-    ScieneStdcProf = ROOT.TProfile("ScieneStdcprof_{0}GeV".format(energy), r"S Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_S/E".format(energy), 100, 600, 720)
-    CereneCtdcProf = ROOT.TProfile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), 100, 600, 720)
-
-    # Fill profiles
-    for DRene, asymS,  asymC, tdcS, tdcC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values, data["TDC_TS11"].values, data["TDC_TC11"].values):
-        DReneStdcProf.Fill(tdcS, DRene/energy)
-        DReneCtdcProf.Fill(tdcC, DRene/energy)
-
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        ScieneStdcProf.Fill(tdcS, pmtS/energy)
-        CereneCtdcProf.Fill(tdcC, pmtC/energy)
-
-    UpLimit = [680, 680, 680, 680]
-
-    # Fit TDC with a straight line
-    f1 = DReneStdcProf.Fit("pol1", "SQ", "", 620, UpLimit[0])
-    f2 = DReneCtdcProf.Fit("pol1", "SQ", "", 620, UpLimit[1])
-    f3 = ScieneStdcProf.Fit("pol1", "SQ", "", 620, UpLimit[2])
-    f4 = CereneCtdcProf.Fit("pol1", "SQ", "", 620, UpLimit[3])
+    DReneStdcProf = Profile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), *tdcProfBins)
+    DReneCtdcProf = Profile("DReneCtdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_DR/E".format(energy), *tdcProfBins)
+    ScieneStdcProf = Profile("ScieneStdcprof_{0}GeV".format(energy), r"S Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_S/E".format(energy), *tdcProfBins)
+    CereneCtdcProf = Profile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), *tdcProfBins)
+
+    # Fill profiles, together in one pass over the columns
+    booking = []
+    Book(booking, DReneStdcProf, data["TDC_TS11"], data["totDRene_cont"].values/energy)
+    Book(booking, DReneCtdcProf, data["TDC_TC11"], data["totDRene_cont"].values/energy)
+
+    Book(booking, ScieneStdcProf, data["TDC_TS11"], data["pmtS_cont"].values/energy)
+    Book(booking, CereneCtdcProf, data["TDC_TC11"], data["pmtC_cont"].values/energy)
+    DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf = FillBooked(booking)
+
+    UpLimit = [tdcFitRange[1]]*4
+
+    # Fit TDC with a straight line, the four profiles at once
+    FitPoly([DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf], tdcFitDegree, tdcFitRange[0], UpLimit)
     # Get fitted function
-    fDReneStdc = DReneStdcProf.GetFunction("pol1")
-    fDReneCtdc = DReneCtdcProf.GetFunction("pol1")
-    fScieneStdc = ScieneStdcProf.GetFunction("pol1")
-    fCereneCtdc = CereneCtdcProf.GetFunction("pol1")
+    fDReneStdc = DReneStdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fDReneCtdc = DReneCtdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fScieneStdc = ScieneStdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fCereneCtdc = CereneCtdcProf.GetFunction("pol{0}".format(tdcFitDegree))
 
     # Get fitted function
     fDReneStdc.SetRange(600, 750)
@@ -317,35 +394,37 @@ def GetTDCProfiles(data, energy):
 
 
 # Same as before, with considering most probable values instead of truth energy
-def GetTDCProfilesMPV(data, energy, mpv_sci, mpv_cer, mpv_dr):
+def GetTDCProfilesMPV(data, energy, mpv_sci, mpv_cer, mpv_dr, stored=None):
+    # stored: as in GetAsymProfilesMPV
 
     # profile energy over TS11 or TC11 TDC information
-    DReneStdcProf = ROOT.TProfile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), 100, 600, 720)
-    DReneCtdcProf = ROOT.TProfile("DReneCtdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_DR/E".format(energy), 100, 600, 720)
-    ScieneStdcProf = ROOT.TProfile("ScieneStdcprof_{0}GeV".format(energy), r"S Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_S/E".format(energy), 100, 600, 720)
-    CereneCtdcProf = ROOT.TProfile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), 100, 600, 720)
-
-    # Fill profiles
-    for DRene, asymS,  asymC, tdcS, tdcC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values, data["TDC_TS11"].values, data["TDC_TC11"].values):
-        DReneStdcProf.Fill(tdcS, DRene/mpv_dr)
-        DReneCtdcProf.Fill(tdcC, DRene/mpv_dr)
-
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        ScieneStdcProf.Fill(tdcS, pmtS/mpv_sci)
-        CereneCtdcProf.Fill(tdcC, pmtC/mpv_cer)
-
-    UpLimit = [680, 680, 680, 680]
-
-    # Fit TDC with a straight line
-    f1 = DReneStdcProf.Fit("pol1", "SQ", "", 620, UpLimit[0])
-    f2 = DReneCtdcProf.Fit("pol1", "SQ", "", 620, UpLimit[1])
-    f3 = ScieneStdcProf.Fit("pol1", "SQ", "", 620, UpLimit[2])
-    f4 = CereneCtdcProf.Fit("pol1", "SQ", "", 620, UpLimit[3])
+    DReneStdcProf = Profile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), *tdcProfBins)
+    DReneCtdcProf = Profile("DReneCtdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_DR/E".format(energy), *tdcProfBins)
+    ScieneStdcProf = Profile("ScieneStdcprof_{0}GeV".format(energy), r"S Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_S/E".format(energy), *tdcProfBins)
+    CereneCtdcProf = Profile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), *tdcProfBins)
+
+    # Fill profiles, together in one pass over the columns
+    booking = []
+    Book(booking, DReneStdcProf, data["TDC_TS11"], data["totDRene_cont"].values/mpv_dr)
+    Book(booking, DReneCtdcProf, data["TDC_TC11"], data["totDRene_cont"].values/mpv_dr)
+
+    Book(booking, ScieneStdcProf, data["TDC_TS11"], data["pmtS_cont"].values/mpv_sci)
+    Book(booking, CereneCtdcProf, data["TDC_TC11"], data["pmtC_cont"].values/mpv_cer)
+    DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf = FillBooked(booking)
+
+    UpLimit = [tdcFitRange[1]]*4
+
+    if(stored is None):
+        # Fit TDC with a straight line, the four profiles at once
+        FitPoly([DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf], tdcFitDegree, tdcFitRange[0], UpLimit)
+    else:
+        for prof, poly in zip([DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf], stored):
+            AttachStoredPoly(prof, poly)
     # Get fitted function
-    fDReneStdc = DReneStdcProf.GetFunction("pol1")
-    fDReneCtdc = DReneCtdcProf.GetFunction("pol1")
-    fScieneStdc = ScieneStdcProf.GetFunction("pol1")
-    fCereneCtdc = CereneCtdcProf.GetFunction("pol1")
+    fDReneStdc = DReneStdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fDReneCtdc = DReneCtdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fScieneStdc = ScieneStdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fCereneCtdc = CereneCtdcProf.GetFunction("pol{0}".format(tdcFitDegree))
 
     # Get fitted function
     fDReneStdc.SetRange(600, 750)
@@ -390,10 +469,10 @@ def GetTDCProfilesMPV(data, energy, mpv_sci, mpv_cer, mpv_dr):
 
 
 def GetProfileFit(data, energy, funcname, varx, vary, nbinsX, xmin, xmax, profname, labelX, labelY, fitmin, fitmax):
+    # funcname: polN, fitted as linear least squares (TBAna_Fit)
     prof = ROOT.TProfile("{0}_{1}".format(profname, energy), "{0}_{1};{2};{3}".format(profname, energy, labelX, labelY), nbinsX, xmin, xmax)
-    for x, y in zip(data[varx], data[vary]):
-        prof.Fill(x, y/energy)
-    prof.Fit(funcname, "Q", "", fitmin, fitmax)
+    FillROOT(prof, data[varx].values, data[vary].values/energy)
+    FitPoly([prof], int(funcname[3:]), fitmin, fitmax)
     fit = prof.GetFunction(funcname)
     cTestProfile = ROOT.TCanvas("cProfile_{0}".format(profname), "{0}_{1}".format(profname, energy), 1400, 1200)
     prof.SetMarkerStyle(20); prof.SetMarkerColor(ROOT.kBlack); prof.SetMarkerSize(2); fit.SetLineColor(ROOT.kRed)
@@ -405,21 +484,20 @@ def GetProfileFit(data, energy, funcname, varx, vary, nbinsX, xmin, xmax, profna
 
 
 
+def EnergyHists(energy):
+    # Empty histograms (TBAna_Hist) of DrawEnergyHist for one energy: S, C, DR, DR corrected
+    return [Hist1D("hist{0}{1}".format(channel, energy), "hist{0}{1}; E [GeV]; Normalized Counts".format(channel, energy), 160, 0., 160)
+            for channel in ["S", "C", "DR", "DRcorr"]]
+
+
 def DrawEnergyHist(dfs, energies, binning_S, binning_C, varname_S, varname_C):
     ROOT.gStyle.SetOptStat(0)
     histlistS = []; histlistC = []; histlistDR = []; histlistDRcorr = []
-    for i, (df, energy) in enumerate(zip(dfs, energies)):
-        histS = ROOT.TH1D("histS{0}".format(energy), "histS{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
-        histC = ROOT.TH1D("histC{0}".format(energy), "histC{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
-        histDR = ROOT.TH1D("histDR{0}".format(energy), "histDR{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
-        histDRcorr = ROOT.TH1D("histDRcorr{0}".format(energy), "histDRcorr{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
-
-
-        for varS, varC, varDR, varDRcorr in zip(df[varname_S], df[varname_C], df["totDRene"], df["totDRene_cont"]): 
-            histS.Fill(varS)
-            histC.Fill(varC)
-            histDR.Fill(varDR)
-            histDRcorr.Fill(varDRcorr)
+    # the events are already in memory: the histograms are filled here (sending
+    # the arrays to worker processes would cost more than the fill)
+    for i, (energy, df) in enumerate(zip(energies, dfs)):
+        values = [df[varname_S].values, df[varname_C].values, df["totDRene"].values, df["totDRene_cont"].values]
+        histS, histC, histDR, histDRcorr = [ToROOT(Fill(hist, array)) for hist, array in zip(EnergyHists(energy), values)]
 
         histS.SetLineColor(i+1)
         histC.SetLineColor(i+1)
@@ -500,8 +578,7 @@ def DrawFem(energy, eneS, eneC, labelS, labelC, title, outname):
     ROOT.gStyle.SetOptStat(0)
     cFem = ROOT.TCanvas(title, title, 1400, 1200)
     histfem = ROOT.TH2D("histfem{0}GeV".format(energy), "{3}, {0}GeV;{1}/E;{2}/E".format(energy, labelS, labelC, title), 50, 0., 1.5, 50, 0., 1.5)
-    for s, c in zip(eneS, eneC):
-        histfem.Fill(s/energy, c/energy)
+    FillROOT(histfem, np.asarray(eneS)/energy, np.asarray(eneC)/energy)
     histfem.Draw("colz")
     cFem.SaveAs("{0}{1}.png".format(outname, energy))
     ROOT.gStyle.SetOptStat(1)
@@ -527,9 +604,6 @@ def main():
 
 
 
-    cutCalib = 5000
-
-
     # 20 GeV runs (new HV): 0766, 0999, 1018
     # open one run, get map of tower values
     
@@ -573,10 +647,7 @@ def main():
     CurrentCut = myCut + " & (XDWC2 > {0}) & (XDWC2 < {1}) & (YDWC2 > {2}) & (YDWC2 < {3})".format(cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index]) 
 
     #df, funcS, funcC, eneSprof, eneCprof = GetDFparametrization(run, CurrentCut, filename, energy)
-    root_file = uproot.open(calibfolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=myCut, library="pd")
-    data = data[:cutCalib]
+    data = ReadDF(calibfolder+filename, myCut, branches=["totPMTSene", "totPMTCene"] + towerBranchesS + towerBranchesC)
 
     inputs_name_S = ['TS55', 'TS54', 'TS53', 'TS45', 'TS44', 'TS43',
                     'TS35', 'TS34', 'TS33', 'TS25', 'TS24', 'TS23', 'TS16',
@@ -602,9 +673,8 @@ def main():
         row = nBinsY-int(index/3)-1
         print(tow, "\t", row, "\t", column)
 
-        for pmtS in data[tow]:
-            #mapSpmt.Fill(index+1, pmtS/energy)
-            mapSpmt.Fill(column+.5, row+.5, pmtS/calib_energy)
+        #FillROOT(mapSpmt, np.full(len(data), index+1.), data[tow].values/energy)
+        FillROOT(mapSpmt, np.full(len(data), column+.5), np.full(len(data), row+.5), data[tow].values/calib_energy)
         #mapSpmt.GetXaxis().SetBinLabel(column+1,  )    
         
 
@@ -628,46 +698,12 @@ def main():
 
     cSpmt.SaveAs("mapSpmt.png")
 
-    A_S = np.array([
-        data['TS55'].to_numpy(), data['TS54'].to_numpy(), data['TS53'].to_numpy(),
-        data['TS45'].to_numpy(), data['TS44'].to_numpy(), data['TS43'].to_numpy(),
-        data['TS35'].to_numpy(), data['TS34'].to_numpy(), data['TS33'].to_numpy(),
-        data['TS25'].to_numpy(), data['TS24'].to_numpy(), data['TS23'].to_numpy(),
-        data['TS16'].to_numpy(), data['TS15'].to_numpy(), data['TS14'].to_numpy(),
-        data['TS17'].to_numpy(), data['TS00'].to_numpy(), data['TS13'].to_numpy(),
-        data['TS10'].to_numpy(), data['TS11'].to_numpy(), data['TS12'].to_numpy(),
-        data['TS20'].to_numpy(), data['TS21'].to_numpy(), data['TS22'].to_numpy(),
-        data['TS30'].to_numpy(), data['TS31'].to_numpy(), data['TS32'].to_numpy(),
-        data['TS40'].to_numpy(), data['TS41'].to_numpy(), data['TS42'].to_numpy(),
-        data['TS50'].to_numpy(), data['TS51'].to_numpy(), data['TS52'].to_numpy(),
-        data['TS60'].to_numpy(), data['TS61'].to_numpy(), data['TS62'].to_numpy()
-        ])
-
-    A_C = np.array([
-        data['TC55'].to_numpy(), data['TC54'].to_numpy(), data['TC53'].to_numpy(),
-        data['TC45'].to_numpy(), data['TC44'].to_numpy(), data['TC43'].to_numpy(),
-        data['TC35'].to_numpy(), data['TC34'].to_numpy(), data['TC33'].to_numpy(),
-        data['TC25'].to_numpy(), data['TC24'].to_numpy(), data['TC23'].to_numpy(),
-        data['TC16'].to_numpy(), data['TC15'].to_numpy(), data['TC14'].to_numpy(),
-        data['TC17'].to_numpy(), data['TC00'].to_numpy(), data['TC13'].to_numpy(),
-        data['TC10'].to_numpy(), data['TC11'].to_numpy(), data['TC12'].to_numpy(),
-        data['TC20'].to_numpy(), data['TC21'].to_numpy(), data['TC22'].to_numpy(),
-        data['TC30'].to_numpy(), data['TC31'].to_numpy(), data['TC32'].to_numpy(),
-        data['TC40'].to_numpy(), data['TC41'].to_numpy(), data['TC42'].to_numpy(),
-        data['TC50'].to_numpy(), data['TC51'].to_numpy(), data['TC52'].to_numpy(),
-        data['TC60'].to_numpy(), data['TC61'].to_numpy(), data['TC62'].to_numpy()
-        ])
-
-    print(A_S)
-    print(A_S.T)
     print(data.shape)
-    print(data.shape[0])
-    target = np.full(data.shape[0], calib_energy)
-    sol_Sci = optimize.lsq_linear(A_S.T, target)
-    weights_Sci = sol_Sci.x
-
-    sol_Cer = optimize.lsq_linear(A_C.T, target)
-    weights_Cer = sol_Cer.x
+    # S and C tower weights calibrated jointly on the whole electron scan, each
+    # run with its beam energy as target (TBAna_Calib), kept in the
+    # parametrisation store (weightsLabel)
+    weights_Sci, weights_Cer, calibS, calibC = CalibrateScan([calibfolder + "physics_sps2024_run" + calibRun + ".root" for calibRun in runs],
+                                                             myCut, run_energies, label=weightsLabel)
 
 
     print(weights_Sci)
@@ -725,9 +761,11 @@ def main():
     cCanvaCer.SaveAs("testC.png")
 
 
-    # Apply and test recalibration
-    correctedSciene = np.dot(A_S.T, weights_Sci)
-    correctedCerene = np.dot(A_C.T, weights_Cer)
+    # Apply and test recalibration, on all the events of the run (not one of
+    # the calibration runs)
+    towers = TowerMatrix(data)
+    correctedSciene = np.dot(TowersS(towers), weights_Sci)
+    correctedCerene = np.dot(TowersC(towers), weights_Cer)
 
     print( correctedSciene.shape )
     #print(data["totPMTSene"].mean(), data["totPMTSene"].rms())
@@ -735,18 +773,16 @@ def main():
 
     hist1Sci = ROOT.TH1D("totPMTSene", "totPMTSene", 100, 0., calib_energy*1.5)
     hist2Sci = ROOT.TH1D("eneScorrected", "eneScorrected", 100, 0., calib_energy*1.5)
-    for pmtS, eneS in zip(data["totPMTSene"], correctedSciene):
-        hist1Sci.Fill(pmtS)
-        hist2Sci.Fill(eneS)
+    FillROOT(hist1Sci, data["totPMTSene"].values)
+    FillROOT(hist2Sci, correctedSciene)
 
     print("totPMTSene: ", hist1Sci.GetMean(), " +- ", hist1Sci.GetRMS())
     print("After Calib: ", hist2Sci.GetMean(), " +- ", hist2Sci.GetRMS())
 
     hist1Cer = ROOT.TH1D("totPMTCene", "totPMTCene", 100, 0., calib_energy*1.5)
     hist2Cer = ROOT.TH1D("eneCcorrected", "eneCcorrected", 100, 0.,calib_energy*1.5)
-    for pmtC, eneC in zip(data["totPMTCene"], correctedCerene):
-        hist1Cer.Fill(pmtC)
-        hist2Cer.Fill(eneC)
+    FillROOT(hist1Cer, data["totPMTCene"].values)
+    FillROOT(hist2Cer, correctedCerene)
 
     print("totPMTCene: ", hist1Cer.GetMean(), " +- ", hist1Cer.GetRMS())
     print("After Calib: ", hist2Cer.GetMean(), " +- ", hist2Cer.GetRMS())
@@ -839,6 +875,28 @@ def main():
     MeanVec_C=[]; RmsVec_C=[]; MeanErrVec_C=[]; RmsErrVec_C=[] 
     MeanVec_Comb=[]; RmsVec_Comb=[]; MeanErrVec_Comb=[]; RmsErrVec_Comb=[] 
     MeanVec_Comb_Asym=[]; RmsVec_Comb_Asym=[]; MeanErrVec_Comb_Asym=[]; RmsErrVec_Comb_Asym=[] 
+    # selected energies of each run for the bootstrap
+    bootstrapS = []; bootstrapC = []; bootstrapComb = []
+
+    # The 40 GeV parametrisations are kept in the parametrisation store
+    # (TBAna_ParStore), with the inputs they were fitted from. They are looked
+    # up before the first loop: if nothing changed, the 40 GeV profiles are
+    # not refitted and the stored functions are drawn on them; otherwise the
+    # new fits are saved as a new version after the loop
+    parIndex = 1
+    parLabel = "TBAna_Had {0}GeV".format(energies[parIndex])
+    parSettings = {"chi_value": chi_value, "containment": exp_containment[parIndex], "derivedVars": derivedVars,
+                   "mpvBins": mpvBins, "asymProfBins": asymProfBins, "asymFit": (asymFitDegree, asymFitRange),
+                   "tdcSelection": (tdcBranches, tdcMin, tdcMaxS11, tdcMaxC11), "tdcShift": tdcShift.get(runs[parIndex], 0),
+                   "tdcProfBins": tdcProfBins, "tdcFit": (tdcFitDegree, tdcFitRange)}
+    parKey = ParKey(infolder+"physics_sps2024_run" + runs[parIndex] + ".root", myCut, parSettings)
+    pars = LoadPars(parLabel, parKey)
+
+    # Read the runs and derive their columns in parallel (TBAna_Parallel), the
+    # histograms, profiles and fits of the first loop stay in this process
+    if(not streamStep and backend == "pandas"):
+        filenames = ["physics_sps2024_run" + run + ".root" for run in runs]
+        runDFs = MapRuns(GetDF, runs, [myCut]*len(runs), filenames, energies, exp_containment)
 
     # First loop: prepare data and extract parametrizations for asymmetry and TDC information    
     for index, (run, energy, cont) in enumerate(zip(runs, energies, exp_containment)):
@@ -854,53 +912,36 @@ def main():
         #df = GetDFparametrization(run, CurrentCut, filename, energy)
         # read data and add asymmetry variable
 
-        df = GetDF(run, CurrentCut, filename, energy, cont)
-
-
-
-        # Apply and test recalibration
-        A_S = np.array([
-            df['TS55'].to_numpy(), df['TS54'].to_numpy(), df['TS53'].to_numpy(),
-            df['TS45'].to_numpy(), df['TS44'].to_numpy(), df['TS43'].to_numpy(),
-            df['TS35'].to_numpy(), df['TS34'].to_numpy(), df['TS33'].to_numpy(),
-            df['TS25'].to_numpy(), df['TS24'].to_numpy(), df['TS23'].to_numpy(),
-            df['TS16'].to_numpy(), df['TS15'].to_numpy(), df['TS14'].to_numpy(),
-            df['TS17'].to_numpy(), df['TS00'].to_numpy(), df['TS13'].to_numpy(),
-            df['TS10'].to_numpy(), df['TS11'].to_numpy(), df['TS12'].to_numpy(),
-            df['TS20'].to_numpy(), df['TS21'].to_numpy(), df['TS22'].to_numpy(),
-            df['TS30'].to_numpy(), df['TS31'].to_numpy(), df['TS32'].to_numpy(),
-            df['TS40'].to_numpy(), df['TS41'].to_numpy(), df['TS42'].to_numpy(),
-            df['TS50'].to_numpy(), df['TS51'].to_numpy(), df['TS52'].to_numpy(),
-            df['TS60'].to_numpy(), df['TS61'].to_numpy(), df['TS62'].to_numpy()
-            ])
-
-        A_C = np.array([
-            df['TC55'].to_numpy(), df['TC54'].to_numpy(), df['TC53'].to_numpy(),
-            df['TC45'].to_numpy(), df['TC44'].to_numpy(), df['TC43'].to_numpy(),
-            df['TC35'].to_numpy(), df['TC34'].to_numpy(), df['TC33'].to_numpy(),
-            df['TC25'].to_numpy(), df['TC24'].to_numpy(), df['TC23'].to_numpy(),
-            df['TC16'].to_numpy(), df['TC15'].to_numpy(), df['TC14'].to_numpy(),
-            df['TC17'].to_numpy(), df['TC00'].to_numpy(), df['TC13'].to_numpy(),
-            df['TC10'].to_numpy(), df['TC11'].to_numpy(), df['TC12'].to_numpy(),
-            df['TC20'].to_numpy(), df['TC21'].to_numpy(), df['TC22'].to_numpy(),
-            df['TC30'].to_numpy(), df['TC31'].to_numpy(), df['TC32'].to_numpy(),
-            df['TC40'].to_numpy(), df['TC41'].to_numpy(), df['TC42'].to_numpy(),
-            df['TC50'].to_numpy(), df['TC51'].to_numpy(), df['TC52'].to_numpy(),
-            df['TC60'].to_numpy(), df['TC61'].to_numpy(), df['TC62'].to_numpy()
-            ])
-
-
-        #df["totPMTSene"] = np.dot(A_S.T, weights_Sci)
-        #df["totPMTCene"] = np.dot(A_C.T, weights_Cer)
-
-        # Get the bin with the highest content (most probable bin)
-        scienehist = ROOT.TH1D("scienehist{0}".format(energy), "totPMTSene after cuts, containment correction applied ({0} GeV); E [GeV]; Counts".format(energy), 100, energy-0.9*energy, energy+1.2*energy)
-        cerenehist = ROOT.TH1D("cerenehist{0}".format(energy), "totPMTCene after cuts, containment correction applied ({0} GeV); E [GeV]; Counts".format(energy), 100, energy-0.9*energy, energy+1.2*energy)
-        drenehist = ROOT.TH1D("drenehist{0}".format(energy), "DRene after cuts, containment correction applied ({0} GeV); E [GeV]; Counts".format(energy), 100, energy-0.9*energy, energy+1.2*energy)
-        for eneS, eneC, eneDR in zip(df["pmtS_cont"], df["pmtC_cont"], df["totDRene_cont"]):
-            scienehist.Fill(eneS)
-            cerenehist.Fill(eneC)
-            drenehist.Fill(eneDR)
+        nbins, low, high = mpvBins
+        scienehist = ROOT.TH1D("scienehist{0}".format(energy), "totPMTSene after cuts, containment correction applied ({0} GeV); E [GeV]; Counts".format(energy), nbins, energy-low*energy, energy+high*energy)
+        cerenehist = ROOT.TH1D("cerenehist{0}".format(energy), "totPMTCene after cuts, containment correction applied ({0} GeV); E [GeV]; Counts".format(energy), nbins, energy-low*energy, energy+high*energy)
+        drenehist = ROOT.TH1D("drenehist{0}".format(energy), "DRene after cuts, containment correction applied ({0} GeV); E [GeV]; Counts".format(energy), nbins, energy-low*energy, energy+high*energy)
+
+        # quantile sketches of the three energies, for the sigma_eff and IQR resolutions
+        sketches = [(Sketch(), var) for var in ["pmtS_cont", "pmtC_cont", "totDRene_cont"]]
+        if(streamStep):
+            # histograms and sketches filled while reading, tower matrices are not kept
+            df = GetDFstream(run, CurrentCut, filename, energy, cont, [(scienehist, "pmtS_cont"), (cerenehist, "pmtC_cont"), (drenehist, "totDRene_cont")], sketches)
+        elif(backend == "rdf"):
+            # histograms filled in the event loop of the run
+            df = GetDFrdf(run, CurrentCut, filename, energy, cont, [(scienehist, "pmtS_cont"), (cerenehist, "pmtC_cont"), (drenehist, "totDRene_cont")])
+        else:
+            # released from runDFs, only dfs keeps the run for the later loops
+            df = runDFs[index]; runDFs[index] = None
+            # taken from the histogram cache (TBAna_Hist) if this run, cut and binning were already filled
+            booking = []
+            for hist, var in [(scienehist, "pmtS_cont"), (cerenehist, "pmtC_cont"), (drenehist, "totDRene_cont")]:
+                template = FromROOT(hist)
+                Book(booking, template, df[var].values, key=HistKey(infolder+filename, CurrentCut, template, RunExpressions(cont, [var])))
+            for hist, filled in zip([scienehist, cerenehist, drenehist], FillBooked(booking, toROOT=False)):
+                WriteROOT(filled, hist)
+
+
+
+        # Apply and test recalibration (needs the towerBranchesS/C in readBranches)
+        #towers = TowerMatrix(df)
+        #df["totPMTSene"] = np.dot(TowersS(towers), weights_Sci)
+        #df["totPMTCene"] = np.dot(TowersC(towers), weights_Cer)
 
         ROOT.gStyle.SetOptStat(111111)
         cS = ROOT.TCanvas("cS{0}".format(energy), "cS{0}".format(energy), 1400, 1200)
@@ -933,40 +974,42 @@ def main():
         print(f"Cerene MPV: {mpv_cer:.2f}")
         print(f"DRene MPV: {mpv_dr:.2f}")
 
+        # robust resolutions (relative accuracy quantileAlpha on the quantiles)
+        for sketch, var in sketches:
+            if(not streamStep): Update(sketch, df[var].values)
+            print("{0}: sigma_eff = {1:.3f} GeV, IQR/1.349 = {2:.3f} GeV".format(var, SigmaEff(sketch), IQRSigma(sketch)))
+
 
         #df, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof,  fSciAsymProf, fCerAsymProf, SciAsymProf, CerAsymProf = GetDFparametrization(run, CurrentCut, filename, energy, cont)
         
         # simplify
         #df, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof,  fSciAsymProf, fCerAsymProf, SciAsymProf, CerAsymProf = GetAsymProfiles(df, energy)
         # profile over most probable value instead of truth energy
-        df, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof,  fSciAsymProf, fCerAsymProf, SciAsymProf, CerAsymProf = GetAsymProfilesMPV(df, energy, mpv_sci, mpv_cer, mpv_dr)
+        # the stored parametrisations of this run, if any, are not refitted
+        storedAsym = storedTdc = None
+        if(pars is not None and index == parIndex):
+            storedAsym = [pars[name] for name in ["DRS_Asym", "DRC_Asym", "Sci_Asym", "Cer_Asym"]]
+            storedTdc = [pars[name] for name in ["DRS_Tdc", "DRC_Tdc", "Sci_Tdc", "Cer_Tdc"]]
+        df, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof,  fSciAsymProf, fCerAsymProf, SciAsymProf, CerAsymProf = GetAsymProfilesMPV(df, energy, mpv_sci, mpv_cer, mpv_dr, (infolder+filename, CurrentCut, cont), storedAsym)
 
         # clean events with TS11<100
         # cleanup for TDCs
-        if(run=="1000"): 
-            df["TDC_TS11"] = df["TDC_TS11"]-60; df["TDC_TC11"] = df["TDC_TC11"]-60
-            df["TDC_TS15"] = df["TDC_TS15"]-60; df["TDC_TC15"] = df["TDC_TC15"]-60
-            df["TDC_TS00"] = df["TDC_TS00"]-60; df["TDC_TC00"] = df["TDC_TC00"]-60
+        if(run in tdcShift): 
+            for tdc in tdcBranches:
+                df[tdc] = df[tdc]-tdcShift[run]
 
 
-        min_tdc_sci = 600; max_tdc_sci = 720
-        min_tdc_cer = 600; max_tdc_cer = 675
+        min_tdc_sci = tdcMin; max_tdc_sci = tdcMaxS11
+        min_tdc_cer = tdcMin; max_tdc_cer = tdcMaxC11
 
-        df = df[df["TDC_TS00"]>600]
-        df = df[df["TDC_TS11"]>600]
-        df = df[df["TDC_TS15"]>600]
-        df = df[df["TDC_TC11"]>600]
-        df = df[df["TDC_TC15"]>600]
-        df = df[df["TDC_TC00"]>600]
-        df = df[df["TDC_TC11"]<675]
-        df = df[df["TDC_TS11"]<720]
+        df = df[(df[tdcBranches] > tdcMin).all(axis=1) & (df["TDC_TC11"] < tdcMaxC11) & (df["TDC_TS11"] < tdcMaxS11)]
 
 
         # plot TDC profiles and return
         # profile using truth energy
         #DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf, fDReneStdc, fDReneCtdc, fScieneStdc, fCereneCtdc = GetTDCProfiles(df, energy)
         # profile using most probable values of the three channels
-        DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf, fDReneStdc, fDReneCtdc, fScieneStdc, fCereneCtdc = GetTDCProfilesMPV(df, energy, mpv_sci, mpv_cer, mpv_dr)
+        DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf, fDReneStdc, fDReneCtdc, fScieneStdc, fCereneCtdc = GetTDCProfilesMPV(df, energy, mpv_sci, mpv_cer, mpv_dr, storedTdc)
 
 
 
@@ -1053,18 +1096,26 @@ def main():
         
 
     # comment since I'm only using 40 GeV parametrisation
+    # new 40 GeV fits (not in the store): saved as a new version
+    if(pars is None):
+        pars = {"DRS_Asym": PolyFromTF1(DReneAsymFitSvec[parIndex]), "DRC_Asym": PolyFromTF1(DReneAsymFitCvec[parIndex]),
+                "Sci_Asym": PolyFromTF1(SciAsymFitvec[parIndex]), "Cer_Asym": PolyFromTF1(CerAsymFitvec[parIndex]),
+                "DRS_Tdc": PolyFromTF1(DReneTdcFitSvec[parIndex]), "DRC_Tdc": PolyFromTF1(DReneTdcFitCvec[parIndex]),
+                "Sci_Tdc": PolyFromTF1(SciTdcFitvec[parIndex]), "Cer_Tdc": PolyFromTF1(CerTdcFitvec[parIndex])}
+        SavePars(parLabel, parKey, pars, {"run": runs[parIndex], "energy": energies[parIndex], "cut": myCut, "settings": repr(parSettings)})
+
     # extract asymmetry parametrisation for dual-readout energy at 40 GeV
     # with respect to S or C asymmetry, respectively
-    fDRS40Asym  = np.vectorize(DReneAsymFitSvec[1].Eval); fDRC40Asym  = np.vectorize(DReneAsymFitCvec[1].Eval)
+    fDRS40Asym  = PolyFunction(pars["DRS_Asym"]); fDRC40Asym  = PolyFunction(pars["DRC_Asym"])
 
     # extract asymmetry parametrisation for Sci and Cer energy at 40 GeV
-    fSci40Asym  = np.vectorize(SciAsymFitvec[1].Eval); fCer40Asym  = np.vectorize(CerAsymFitvec[1].Eval)
+    fSci40Asym  = PolyFunction(pars["Sci_Asym"]); fCer40Asym  = PolyFunction(pars["Cer_Asym"])
 
     # extract TDC parametrisation for dual-readout energy at 40 GeV
-    fDReneStdc40  = np.vectorize(DReneTdcFitSvec[1].Eval); fDReneCtdc40  = np.vectorize(DReneTdcFitCvec[1].Eval)
+    fDReneStdc40  = PolyFunction(pars["DRS_Tdc"]); fDReneCtdc40  = PolyFunction(pars["DRC_Tdc"])
 
     # extract asymmetry parametrisation for Sci and Cer energy at 40 GeV
-    fSci40Tdc  = np.vectorize(SciTdcFitvec[1].Eval); fCer40Tdc  = np.vectorize(CerTdcFitvec[1].Eval)
+    fSci40Tdc  = PolyFunction(pars["Sci_Tdc"]); fCer40Tdc  = PolyFunction(pars["Cer_Tdc"])
 
 
     binning_S = [0, 30, 60, 90]
@@ -1122,7 +1173,7 @@ def main():
 
 
     # extract TDC parametrisation for dual-readout energy at 40 GeV corrected for asymmetry
-    fDReneAsymTdc40  = np.vectorize(DReneAsym_TdcFitVec[1].Eval)
+    fDReneAsymTdc40  = PolyFunction(DReneAsym_TdcFitVec[1])
 
     # extract TDC parametrisation for dual-readout energy at 40 GeV corrected for asymmetry
     #fDReneAsymTdc40  = np.vectorize(DReneAsym_TdcFitVec[1].Eval)
@@ -1132,10 +1183,20 @@ def main():
     # Now All considered corrections have been added to dataframe
     # Plot before/after correction distributions
 
+    # the plotted columns depend on these columns of GetDF, the TDC cleanup,
+    # chi and the 40 GeV parametrisations: they are all in the keys of the
+    # plots in the histogram cache, so a rerun with unchanged inputs does not
+    # fill the plots again
+    plotColumns = ["AsymS", "AsymC", "totPMTSene", "totPMTCene", "totDRene", "pmtS_cont", "pmtC_cont", "totDRene_cont", "TDC_TS11", "TDC_TC11"]
+    corrections = ["tdcSelection = {0!r}".format((tdcBranches, tdcMin, tdcMaxS11, tdcMaxC11)), "chi_value = {0!r}".format(chi_value),
+                   "pars = {0!r}".format(sorted(pars.items()))]
+
     for index, (energy, cont) in enumerate(zip(energies, exp_containment)):
         print("Index ", index, "\tUsing file with energy: ", energy)
 
         data = dfs[index]
+        plotSource = (infolder + "physics_sps2024_run" + runs[index] + ".root", myCut,
+                      RunExpressions(cont, plotColumns) + corrections + ["containment = {0!r}".format(cont), "tdcShift = {0!r}".format(tdcShift.get(runs[index], 0))])
         #data["energyDR_TdcAsym"] = np.select(conditions_DR_TdcAsym, choices_DR_TdcAsym, default=data["energyDR_AsymCorrected"])
 
         # Use TDC parametrisation over asymmetry-corrected DR energy
@@ -1152,82 +1213,84 @@ def main():
 
 
         ########### Colz Plots  ###############
+        # all the plots of this energy are booked, then filled and drawn in one pass
+        booking = []
         # colz Sci energy plot (over asymmetry), before correction
         myOutfile = "ScieneColz_NoAsymCorrection_{0}GeV.png".format(energy); labelPlot= "S energy, before asymmetry correction {0} GeV".format(energy)
         varX = data["AsymS"]; varY = data["pmtS_cont"]; title = "cColzAsymS_pre"; labelX = "TS24-TS21 / TS24+TS21"; labelY = "totPMTSene/containment [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz Sci energy plot, after correction with asymmetry
         myOutfile = "ScieneColz_AsymCorrection_{0}GeV.png".format(energy); labelPlot= "S energy, Asymmetry correction {0} GeV".format(energy)
         varX = data["AsymS"]; varY = data["energyS_AsymCorrected"]; title = "cColzAsymS_post"; labelX = "TS24-TS21 / TS24+TS21"; labelY = "totPMTSene/containment [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz Cer energy plot (over asymmetry), before correction
         myOutfile = "CereneColz_NoAsymCorrection_{0}GeV.png".format(energy); labelPlot= "C energy, before asymmetry correction {0} GeV".format(energy)
         varX = data["AsymC"]; varY = data["pmtC_cont"]; title = "cColzAsymC_pre"; labelX = "TC24-TC21 / TC24+TC21"; labelY = "totPMTCene/containment [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz Cer energy plot, after correction with asymmetry
         myOutfile = "CereneColz_AsymCorrection_{0}GeV.png".format(energy); labelPlot= "C energy, Asymmetry correction {0} GeV".format(energy)
         varX = data["AsymC"]; varY = data["energyC_AsymCorrected"]; title = "cColzAsymC_post"; labelX = "TC24-TC21 / TC24+TC21"; labelY = "totPMTCene/containment [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
 
         # colz DR energy plot (over asymmetry), before correction
         myOutfile = "DReneColz_NoAsymCorrection_{0}GeV.png".format(energy); labelPlot= "DR energy, before asymmetry correction {0} GeV".format(energy)
         varX = data["AsymS"]; varY = data["totDRene_cont"]; title = "cColzAsymS"; labelX = "TS24-TS21 / TS24+TS21"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz DR energy plot, after correction with asymmetry
         myOutfile = "DReneColz_AsymCorrection_{0}GeV.png".format(energy); labelPlot= "DR energy, Asymmetry correction {0} GeV".format(energy)
         varX = data["AsymS"]; varY = data["energyDR_AsymCorrected"]; title = "cColzAsymS"; labelX = "TS24-TS21 / TS24+TS21"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
 
         # colz DR energy plot (over TDC 11), before any correction
         myOutfile = "DReneColz_NoTdcCorrection_{0}GeV.png".format(energy); labelPlot= "DR energy, before Tdc TS11 correction {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["totDRene_cont"]; title = "cColzTdcTS11"; labelX = "TS11 Tdc"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = 600; xmax = 720; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
 
         # colz DR energy plot, after correction with TDCs
         myOutfile = "DReneColz_TdcCorrection_{0}GeV.png".format(energy); labelPlot= "DR energy, Tdc TS11 correction {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["energyDR_TdcCorrected"]; title = "cColzTdcTS11"; labelX = "TS11 Tdc"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = 600; xmax = 720; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz DR energy plot, energy corrected with asymmetry, over TDCs
         myOutfile = "DReneColz_AsymCorrectedOverTdc_{0}GeV.png".format(energy); labelPlot= "DRene, asymmetry correction over Tdc TS11 {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["energyDR_AsymCorrected"]; title = "cColzTdcTS11"; labelX = "TS11 Tdc"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = 600; xmax = 720; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         #######
         # colz DR energy plot, energy corrected with both asymmetry and TDCs, over TDCs
         myOutfile = "DReneColz_AsymTdcCorrectionOverTdc_{0}GeV.png".format(energy); labelPlot= "DRene, asymmetry&TDC correction over Tdc TS11 {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["energyDR_TdcAsym"]; title = "cColzTdcTS11"; labelX = "TS11 Tdc"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = 600; xmax = 720; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
 
         # Profile plot, energy corrected with asymmetry, over TDCs
         myOutfile = "DReneProf_AsymCorrectedOverTdc_{0}GeV.png".format(energy); labelPlot= "DRene, asymmetry correction over Tdc TS11 {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["energyDR_AsymCorrected"]/energy; title = "cProfTdcTS11"; labelX = "TS11 Tdc"; labelY = "Reco E_DR / E_beam"
         nbinX = 50; xmin = 600; xmax = 720; nbinY = 50; ymin = energy*0.5; ymax = energy*1.5
-        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax)
+        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, booking=booking, source=plotSource)
 
         # Profile plot, energy corrected with asymmetry, over TDCs
         myOutfile = "DReneProf_AsymTdcCorrectedOverTdc_{0}GeV.png".format(energy); labelPlot= "DRene, asymmetry&TDC correction over Tdc TS11 {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["energyDR_TdcAsym"]/energy; title = "cProfTdcTS11"; labelX = "TS11 Tdc"; labelY = "Reco E_DR / E_beam"
         nbinX = 50; xmin = 600; xmax = 720; nbinY = 50; ymin = energy*0.5; ymax = energy*1.5
-        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax)
+        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, booking=booking, source=plotSource)
 
 
 
@@ -1235,25 +1298,25 @@ def main():
         myOutfile = "ScieneColz_NoTdcCorrection_{0}GeV.png".format(energy); labelPlot= "S energy, before timing correction {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["pmtS_cont"]; title = "cColzScieneTdcTS11_pre"; labelX = "TDC_TS11"; labelY = "totPMTSene/containment [GeV]"
         nbinX = 50; xmin = min_tdc_sci; xmax = max_tdc_sci; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz Sci energy plot, after correction with tdc
         myOutfile = "ScieneColz_TdcCorrection_{0}GeV.png".format(energy); labelPlot= "S energy, after timing correction {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["energyS_TdcCorrected"]; title = "cColzScieneTdcTS11_post"; labelX = "TDC_TS11"; labelY = "totPMTSene/containment [GeV]"
         nbinX = 50; xmin = min_tdc_sci; xmax = max_tdc_sci; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz Cer energy plot (over TDC_TC11), before correction
         myOutfile = "CereneColz_NoTdcCorrection_{0}GeV.png".format(energy); labelPlot= "C energy, before timing correction {0} GeV".format(energy)
         varX = data["TDC_TC11"]; varY = data["pmtC_cont"]; title = "cColzCereneTdcTC11_pre"; labelX = "TDC_TC11"; labelY = "totPMTCene/containment [GeV]"
         nbinX = 50; xmin = min_tdc_cer; xmax = max_tdc_cer; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
         # colz Cer energy plot, after correction with tdc
         myOutfile = "CereneColz_TdcCorrection_{0}GeV.png".format(energy); labelPlot= "C energy, after timing correction {0} GeV".format(energy)
         varX = data["TDC_TC11"]; varY = data["energyC_TdcCorrected"]; title = "cColzCereneTdcTC11_post"; labelX = "TDC_TC11"; labelY = "totPMTCene/containment [GeV]"
         nbinX = 50; xmin = min_tdc_cer; xmax = max_tdc_cer; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
 
 
 
@@ -1267,38 +1330,38 @@ def main():
         myOutfile = "DReneColzAfterAsymCorrections_OverAsym_{0}GeV.png".format(energy); labelPlot= "DR energy built after S&C asymmetry corrections, over asymmetry {0} GeV".format(energy)
         varX = data["AsymS"]; varY = data["DRasym"]; title = "cColzDReneAsymS_OverAsymS"; labelX = "TS24-TS21 / TS24+TS21"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
         myOutfile = "DReneProfAfterAsymCorrections_OverAsym_{0}GeV.png".format(energy); title = "cProfDReneAsymS_OverAsymS"
-        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax)
+        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, booking=booking, source=plotSource)
 
 
         # colz DR energy plot (over asymmetry), before correction
         myOutfile = "DReneColzAfterAsymCorrections_OverTdc_{0}GeV.png".format(energy); labelPlot= "DR energy built after S&C asymmetry corrections, over timing {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["DRasym"]; title = "cColzDReneAsymSOverTdc"; labelX = "TDC_TS11"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = min_tdc_sci; xmax = max_tdc_sci; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
         myOutfile = "DReneProfAfterAsymCorrections_OverTdc_{0}GeV.png".format(energy); title = "cProfDReneAsymSOverTdc"
-        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax)
+        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, booking=booking, source=plotSource)
 
 
         # colz DR energy plot, after correction with asymmetry
         myOutfile = "DReneColzAfterTdcCorrections_OverTdc_{0}GeV.png".format(energy); labelPlot= "DR energy built after S&C TDC corrections, over timing {0} GeV".format(energy)
         varX = data["TDC_TS11"]; varY = data["DRtdc"]; title = "cColzDReneTdc_OverTDC"; labelX = "TDC_TS11"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = min_tdc_sci; xmax = max_tdc_sci; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
         myOutfile = "DReneProfAfterTdcCorrections_OverTdc_{0}GeV.png".format(energy); title = "cProfDReneTdc_OverTDC"
-        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax)
+        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, booking=booking, source=plotSource)
 
 
        # colz DR energy plot, after correction with asymmetry
         myOutfile = "DReneColzAfterTdcCorrections_OverAsym_{0}GeV.png".format(energy); labelPlot= "DR energy built after S&C TDC corrections, over asymmetry {0} GeV".format(energy)
         varX = data["AsymS"]; varY = data["DRtdc"]; title = "cColzDReneTdc_OverAsymS"; labelX = "TS24-TS21 / TS24+TS21"; labelY = "Reco E_DR [GeV]"
         nbinX = 50; xmin = -1.4; xmax = 1.4; nbinY = 50; ymin = 0.; ymax = energy*1.7
-        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax)
+        DrawColzPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax, booking=booking, source=plotSource)
         myOutfile = "DReneProfAfterTdcCorrections_OverAsym_{0}GeV.png".format(energy); itle = "cProfDReneTdc_OverAsymS"
-        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax)
-
+        DrawProfPlot(myOutfile, title, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, booking=booking, source=plotSource)
 
+        FillBooked(booking)
 
 
 
@@ -1347,24 +1410,21 @@ def main():
         HistDRTdc2 = ROOT.TH1D("HistDRTdc2_{0}GeV".format(energy), r"reco E_DR (built with S and C corrected with timing, {0}GeV); E [GeV]; Counts".format(energy), 100, energy-0.7*energy, energy+0.7*energy)
 
 
-        for pmtS, pmtC, eneDR_cont, eneDR_corrected in zip(data["pmtS_cont"].values, data["pmtC_cont"].values, data["totDRene_cont"].values, data["energyDR_TdcCorrected"]):
-            HistScorrected.Fill(pmtS)
-            HistCcorrected.Fill(pmtC)
-            HistComb.Fill(eneDR_cont)
-            HistCombCorrected.Fill(eneDR_cont)
-            HistCombCorrected_tdc.Fill(eneDR_corrected)
+        FillROOT(HistScorrected, data["pmtS_cont"].values)
+        FillROOT(HistCcorrected, data["pmtC_cont"].values)
+        FillROOT(HistComb, data["totDRene_cont"].values)
+        FillROOT(HistCombCorrected, data["totDRene_cont"].values)
+        FillROOT(HistCombCorrected_tdc, data["energyDR_TdcCorrected"].values)
 
-        for eneS, eneC, eneDR_corrected in zip(data_filtered["energyS_AsymCorrected"], data_filtered["energyC_AsymCorrected"], data_filtered["energyDR_AsymCorrected"]):
-            HistScorrected_Asymcut.Fill(eneS)
-            HistCcorrected_Asymcut.Fill(eneC)
-            HistCombCorrected_Asymcut.Fill(eneDR_corrected)
-            HistDRAsym2.Fill( (eneS-chi_value*eneC)/(1-chi_value)   )
+        FillROOT(HistScorrected_Asymcut, data_filtered["energyS_AsymCorrected"].values)
+        FillROOT(HistCcorrected_Asymcut, data_filtered["energyC_AsymCorrected"].values)
+        FillROOT(HistCombCorrected_Asymcut, data_filtered["energyDR_AsymCorrected"].values)
+        FillROOT(HistDRAsym2, (data_filtered["energyS_AsymCorrected"].values-chi_value*data_filtered["energyC_AsymCorrected"].values)/(1-chi_value))
 
 
-        for eneS, eneC in zip(data["energyS_TdcCorrected"], data["energyC_TdcCorrected"]):
-            HistScorrected_Tdc.Fill(eneS)
-            HistCcorrected_Tdc.Fill(eneC)
-            HistDRTdc2.Fill((eneS-chi_value*eneC)/(1-chi_value) )
+        FillROOT(HistScorrected_Tdc, data["energyS_TdcCorrected"].values)
+        FillROOT(HistCcorrected_Tdc, data["energyC_TdcCorrected"].values)
+        FillROOT(HistDRTdc2, (data["energyS_TdcCorrected"].values-chi_value*data["energyC_TdcCorrected"].values)/(1-chi_value))
 
         # Show reco energy Vs Asymmetry
         #RecoEvsAsymSHist = ROOT.TH2D("RecoEvsAsymSHist_{0}GeV".format(energy), "RecoEvsAsymSHist_{0}GeV; TS24-TS21/TS24+TS21; Reco E_dr".format(energy), 50, -1.5, 1.5, 50, 0., 2*energy)
@@ -1384,74 +1444,19 @@ def main():
 
         # Filter only events with time close to mean
         #data = data[ (np.abs(data["TDC_TS11"]-666)<10 )]
-        for ene in data["energyDR_TdcAsym"]:
-            HistDR.Fill(ene)    
+        FillROOT(HistDR, data["energyDR_TdcAsym"].values)
 
 
             
-        # Fit S energy before and after asymmetry correction
-        HistScorrected.Fit("gaus", "Q")
-        ftotPMTSeneFit = HistScorrected.GetFunction("gaus") 
-        HistScorrected_Asymcut.Fit("gaus", "Q")
-        fSeneAsymFit = HistScorrected_Asymcut.GetFunction("gaus")
-        # Fit C energy before and after asymmetry correction
-        HistCcorrected.Fit("gaus", "Q")
-        ftotPMTCeneFit = HistCcorrected.GetFunction("gaus")
-        HistCcorrected_Asymcut.Fit("gaus", "Q")
-        fCeneAsymFit = HistCcorrected_Asymcut.GetFunction("gaus")
-
-        HistComb.Fit("gaus","Q")
-        fDReneFit = HistComb.GetFunction("gaus")
-        HistCombCorrected.Fit("gaus","Q")
-        fDReneFitCorrected = HistCombCorrected.GetFunction("gaus")
-
-        HistCombCorrected_Asymcut.Fit("gaus","Q")
-        fDReneFitCorrected_Asymcut = HistCombCorrected_Asymcut.GetFunction("gaus")
-
-        HistCombCorrected_tdc.Fit("gaus","Q")
-        fDReneFitCorrected_tdc = HistCombCorrected_tdc.GetFunction("gaus")
-
-        HistScorrected_Tdc.Fit("gaus", "Q")
-        fScieneFitCorrected_tdc = HistScorrected_Tdc.GetFunction("gaus")
-        
-        HistCcorrected_Tdc.Fit("gaus", "Q")
-        fCereneFitCorrected_tdc = HistCcorrected_Tdc.GetFunction("gaus")
-
-        # Fit gaussian over both corrections
-        HistDR.Fit("gaus", "Q")
-        fHistDRFit = HistDR.GetFunction("gaus")
-
-        # Fit gaussians after both corrections
-        HistDRAsym2.Fit("gaus", "Q")
-        fHistDRAsym2Fit = HistDRAsym2.GetFunction("gaus")
-
-        HistDRTdc2.Fit("gaus", "Q")
-        fHistDRTdc2Fit = HistDRTdc2.GetFunction("gaus")
-
-
-
         #ROOT.gStyle.SetOptFit(111)
         ROOT.gStyle.SetOptFit(0)
         ROOT.gStyle.SetOptStat(0)
 
-        # refit within -1.5 and +3 sigma
-        HistScorrected.Fit("gaus", "Q", "", ftotPMTSeneFit.GetParameter(1)-1.5*ftotPMTSeneFit.GetParameter(2), ftotPMTSeneFit.GetParameter(1)+1.5*ftotPMTSeneFit.GetParameter(2)) 
-        HistCcorrected.Fit("gaus", "Q", "", ftotPMTCeneFit.GetParameter(1)-1.5*ftotPMTCeneFit.GetParameter(2), ftotPMTCeneFit.GetParameter(1)+1.5*ftotPMTCeneFit.GetParameter(2)) 
-        HistComb.Fit("gaus", "Q", "", fDReneFit.GetParameter(1)-1.5*fDReneFit.GetParameter(2), fDReneFit.GetParameter(1)+1.5*fDReneFit.GetParameter(2)) 
-        HistCombCorrected.Fit("gaus", "Q", "", fDReneFitCorrected.GetParameter(1)-1.5*fDReneFitCorrected.GetParameter(2), fDReneFitCorrected.GetParameter(1)+1.5*fDReneFitCorrected.GetParameter(2)) 
-        HistCombCorrected_Asymcut.Fit("gaus", "Q", "", fDReneFitCorrected_Asymcut.GetParameter(1)-1.5*fDReneFitCorrected_Asymcut.GetParameter(2), fDReneFitCorrected_Asymcut.GetParameter(1)+1.5*fDReneFitCorrected_Asymcut.GetParameter(2)) 
-        HistScorrected_Asymcut.Fit("gaus", "Q", "", fSeneAsymFit.GetParameter(1)-1.5*fSeneAsymFit.GetParameter(2), fSeneAsymFit.GetParameter(1)+1.5*fSeneAsymFit.GetParameter(2)) 
-        HistCcorrected_Asymcut.Fit("gaus", "Q", "", fCeneAsymFit.GetParameter(1)-1.5*fCeneAsymFit.GetParameter(2), fCeneAsymFit.GetParameter(1)+1.5*fCeneAsymFit.GetParameter(2)) 
-
-        HistScorrected_Tdc.Fit("gaus", "Q", "", fScieneFitCorrected_tdc.GetParameter(1)-1.5*fScieneFitCorrected_tdc.GetParameter(2), fScieneFitCorrected_tdc.GetParameter(1)+1.5*fScieneFitCorrected_tdc.GetParameter(2))
-        HistCcorrected_Tdc.Fit("gaus", "Q", "", fCereneFitCorrected_tdc.GetParameter(1)-1.5*fCereneFitCorrected_tdc.GetParameter(2), fCereneFitCorrected_tdc.GetParameter(1)+1.5*fCereneFitCorrected_tdc.GetParameter(2))
-
-        HistCombCorrected_tdc.Fit("gaus", "Q", "", fDReneFitCorrected_tdc.GetParameter(1)-1.5*fDReneFitCorrected_tdc.GetParameter(2), fDReneFitCorrected_tdc.GetParameter(1)+1.5*fDReneFitCorrected_tdc.GetParameter(2)) 
-
-        # Fit histogram with both corrections
-        HistDR.Fit("gaus", "Q", "", fHistDRFit.GetParameter(1)-1.5*fHistDRFit.GetParameter(2), fHistDRFit.GetParameter(1)+1.5*fHistDRFit.GetParameter(2))
-        HistDRAsym2.Fit("gaus", "Q", "", fHistDRAsym2Fit.GetParameter(1)-1.5*fHistDRAsym2Fit.GetParameter(2), fHistDRAsym2Fit.GetParameter(1)+1.5*fHistDRAsym2Fit.GetParameter(2))
-        HistDRTdc2.Fit("gaus", "Q", "", fHistDRTdc2Fit.GetParameter(1)-1.5*fHistDRTdc2Fit.GetParameter(2), fHistDRTdc2Fit.GetParameter(1)+1.5*fHistDRTdc2Fit.GetParameter(2))
+        # Fit S, C and DR energy before and after the asymmetry and TDC corrections,
+        # then refit within -1.5 and +1.5 sigma (all the histograms at once)
+        FitGaus([HistScorrected, HistScorrected_Asymcut, HistCcorrected, HistCcorrected_Asymcut,
+                 HistComb, HistCombCorrected, HistCombCorrected_Asymcut, HistCombCorrected_tdc,
+                 HistScorrected_Tdc, HistCcorrected_Tdc, HistDR, HistDRAsym2, HistDRTdc2], 1.5, 1.5)
 
 
 
@@ -1616,15 +1621,30 @@ def main():
         #MeanVec_Comb.append(BestFitCombCorrected_Asymcut.GetParameter(1)); MeanErrVec_Comb.append(BestFitCombCorrected_Asymcut.GetParError(1)); RmsVec_Comb.append(BestFitCombCorrected_Asymcut.GetParameter(2)); RmsErrVec_Comb.append(BestFitCombCorrected_Asymcut.GetParError(2))
 
 
+        if(nBootstrap):
+            bootstrapS.append(data["energyS_TdcCorrected"].values); bootstrapC.append(data["energyC_TdcCorrected"].values)
+            bootstrapComb.append((data["energyS_TdcCorrected"].values-chi_value*data["energyC_TdcCorrected"].values)/(1-chi_value))
+
         # Uncomment to print TDC-corrected energy parameters
-        MeanVec_S.append(BestFitS_Tdc.GetParameter(1)); MeanErrVec_S.append(BestFitS_Tdc.GetParError(1)); RmsVec_S.append(BestFitS_Tdc.GetParameter(2)); RmsErrVec_S.append(BestFitS_Tdc.GetParError(2))
-        MeanVec_C.append(BestFitC_Tdc.GetParameter(1)); MeanErrVec_C.append(BestFitC_Tdc.GetParError(1)); RmsVec_C.append(BestFitC_Tdc.GetParameter(2)); RmsErrVec_C.append(BestFitC_Tdc.GetParError(2))
+        if(peakFit == "unbinned"):
+            # same energies as HistScorrected_Tdc, HistCcorrected_Tdc and HistDRTdc2
+            for values, MeanVec, MeanErrVec, RmsVec, RmsErrVec in [
+                    (data["energyS_TdcCorrected"].values, MeanVec_S, MeanErrVec_S, RmsVec_S, RmsErrVec_S),
+                    (data["energyC_TdcCorrected"].values, MeanVec_C, MeanErrVec_C, RmsVec_C, RmsErrVec_C),
+                    ((data["energyS_TdcCorrected"].values-chi_value*data["energyC_TdcCorrected"].values)/(1-chi_value), MeanVec_Comb, MeanErrVec_Comb, RmsVec_Comb, RmsErrVec_Comb)]:
+                # as the binned fits: over the histogram range, then once in +-1.5 sigma
+                fit = UnbinnedGausFit(values, [(1.5, 1.5)], fitRange=(energy-0.7*energy, energy+0.7*energy))
+                MeanVec.append(fit["mean"]); MeanErrVec.append(fit["meanErr"]); RmsVec.append(fit["sigma"]); RmsErrVec.append(fit["sigmaErr"])
+        else:
+            MeanVec_S.append(BestFitS_Tdc.GetParameter(1)); MeanErrVec_S.append(BestFitS_Tdc.GetParError(1)); RmsVec_S.append(BestFitS_Tdc.GetParameter(2)); RmsErrVec_S.append(BestFitS_Tdc.GetParError(2))
+            MeanVec_C.append(BestFitC_Tdc.GetParameter(1)); MeanErrVec_C.append(BestFitC_Tdc.GetParError(1)); RmsVec_C.append(BestFitC_Tdc.GetParameter(2)); RmsErrVec_C.append(BestFitC_Tdc.GetParError(2))
         #MeanVec_Comb.append(BestFitCombCorrected_tdc.GetParameter(1)); MeanErrVec_Comb.append(BestFitCombCorrected_tdc.GetParError(1)); RmsVec_Comb.append(BestFitCombCorrected_tdc.GetParameter(2)); RmsErrVec_Comb.append(BestFitCombCorrected_tdc.GetParError(2))
         # print energy parameters with both corrections
         #MeanVec_Comb.append(BestFitCombCorrected_AsymTdc.GetParameter(1)); MeanErrVec_Comb.append(BestFitCombCorrected_AsymTdc.GetParError(1)); RmsVec_Comb.append(BestFitCombCorrected_AsymTdc.GetParameter(2)); RmsErrVec_Comb.append(BestFitCombCorrected_AsymTdc.GetParError(2))
  
         #MeanVec_Comb.append(BestFitCombAsym2.GetParameter(1)); MeanErrVec_Comb.append(BestFitCombAsym2.GetParError(1)); RmsVec_Comb.append(BestFitCombAsym2.GetParameter(2)); RmsErrVec_Comb.append(BestFitCombAsym2.GetParError(2))
-        MeanVec_Comb.append(BestFitCombTdc2.GetParameter(1)); MeanErrVec_Comb.append(BestFitCombTdc2.GetParError(1)); RmsVec_Comb.append(BestFitCombTdc2.GetParameter(2)); RmsErrVec_Comb.append(BestFitCombTdc2.GetParError(2))
+        if(peakFit == "binned"):
+            MeanVec_Comb.append(BestFitCombTdc2.GetParameter(1)); MeanErrVec_Comb.append(BestFitCombTdc2.GetParError(1)); RmsVec_Comb.append(BestFitCombTdc2.GetParameter(2)); RmsErrVec_Comb.append(BestFitCombTdc2.GetParError(2))
 
 
 
@@ -1689,6 +1709,20 @@ def main():
 
     #DrawEnergyHist(dfCorrected_array, energies, binning_S, binning_C, "energyS", "energyC")
 
+    if(nBootstrap):
+        bootstrap = {"Energy": energies}
+        for label, arrays in [("S", bootstrapS), ("C", bootstrapC), ("Comb", bootstrapComb)]:
+            # peaks fitted as the values of DRcaloData.csv (peakFit), on the
+            # binning of HistScorrected_Tdc, HistCcorrected_Tdc and HistDRTdc2
+            replicas = Bootstrap(arrays, energies, nBootstrap, peakFit=peakFit, windows=[(1.5, 1.5)],
+                                 binnings=[(100, energy-0.7*energy, energy+0.7*energy) for energy in energies])
+            bootstrap["Mean_"+label], bootstrap["MeanErr_"+label] = BootstrapSummary(replicas["mean"])[:2]
+            bootstrap["RMS_"+label], bootstrap["RMSErr_"+label] = BootstrapSummary(replicas["sigma"])[:2]
+            for term in ["stochastic", "constant"]:
+                median, std, low, high = BootstrapSummary(replicas[term])
+                print("{0} {1} term (bootstrap, {2} replicas): {3:.5f} +- {4:.5f} [{5:.5f}, {6:.5f}]".format(label, term, nBootstrap, median, std, low, high))
+        pd.DataFrame(bootstrap).to_csv("DRcaloBootstrap.csv", index=False, sep="\t")
+
     # Get Noise value and make it an array
     noiseSvec = np.full(len(RmsVec_S), noiseS)
     RmsVec_S_corrected = np.sqrt(np.asarray(RmsVec_S)**2 - noiseSvec**2)
@@ -0,0 +1,387 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### NumPy histograms and profiles       #####
+#############################################
+# Histograms are filled from whole arrays instead of one Fill call per event:
+# the bin of every value is found as in TAxis::FindBin and the cells are
+# summed with np.bincount. A histogram is a dict holding the same arrays as
+# the ROOT object (cell contents with under/overflow, sum of weights squared,
+# for profiles the bin entries) and the same statistics (fTsumw, fTsumwx, ...),
+# so that the ROOT TH1D/TH2D/TProfile made from it at drawing or fitting time
+# is bin-for-bin the one the Fill loops gave.
+# The sums run over the events in order, as the successive Fill calls do, so
+# even the rounding of the sums is the same.
+
+import os
+import sqlite3
+import numpy as np
+import ROOT
+import TBAna_Store
+from TBAna_Store import CacheKey
+
+
+def Hist1D(name, title, nbinsx, xmin, xmax):
+    # Same as ROOT.TH1D(name, title, nbinsx, xmin, xmax)
+    return {"kind": "TH1D", "name": name, "title": title, "x": (nbinsx, float(xmin), float(xmax)),
+            "array": np.zeros(nbinsx+2), "sumw2": None, "entries": 0., "stats": np.zeros(4)}
+
+
+def Hist2D(name, title, nbinsx, xmin, xmax, nbinsy, ymin, ymax):
+    # Same as ROOT.TH2D(name, title, nbinsx, xmin, xmax, nbinsy, ymin, ymax)
+    # cells ordered as the ROOT global bin, biny*(nbinsx+2)+binx
+    return {"kind": "TH2D", "name": name, "title": title, "x": (nbinsx, float(xmin), float(xmax)), "y": (nbinsy, float(ymin), float(ymax)),
+            "array": np.zeros((nbinsx+2)*(nbinsy+2)), "sumw2": None, "entries": 0., "stats": np.zeros(7)}
+
+
+def Profile(name, title, nbinsx, xmin, xmax, ymin=0., ymax=0.):
+    # Same as ROOT.TProfile(name, title, nbinsx, xmin, xmax[, ymin, ymax])
+    # array: sum of w*y, sumw2: sum of w*y^2, binentries: sum of w,
+    # binsumw2: sum of w^2 (only kept once a weight different from 1 is used)
+    return {"kind": "TProfile", "name": name, "title": title, "x": (nbinsx, float(xmin), float(xmax)), "yrange": (float(ymin), float(ymax)),
+            "array": np.zeros(nbinsx+2), "sumw2": np.zeros(nbinsx+2), "binentries": np.zeros(nbinsx+2), "binsumw2": None,
+            "entries": 0., "stats": np.zeros(6)}
+
+
+def FindBin(values, axis):
+    # TAxis::FindBin of a fixed-bin axis (nbins, xmin, xmax) for every value:
+    # 0 below xmin, nbins+1 from xmax on (and for NaN)
+    nbins, xmin, xmax = axis
+    bins = np.full(len(values), nbins+1, dtype=np.int64)
+    bins[values < xmin] = 0
+    inside = (values >= xmin) & (values < xmax)
+    bins[inside] = 1 + (nbins*(values[inside]-xmin)/(xmax-xmin)).astype(np.int64)
+    return bins
+
+
+def AddCells(cells, bins, values):
+    # cells[bins[i]] += values[i] in event order
+    # (np.bincount on an empty histogram, np.add.at on one already filled)
+    if(not cells.any()):
+        cells += np.bincount(bins, weights=values, minlength=len(cells))
+    else:
+        np.add.at(cells, bins, values)
+
+
+def AddSum(total, values):
+    # total + values[0] + values[1] + ..., added in this order
+    return np.cumsum(np.concatenate(([total], values)))[-1]
+
+
+def CachedBin(values, axis, binCache=None):
+    # FindBin, remembered in binCache (by array and binning) if one is given
+    if(binCache is None):
+        return FindBin(values, axis)
+    key = (id(values), axis)
+    if(key not in binCache):
+        binCache[key] = FindBin(values, axis)
+    return binCache[key]
+
+
+def Fill(hist, x, y=None, w=None, binCache=None):
+    # Fill hist with the arrays x (and y for TH2D/TProfile), with weights w
+    # (1 if None): same as calling hist.Fill(x[i], [y[i],] [w[i]]) for every i
+    # binCache shares the bins of the same arrays between histograms (FillBooked)
+    x = np.asarray(x, dtype=np.float64)
+    if(y is not None):
+        y = np.asarray(y, dtype=np.float64)
+    w = np.ones(len(x)) if w is None else np.asarray(w, dtype=np.float64)
+    if(hist["kind"] == "TProfile"):
+        # events outside the y range of the profile are not filled at all
+        ymin, ymax = hist["yrange"]
+        if(ymin != ymax):
+            keep = (y >= ymin) & (y <= ymax)
+            x, y, w = x[keep], y[keep], w[keep]
+            binCache = None
+    weighted = np.any(w != 1.)
+    bins = CachedBin(x, hist["x"], binCache)
+    inRange = (bins > 0) & (bins <= hist["x"][0])
+    if(hist["kind"] == "TH2D"):
+        biny = CachedBin(y, hist["y"], binCache)
+        inRange &= (biny > 0) & (biny <= hist["y"][0])
+        bins = biny*(hist["x"][0]+2) + bins
+    hist["entries"] += len(x)
+
+    if(hist["kind"] == "TProfile"):
+        wy = w*y
+        AddCells(hist["array"], bins, wy)
+        AddCells(hist["sumw2"], bins, wy*y)
+        # a weight different from 1 switches on the sum of weights squared,
+        # as TProfile::Sumw2 does in Fill
+        if(hist["binsumw2"] is None and weighted):
+            hist["binsumw2"] = hist["binentries"].copy()
+        AddCells(hist["binentries"], bins, w)
+        if(hist["binsumw2"] is not None):
+            AddCells(hist["binsumw2"], bins, w*w)
+    else:
+        # a weight different from 1 switches on the sum of weights squared,
+        # as TH1::Sumw2 does in Fill
+        if(hist["sumw2"] is None and weighted):
+            hist["sumw2"] = np.abs(hist["array"])
+        AddCells(hist["array"], bins, w)
+        if(hist["sumw2"] is not None):
+            AddCells(hist["sumw2"], bins, w*w)
+
+    # statistics, from the events inside the axis ranges only
+    x, w = x[inRange], w[inRange]
+    stats = hist["stats"]
+    wx = w*x
+    sums = [w, w*w, wx, wx*x]
+    if(hist["kind"] != "TH1D"):
+        y = y[inRange]
+        wy = w*y
+        sums += [wy, wy*y]
+        if(hist["kind"] == "TH2D"):
+            sums += [wx*y]
+    for i, values in enumerate(sums):
+        stats[i] = AddSum(stats[i], values)
+    return hist
+
+
+def NewROOT(hist):
+    # Empty ROOT object with the binning of hist
+    nx, xmin, xmax = hist["x"]
+    if(hist["kind"] == "TH1D"):
+        return ROOT.TH1D(hist["name"], hist["title"], nx, xmin, xmax)
+    if(hist["kind"] == "TH2D"):
+        ny, ymin, ymax = hist["y"]
+        return ROOT.TH2D(hist["name"], hist["title"], nx, xmin, xmax, ny, ymin, ymax)
+    ymin, ymax = hist["yrange"]
+    if(ymin != ymax):
+        return ROOT.TProfile(hist["name"], hist["title"], nx, xmin, xmax, ymin, ymax)
+    return ROOT.TProfile(hist["name"], hist["title"], nx, xmin, xmax)
+
+
+def WriteROOT(hist, obj):
+    # Set the cells and statistics of the ROOT object obj to those of hist
+    # (SetBinContent changes the entries and statistics, they are set last)
+    if(hist["kind"] != "TProfile" and hist["sumw2"] is not None and obj.GetSumw2N() == 0):
+        obj.Sumw2()
+    for cell in range(len(hist["array"])):
+        obj.SetBinContent(cell, hist["array"][cell])
+        if(hist["sumw2"] is not None):
+            obj.GetSumw2().SetAt(hist["sumw2"][cell], cell)
+    if(hist["kind"] == "TProfile"):
+        if(hist["binsumw2"] is not None and obj.GetBinSumw2().GetSize() == 0):
+            obj.Sumw2()
+        for cell in range(len(hist["array"])):
+            obj.SetBinEntries(cell, hist["binentries"][cell])
+            if(hist["binsumw2"] is not None):
+                obj.GetBinSumw2().SetAt(hist["binsumw2"][cell], cell)
+    obj.SetEntries(hist["entries"])
+    obj.PutStats(np.array(hist["stats"]))
+    return obj
+
+
+def ToROOT(hist):
+    # ROOT TH1D/TH2D/TProfile with the content of hist, for drawing or fitting
+    return WriteROOT(hist, NewROOT(hist))
+
+
+def FromROOT(obj):
+    # Histogram dict with the binning and the current content of the ROOT
+    # TH1D/TH2D/TProfile obj
+    xaxis = obj.GetXaxis()
+    if(xaxis.GetXbins().GetSize() > 0):
+        raise ValueError("{0}: variable bins are not supported".format(obj.GetName()))
+    axis = (xaxis.GetNbins(), xaxis.GetXmin(), xaxis.GetXmax())
+    if(obj.InheritsFrom("TProfile")):
+        hist = Profile(obj.GetName(), obj.GetTitle(), *axis, obj.GetYmin(), obj.GetYmax())
+        if(obj.GetBinSumw2().GetSize() > 0):
+            hist["binsumw2"] = np.zeros_like(hist["array"])
+    elif(obj.InheritsFrom("TH2")):
+        yaxis = obj.GetYaxis()
+        hist = Hist2D(obj.GetName(), obj.GetTitle(), *axis, yaxis.GetNbins(), yaxis.GetXmin(), yaxis.GetXmax())
+    else:
+        hist = Hist1D(obj.GetName(), obj.GetTitle(), *axis)
+    if(hist["kind"] != "TProfile" and obj.GetSumw2N() > 0):
+        hist["sumw2"] = np.zeros_like(hist["array"])
+    if(obj.GetEntries() == 0):
+        return hist
+
+    cells = range(len(hist["array"]))
+    if(hist["kind"] == "TProfile"):
+        # GetBinContent of a profile is the mean, the sums are read directly
+        hist["array"] = np.array([obj.GetW()[cell] for cell in cells])
+        hist["sumw2"] = np.array([obj.GetW2()[cell] for cell in cells])
+        hist["binentries"] = np.array([obj.GetBinEntries(cell) for cell in cells])
+        if(hist["binsumw2"] is not None):
+            hist["binsumw2"] = np.array([obj.GetB2()[cell] for cell in cells])
+    else:
+        hist["array"] = np.array([obj.GetBinContent(cell) for cell in cells])
+        if(hist["sumw2"] is not None):
+            hist["sumw2"] = np.array([obj.GetSumw2().GetAt(cell) for cell in cells])
+    hist["entries"] = obj.GetEntries()
+    stats = np.zeros(len(hist["stats"]))
+    obj.GetStats(stats)
+    hist["stats"] = stats
+    return hist
+
+
+def FillROOT(obj, x, y=None, w=None):
+    # Fill the ROOT histogram or profile obj with whole arrays: same content as
+    # for x_i, y_i, w_i in zip(x, y, w): obj.Fill(x_i, y_i, w_i)
+    return WriteROOT(Fill(FromROOT(obj), x, y, w), obj)
+
+
+# Booking: the histograms of a block of plots are declared first with Book,
+# then FillBooked fills them all in one pass, as the booked actions of an
+# RDataFrame. A column used by several histograms is converted to float64 once
+# and binned once per binning.
+
+def Book(booking, hist, x, y=None, w=None, then=None, key=None):
+    # Declare hist (Hist1D/Hist2D/Profile) to be filled with x, y, w by
+    # FillBooked; then(obj) is called with the filled ROOT object (e.g. to
+    # draw it). Without a booking list (None), hist is filled right away
+    # With a key (HistKey), hist is taken from the histogram cache if it is
+    # there; x, y, w can then be functions returning the arrays, only called
+    # when hist has to be filled
+    if(booking is None):
+        return FillBooked([(hist, x, y, w, then, key)])[0]
+    booking.append((hist, x, y, w, then, key))
+
+
+def FillBooked(booking, toROOT=True):
+    # Fill every booked histogram and empty the booking list
+    # Return, in booking order, the ROOT objects (or what their then returned),
+    # or the filled histogram dicts themselves without toROOT (e.g. to Merge them)
+    columns = {}; binCache = {}
+    def Column(values):
+        if(values is None):
+            return None
+        array = np.asarray(values() if callable(values) else values)
+        # same memory, same column (array is kept so the memory is not reused)
+        key = (array.__array_interface__["data"][0], array.strides, len(array), array.dtype.str)
+        if(key not in columns):
+            columns[key] = (array, np.asarray(array, dtype=np.float64))
+        return columns[key][1]
+    results = []
+    for hist, x, y, w, then, key in booking:
+        if(key is None or LoadHist(hist, key) is None):
+            Fill(hist, Column(x), Column(y), Column(w), binCache)
+            if(key is not None):
+                SaveHist(hist, key)
+        if(not toROOT):
+            results.append(hist)
+            continue
+        obj = ToROOT(hist)
+        results.append(then(obj) if then else obj)
+    del booking[:]
+    return results
+
+
+# Merging: histograms filled on separate parts of the events (chunks of a run,
+# runs or energies in worker processes) are added cell by cell, with their sums
+# of weights squared, bin entries, entries and statistics, as TH1::Add. The
+# result is the histogram filled with all the events at once: the counts exactly,
+# the sums of non-integer values up to their rounding.
+# Between processes only the flat float64 buffer of ToBuffer is sent; the
+# receiving side builds the same (empty) histogram and loads it with FromBuffer.
+
+def SameBinning(hist, other):
+    return hist["kind"] == other["kind"] and hist["x"] == other["x"] and hist.get("y") == other.get("y") and hist.get("yrange") == other.get("yrange")
+
+
+def Merge(hist, other):
+    # Add the content of other to hist (same kind and binning) and return hist
+    if(not SameBinning(hist, other)):
+        raise ValueError("{0} and {1}: different histograms cannot be merged".format(hist["name"], other["name"]))
+    if(hist["kind"] == "TProfile"):
+        hist["sumw2"] = hist["sumw2"] + other["sumw2"]
+        # a missing sum of weights squared is the bin entries (weights 1)
+        if(hist["binsumw2"] is not None or other["binsumw2"] is not None):
+            hist["binsumw2"] = (hist["binentries"] if hist["binsumw2"] is None else hist["binsumw2"]) + (other["binentries"] if other["binsumw2"] is None else other["binsumw2"])
+        hist["binentries"] = hist["binentries"] + other["binentries"]
+    elif(hist["sumw2"] is not None or other["sumw2"] is not None):
+        # a missing sum of weights squared is the content (weights 1)
+        hist["sumw2"] = (np.abs(hist["array"]) if hist["sumw2"] is None else hist["sumw2"]) + (np.abs(other["array"]) if other["sumw2"] is None else other["sumw2"])
+    hist["array"] = hist["array"] + other["array"]
+    hist["entries"] += other["entries"]
+    hist["stats"] = hist["stats"] + other["stats"]
+    return hist
+
+
+def ToBuffer(hist):
+    # Content of hist as one flat float64 array:
+    # entries, has sumw2, has binsumw2, stats, array, sumw2 (, binentries, binsumw2)
+    cells = np.zeros_like(hist["array"])
+    parts = [[hist["entries"], hist["sumw2"] is not None, hist.get("binsumw2") is not None], hist["stats"], hist["array"], cells if hist["sumw2"] is None else hist["sumw2"]]
+    if(hist["kind"] == "TProfile"):
+        parts += [hist["binentries"], cells if hist["binsumw2"] is None else hist["binsumw2"]]
+    return np.concatenate(parts).astype(np.float64)
+
+
+def FromBuffer(hist, buffer):
+    # Set the content of hist (built with the same binning as the one the
+    # buffer comes from) to the content in buffer and return hist
+    nStats = len(hist["stats"]); nCells = len(hist["array"])
+    nParts = 4 if hist["kind"] == "TProfile" else 2
+    if(len(buffer) != 3 + nStats + nParts*nCells):
+        raise ValueError("{0}: buffer of {1} values does not match the binning".format(hist["name"], len(buffer)))
+    hist["entries"] = buffer[0]
+    hist["stats"] = buffer[3:3+nStats].copy()
+    cells = [buffer[3+nStats+i*nCells:3+nStats+(i+1)*nCells].copy() for i in range(nParts)]
+    hist["array"] = cells[0]
+    hist["sumw2"] = cells[1] if (buffer[1] or hist["kind"] == "TProfile") else None
+    if(hist["kind"] == "TProfile"):
+        hist["binentries"] = cells[2]
+        hist["binsumw2"] = cells[3] if buffer[2] else None
+    return hist
+
+
+def MergeBuffers(hist, buffers):
+    # Merge the buffers (partial results of the same histogram as hist), in
+    # order, into hist and return it
+    for buffer in buffers:
+        Merge(hist, FromBuffer(dict(hist), buffer))
+    return hist
+
+
+# Histogram cache: the filled histograms are kept in the single file
+# histcachefile of the events cache folder (TBAna_Store.cachefolder), as their
+# ToBuffer buffer, under a key made of the run (path,
+# mtime and size of the ntuple), the cut, the expressions of the filled
+# variables and weights and the binning (TBAna_Store.CacheKey). Name, title and
+# drawing options are not part of the key, so changing them reuses the cache.
+# Any change of ntuple, cut, expression or binning gives a new key. The cache is
+# off when histcachefile or cachefolder is None.
+histcachefile = "HistCache.sqlite"
+
+
+def HistKey(filename, Cut, hist, expressions):
+    # Key of hist filled from the run filename after Cut, with the variables
+    # (and weights) given by the expressions (strings, including every number
+    # used to compute them)
+    binning = [hist["kind"], repr(hist["x"]), repr(hist.get("y")), repr(hist.get("yrange"))]
+    return CacheKey(filename, Cut, binning + list(expressions))
+
+
+def HistCacheOn():
+    return histcachefile is not None and TBAna_Store.cachefolder is not None
+
+
+def HistCache():
+    os.makedirs(TBAna_Store.cachefolder, exist_ok=True)
+    connection = sqlite3.connect(os.path.join(TBAna_Store.cachefolder, histcachefile), timeout=60)
+    connection.execute("CREATE TABLE IF NOT EXISTS hists (key TEXT PRIMARY KEY, buffer BLOB)")
+    return connection
+
+
+def LoadHist(hist, key):
+    # Set hist to its cached content and return it, None if it is not cached
+    if(not HistCacheOn()):
+        return None
+    with HistCache() as connection:
+        row = connection.execute("SELECT buffer FROM hists WHERE key = ?", (key,)).fetchone()
+    connection.close()
+    if(row is None):
+        return None
+    return FromBuffer(hist, np.frombuffer(row[0], dtype=np.float64))
+
+
+def SaveHist(hist, key):
+    if(not HistCacheOn()):
+        return
+    with HistCache() as connection:
+        connection.execute("INSERT OR REPLACE INTO hists VALUES (?, ?)", (key, ToBuffer(hist).tobytes()))
+    connection.close()
@@ -0,0 +1,146 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### PMT noise from the pedestal runs    #####
+#############################################
+# Each pedestal run is read once: its totPMTSene/totPMTCene noise histograms
+# (same binning as the PmtNoiseHist of the scripts) and the mean/rms of every
+# channel are stored in a small JSON database (noisedb), keyed by run number
+# and by the checksum of the pedestal file. The combined gaussian fit of the
+# noise is stored too, so GetPMTnoise only reads pedestal files and fits
+# again when one of them changed. Noise.png is drawn with the fit, so it is only
+# written when the fit is redone (delete the "fits" of noisedb to redraw it).
+
+import os
+import json
+import hashlib
+import numpy as np
+import ROOT
+import uproot
+from TBAna_Reader import treename, towerBranchesS, towerBranchesC
+from TBAna_Fit import IterativeGausFit, AttachGaus
+
+pedfolder = "/home/storage/data_apareti/TB24/PedestalRuns/"
+PedestalRuns = ["0771", "0777", "0780", "0781", "0784", "0796"]
+noisedb = "PedestalNoise.json"
+
+# binning of PmtNoiseHistS/C
+nBinsNoise = 100; minNoise = -5.; maxNoise = 5.
+
+# channels whose single-channel noise is stored
+noiseChannels = ["totPMTSene", "totPMTCene"] + towerBranchesS + towerBranchesC
+
+# database already loaded in this process
+loadedDB = {}
+
+
+def FileChecksum(path):
+    # sha1 of the file content, read in blocks of 16 MB
+    sha = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 24), b""):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def NoiseCounts(values):
+    # Bin contents of a PmtNoiseHist filled with values (same bin as TAxis::FindBin,
+    # under/overflows dropped)
+    values = values[(values >= minNoise) & (values < maxNoise)]
+    bins = (nBinsNoise*(values-minNoise)/(maxNoise-minNoise)).astype(int)
+    return np.bincount(bins, minlength=nBinsNoise)[:nBinsNoise].tolist()
+
+
+def LoadNoiseDB():
+    if(noisedb in loadedDB):
+        return loadedDB[noisedb]
+    db = {"runs": {}, "fits": {}}
+    if(os.path.exists(noisedb)):
+        with open(noisedb) as f:
+            db = json.load(f)
+    loadedDB[noisedb] = db
+    return db
+
+
+def SaveNoiseDB(db):
+    tmp = "{0}.{1}.tmp".format(noisedb, os.getpid())
+    with open(tmp, "w") as f:
+        json.dump(db, f, indent=1)
+    os.replace(tmp, noisedb)
+
+
+def GetPedestal(run, db):
+    # Entry of the pedestal run, recomputed only if the file changed
+    # (mtime/size are checked first, the checksum only when they differ)
+    path = pedfolder + "physics_sps2024_run" + run + ".root"
+    stat = os.stat(path)
+    stamp = [stat.st_mtime_ns, stat.st_size]
+    entry = db["runs"].get(run)
+    if(entry is not None and entry["stamp"] == stamp):
+        return entry
+    checksum = FileChecksum(path)
+    if(entry is not None and entry["checksum"] == checksum):
+        entry["stamp"] = stamp
+        SaveNoiseDB(db)
+        return entry
+
+    print("Reading pedestal run ", run)
+    tree = uproot.open(path)[treename]
+    channels = [ch for ch in noiseChannels if ch in tree.keys()]
+    data = tree.arrays(channels, library="np")
+    entry = {"stamp": stamp, "checksum": checksum,
+             "histS": NoiseCounts(data["totPMTSene"]), "histC": NoiseCounts(data["totPMTCene"]),
+             "channels": {ch: [float(np.mean(data[ch])), float(np.std(data[ch]))] for ch in channels}}
+    db["runs"][run] = entry
+    SaveNoiseDB(db)
+    return entry
+
+
+def GetPMTnoise(runs=PedestalRuns):
+    # Return the rms of the gaussian fit of the totPMTSene and totPMTCene noise,
+    # summed over the pedestal runs
+    print("\n... Calculating PMT noise")
+    db = LoadNoiseDB()
+    entries = [GetPedestal(run, db) for run in runs]
+    key = ",".join(run + ":" + entry["checksum"] for run, entry in zip(runs, entries))
+    if(key in db["fits"]):
+        RmsNoiseS, RmsNoiseC = db["fits"][key]
+        print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
+        return(RmsNoiseS, RmsNoiseC)
+
+    PmtNoiseHistS = ROOT.TH1D("PmtNoiseHistS", "PmtNoiseHistS", nBinsNoise, minNoise, maxNoise)
+    PmtNoiseHistC = ROOT.TH1D("PmtNoiseHistC", "PmtNoiseHistC", nBinsNoise, minNoise, maxNoise)
+    for i in range(nBinsNoise):
+        PmtNoiseHistS.SetBinContent(i+1, sum(entry["histS"][i] for entry in entries))
+        PmtNoiseHistC.SetBinContent(i+1, sum(entry["histC"][i] for entry in entries))
+    # SetBinContent counts one entry per call: set the number of binned events
+    # (under/overflows are not stored, so they are not counted)
+    PmtNoiseHistS.SetEntries(sum(sum(entry["histS"]) for entry in entries))
+    PmtNoiseHistC.SetEntries(sum(sum(entry["histC"]) for entry in entries))
+
+    cNoise = ROOT.TCanvas("cNoise", "cNoise", 1400, 1200)
+    PmtNoiseHistS.SetLineColor(ROOT.kRed); PmtNoiseHistS.SetLineWidth(2);  PmtNoiseHistS.Draw()
+    PmtNoiseHistC.SetLineColor(ROOT.kBlue); PmtNoiseHistC.SetLineWidth(2);  PmtNoiseHistC.Draw("same")
+
+    # gaussian fits over the whole range (both histograms at once, TBAna_Fit)
+    result = IterativeGausFit([PmtNoiseHistS, PmtNoiseHistC], [])
+    AttachGaus(PmtNoiseHistS, result, 0); AttachGaus(PmtNoiseHistC, result, 1)
+    RmsNoiseS = PmtNoiseHistS.GetFunction("gaus").GetParameter(2)
+    RmsNoiseC = PmtNoiseHistC.GetFunction("gaus").GetParameter(2)
+    print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
+
+    cNoise.Draw()
+    cNoise.SaveAs("Noise.png")
+
+    db["fits"][key] = [RmsNoiseS, RmsNoiseC]
+    SaveNoiseDB(db)
+    return(RmsNoiseS, RmsNoiseC)
+
+
+def GetChannelNoise(channel, runs=PedestalRuns):
+    # Mean and rms of a single channel (e.g. "TS00"), averaged over the pedestal runs
+    db = LoadNoiseDB()
+    entries = [GetPedestal(run, db) for run in runs]
+    means = [entry["channels"][channel][0] for entry in entries]
+    rmss = [entry["channels"][channel][1] for entry in entries]
+    return(np.mean(means), np.mean(rmss))
@@ -1,49 +1,39 @@
 import ROOT
 import uproot
+from TBAna_Reader import ReadDF, PrefetchDF, towerBranchesS, towerBranchesC
+from TBAna_Noise import GetPMTnoise
+from TBAna_Towers import TowerMatrix, TowersS, TowersC
+from TBAna_Hist import FillROOT
+from TBAna_Fit import FitGaus, FitPoly
+from TBAna_Calib import CalibrateScan, RunStats, TowerMeans, TestEvents
 import pandas as pd
 import numpy as np
-from scipy import optimize
 
 
 
 infolder = "/home/storage/data_apareti/TB24/ElectronEnergyScan/"
-pedfolder = "/home/storage/data_apareti/TB24/PedestalRuns/"
 treename = "Ftree"
 
+# Variables derived from the Ftree branches in GetDFparametrization
+derivedVars = {
+    # define Asymmetry variable
+    "AsymS" : "(TS11 - TS15) / (TS11 + TS15)",
+    "AsymC" : "(TC11 - TC15) / (TC11 + TC15)",
+    # define partial barycenter variable
+    "BaryS" : "(TS00 - 28.3*TS11 + 28.3*TS15) / (TS00 + TS11 + TS15)",
+    "BaryC" : "(TC00 - 28.3*TC11 + 28.3*TC15) / (TC00 + TC11 + TC15)"
+}
 
+# Other branches used after GetDFparametrization (main(), tower matrices for the recalibration)
+readBranches = ["totPMTSene", "totPMTCene", "YDWC2"] + towerBranchesS + towerBranchesC
 
-def GetPMTnoise():
-    print("\n... Calculating PMT noise")
+# Joint calibration of the tower weights on the electron scan (TBAna_Calib):
+# residuals relative to the beam energy, bounds of the weights (None: no
+# bounds, as lsq_linear before), label of the weights in the parametrisation store
+calibRelative = True
+weightBounds = None
+weightsLabel = "TBAna_OfflineCalib tower weights"
 
-    PedestalRuns = ["0771", "0777", "0780", "0781", "0784", "0796"]
-
-    PmtNoiseHistS = ROOT.TH1D("PmtNoiseHistS", "PmtNoiseHistS", 100, -5., 5.)
-    PmtNoiseHistC = ROOT.TH1D("PmtNoiseHistC", "PmtNoiseHistC", 100, -5., 5.)
-
-    for index, run in enumerate(PedestalRuns):
-        filename = "physics_sps2024_run" + run + ".root"
-
-        root_file = uproot.open(pedfolder+filename)
-        tree = root_file[treename]
-        data = tree.arrays(library="pd")    
-
-        #print(filename, data)
-        for pmtS, pmtC in zip(data["totPMTSene"], data["totPMTCene"]):
-            PmtNoiseHistS.Fill(pmtS)
-            PmtNoiseHistC.Fill(pmtC)
-
-    cNoise = ROOT.TCanvas("cNoise", "cNoise", 1400, 1200)
-    PmtNoiseHistS.SetLineColor(ROOT.kRed); PmtNoiseHistS.SetLineWidth(2);  PmtNoiseHistS.Draw()      
-    PmtNoiseHistC.SetLineColor(ROOT.kBlue); PmtNoiseHistC.SetLineWidth(2);  PmtNoiseHistC.Draw("same")
-
-    PmtNoiseHistS.Fit("gaus"); PmtNoiseHistC.Fit("gaus")
-    RmsNoiseS = PmtNoiseHistS.GetFunction("gaus").GetParameter(2)
-    RmsNoiseC = PmtNoiseHistC.GetFunction("gaus").GetParameter(2)
-    #print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
-
-    cNoise.Draw()
-    cNoise.SaveAs("Noise.png")
-    return(RmsNoiseS, RmsNoiseC)
 
 
 # Function to get mean Y from TProfile for any X value
@@ -54,17 +44,8 @@ def get_profile_mean(profile, x):
 
 def GetDFparametrization(run, Cut, filename, energy): 
     print("Using file: ", filename, energy)
-    root_file = uproot.open(infolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=Cut, library="pd")
-
-    # define Asymmetry variable 
-    data["AsymS"] = (data["TS11"] - data["TS15"]) / (data["TS11"] + data["TS15"] )
-    data["AsymC"] = (data["TC11"] - data["TC15"]) / (data["TC11"] + data["TC15"] )
-
-    # define partial barycenter variable 
-    data["BaryS"] = (data["TS00"]-28.3*data["TS11"]+28.3*data["TS15"])/(data["TS00"]+data["TS11"]+data["TS15"])
-    data["BaryC"] = (data["TC00"]-28.3*data["TC11"]+28.3*data["TC15"])/(data["TC00"]+data["TC11"]+data["TC15"])
+    # read only the branches used by the cut, the derived variables and main()
+    data = ReadDF(infolder+filename, Cut, derivedVars, readBranches)
 
     # input truth energy to dataframe
     data["TruthE"] = energy
@@ -73,13 +54,11 @@ def GetDFparametrization(run, Cut, filename, energy):
     eneSprof = ROOT.TProfile("eneSprof_{0}GeV".format(energy), "S Energy profile over Asymmetry {0}GeV; TS11-TS15 / TS11 + TS15; totPMTSene/E".format(energy), 100, -1, 1)
     eneCprof = ROOT.TProfile("eneCprof_{0}GeV".format(energy), "C Energy profile over Asymmetry {0}GeV; TC11-TC15 / TC11 + TC15; totPMTCene/E".format(energy), 100, -1, 1)
 
-    for eneS, asymS, eneC, asymC in zip(data["totPMTSene"].values, data["AsymS"].values, data["totPMTCene"].values, data["AsymC"].values):
-        eneSprof.Fill(asymS, eneS/energy)
-        eneCprof.Fill(asymC, eneC/energy)
+    FillROOT(eneSprof, data["AsymS"].values, data["totPMTSene"].values/energy)
+    FillROOT(eneCprof, data["AsymC"].values, data["totPMTCene"].values/energy)
 
     # Fit with 5 degree polynomial
-    eneSprof.Fit("pol5", "", "", -0.9, 0.9)
-    eneCprof.Fit("pol5", "", "", -0.9, 0.9)
+    FitPoly([eneSprof, eneCprof], 5, -0.9, 0.9)
 
     # Get fitted function
     funcS = eneSprof.GetFunction("pol5")
@@ -101,9 +80,8 @@ def DrawEnergyHist(dfs, energies, binning_S, binning_C, varname_S, varname_C):
         histS = ROOT.TH1D("histS{0}".format(energy), "histS{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
         histC = ROOT.TH1D("histC{0}".format(energy), "histC{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
 
-        for varS, varC in zip(df[varname_S], df[varname_C]): 
-            histS.Fill(varS)
-            histC.Fill(varC)
+        FillROOT(histS, df[varname_S].values)
+        FillROOT(histC, df[varname_C].values)
         histS.SetLineColor(i+1)
         histC.SetLineColor(i+1)
 
@@ -152,8 +130,6 @@ def DrawEnergyHist(dfs, energies, binning_S, binning_C, varname_S, varname_C):
 def main():
     print("Hello world!")
 
-    cutCalib = 5000
-
 
     # 20 GeV runs (new HV): 0766, 0999, 1018
     # open one run, get map of tower values
@@ -198,10 +174,18 @@ def main():
     CurrentCut = myCut + " & (XDWC2 > {0}) & (XDWC2 < {1}) & (YDWC2 > {2}) & (YDWC2 < {3})".format(cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index]) 
 
     #df, funcS, funcC, eneSprof, eneCprof = GetDFparametrization(run, CurrentCut, filename, energy)
-    root_file = uproot.open(infolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=myCut, library="pd")
-    data = data[:cutCalib]
+    # S and C tower weights calibrated jointly on the whole electron scan, each
+    # run with its beam energy as target (TBAna_Calib), on all the selected
+    # events (or, with calibSplit, on a part of them, the others being kept for
+    # the test below). The sums of each run are saved, so adding a run reads
+    # only its events
+    calibFiles = [infolder + "physics_sps2024_run" + calibRun + ".root" for calibRun in runs]
+    weights_Sci, weights_Cer, calibS, calibC = CalibrateScan(calibFiles, myCut, run_energies, label=weightsLabel,
+                                                             relative=calibRelative, bounds=weightBounds)
+    print("Calibration events: ", calibS["events"])
+    # tower means of the calibration run (unit-target sums of the run)
+    runS, runC = RunStats(infolder+filename, myCut)
+    meansS = TowerMeans(runS); meansC = TowerMeans(runC)
 
     inputs_name_S = ['TS55', 'TS54', 'TS53', 'TS45', 'TS44', 'TS43',
                     'TS35', 'TS34', 'TS33', 'TS25', 'TS24', 'TS23', 'TS16',
@@ -227,9 +211,9 @@ def main():
         row = nBinsY-int(index/3)-1
         print(tow, "\t", row, "\t", column)
 
-        for pmtS in data[tow]:
-            #mapSpmt.Fill(index+1, pmtS/energy)
-            mapSpmt.Fill(column+.5, row+.5, pmtS/calib_energy)
+        #FillROOT(mapSpmt, np.full(len(data), index+1.), data[tow].values/energy)
+        # sum of the tower energies over the calibration events
+        mapSpmt.Fill(column+.5, row+.5, meansS[index]*runS["events"]/calib_energy)
         #mapSpmt.GetXaxis().SetBinLabel(column+1,  )    
         
 
@@ -253,47 +237,6 @@ def main():
 
     cSpmt.SaveAs("mapSpmt.png")
 
-    A_S = np.array([
-        data['TS55'].to_numpy(), data['TS54'].to_numpy(), data['TS53'].to_numpy(),
-        data['TS45'].to_numpy(), data['TS44'].to_numpy(), data['TS43'].to_numpy(),
-        data['TS35'].to_numpy(), data['TS34'].to_numpy(), data['TS33'].to_numpy(),
-        data['TS25'].to_numpy(), data['TS24'].to_numpy(), data['TS23'].to_numpy(),
-        data['TS16'].to_numpy(), data['TS15'].to_numpy(), data['TS14'].to_numpy(),
-        data['TS17'].to_numpy(), data['TS00'].to_numpy(), data['TS13'].to_numpy(),
-        data['TS10'].to_numpy(), data['TS11'].to_numpy(), data['TS12'].to_numpy(),
-        data['TS20'].to_numpy(), data['TS21'].to_numpy(), data['TS22'].to_numpy(),
-        data['TS30'].to_numpy(), data['TS31'].to_numpy(), data['TS32'].to_numpy(),
-        data['TS40'].to_numpy(), data['TS41'].to_numpy(), data['TS42'].to_numpy(),
-        data['TS50'].to_numpy(), data['TS51'].to_numpy(), data['TS52'].to_numpy(),
-        data['TS60'].to_numpy(), data['TS61'].to_numpy(), data['TS62'].to_numpy()
-        ])
-
-    A_C = np.array([
-        data['TC55'].to_numpy(), data['TC54'].to_numpy(), data['TC53'].to_numpy(),
-        data['TC45'].to_numpy(), data['TC44'].to_numpy(), data['TC43'].to_numpy(),
-        data['TC35'].to_numpy(), data['TC34'].to_numpy(), data['TC33'].to_numpy(),
-        data['TC25'].to_numpy(), data['TC24'].to_numpy(), data['TC23'].to_numpy(),
-        data['TC16'].to_numpy(), data['TC15'].to_numpy(), data['TC14'].to_numpy(),
-        data['TC17'].to_numpy(), data['TC00'].to_numpy(), data['TC13'].to_numpy(),
-        data['TC10'].to_numpy(), data['TC11'].to_numpy(), data['TC12'].to_numpy(),
-        data['TC20'].to_numpy(), data['TC21'].to_numpy(), data['TC22'].to_numpy(),
-        data['TC30'].to_numpy(), data['TC31'].to_numpy(), data['TC32'].to_numpy(),
-        data['TC40'].to_numpy(), data['TC41'].to_numpy(), data['TC42'].to_numpy(),
-        data['TC50'].to_numpy(), data['TC51'].to_numpy(), data['TC52'].to_numpy(),
-        data['TC60'].to_numpy(), data['TC61'].to_numpy(), data['TC62'].to_numpy()
-        ])
-
-    print(A_S)
-    print(A_S.T)
-    print(data.shape)
-    print(data.shape[0])
-    target = np.full(data.shape[0], calib_energy)
-    sol_Sci = optimize.lsq_linear(A_S.T, target)
-    weights_Sci = sol_Sci.x
-
-    sol_Cer = optimize.lsq_linear(A_C.T, target)
-    weights_Cer = sol_Cer.x
-
 
     print(weights_Sci)
     print(weights_Cer)    
@@ -302,8 +245,8 @@ def main():
     pmtShist = ROOT.TH1D("pmtSraw", "Sci PMT energy run {0}".format(run), 36, 1, 36)
     pmtSweights = ROOT.TH1D("pmtSweights", "Sci PMT weights run {0}".format(run), 36, 1, 36)
     for index, tow in enumerate(inputs_name_S):
-        print(index, tow, data[tow].mean(), weights_Sci[index])
-        pmtShist.Fill(index+1, data[tow].mean())
+        print(index, tow, meansS[index], weights_Sci[index])
+        pmtShist.Fill(index+1, meansS[index])
         pmtShist.GetXaxis().SetBinLabel(index+1, tow)
         pmtSweights.SetBinContent(index+1, weights_Sci[index])
         pmtSweights.GetXaxis().SetBinLabel(index+1, tow)
@@ -311,8 +254,8 @@ def main():
     pmtChist = ROOT.TH1D("pmtCraw", "Cer PMT energy run {0}".format(run), 36, 1, 36)
     pmtCweights = ROOT.TH1D("pmtCweightC", "Cer PMT weights run {0}".format(run), 36, 1, 36)
     for index, tow in enumerate(inputC_name_C):
-        print(index, tow, data[tow].mean(), weights_Cer[index])
-        pmtChist.Fill(index+1, data[tow].mean())
+        print(index, tow, meansC[index], weights_Cer[index])
+        pmtChist.Fill(index+1, meansC[index])
         pmtChist.GetXaxis().SetBinLabel(index+1, tow)
         pmtCweights.SetBinContent(index+1, weights_Cer[index])
         pmtCweights.GetXaxis().SetBinLabel(index+1, tow)
@@ -366,9 +309,12 @@ def main():
     ROOT.gStyle.SetOptStat(111)
 
 
-    # Apply and test recalibration
-    correctedSciene = np.dot(A_S.T, weights_Sci)
-    correctedCerene = np.dot(A_C.T, weights_Cer)
+    # Apply and test recalibration on the calibration run (on its events held
+    # out from the calibration if calibSplit is set)
+    data = TestEvents(ReadDF(infolder+filename, myCut, branches=["totPMTSene", "totPMTCene"] + towerBranchesS + towerBranchesC))
+    towers = TowerMatrix(data)
+    correctedSciene = np.dot(TowersS(towers), weights_Sci)
+    correctedCerene = np.dot(TowersC(towers), weights_Cer)
 
     print( correctedSciene.shape )
     #print(data["totPMTSene"].mean(), data["totPMTSene"].rms())
@@ -376,18 +322,16 @@ def main():
 
     hist1Sci = ROOT.TH1D("totPMTSene", "totPMTSene", 100, 0., calib_energy*1.5)
     hist2Sci = ROOT.TH1D("eneScorrected", "eneScorrected", 100, 0., calib_energy*1.5)
-    for pmtS, eneS in zip(data["totPMTSene"], correctedSciene):
-        hist1Sci.Fill(pmtS)
-        hist2Sci.Fill(eneS)
+    FillROOT(hist1Sci, data["totPMTSene"].values)
+    FillROOT(hist2Sci, correctedSciene)
 
     print("totPMTSene: ", hist1Sci.GetMean(), " +- ", hist1Sci.GetRMS())
     print("After Calib: ", hist2Sci.GetMean(), " +- ", hist2Sci.GetRMS())
 
     hist1Cer = ROOT.TH1D("totPMTCene", "totPMTCene", 100, 0., calib_energy*1.5)
     hist2Cer = ROOT.TH1D("eneCcorrected", "eneCcorrected", 100, 0.,calib_energy*1.5)
-    for pmtC, eneC in zip(data["totPMTCene"], correctedCerene):
-        hist1Cer.Fill(pmtC)
-        hist2Cer.Fill(eneC)
+    FillROOT(hist1Cer, data["totPMTCene"].values)
+    FillROOT(hist2Cer, correctedCerene)
 
     print("totPMTCene: ", hist1Cer.GetMean(), " +- ", hist1Cer.GetRMS())
     print("After Calib: ", hist2Cer.GetMean(), " +- ", hist2Cer.GetRMS())
@@ -466,48 +410,27 @@ def main():
     MeanVec_C=[]; RmsVec_C=[]; MeanErrVec_C=[]; RmsErrVec_C=[] 
     MeanVec_Comb=[]; RmsVec_Comb=[]; MeanErrVec_Comb=[]; RmsErrVec_Comb=[] 
     
+    # cut of each run (with its DWC cuts), the same strings for the prefetching
+    # and the reads of the loop
+    runCuts = [myCut + " & (XDWC2 > {0}) & (XDWC2 < {1}) & (YDWC2 > {2}) & (YDWC2 < {3})".format(cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index]) for index in range(len(runs))]
+    # read the next run in the background while the current one is analysed
+    PrefetchDF([(infolder + "physics_sps2024_run" + run + ".root", runCut, derivedVars, readBranches) for run, runCut in zip(runs, runCuts)])
+
     for index, (run, energy) in enumerate(zip(runs, energies)):
         filename = "physics_sps2024_run" + run + ".root"
         print(filename, energy)
         ROOT.gStyle.SetOptFit(0)
         print("Current cuts on DWCs: ", cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index])
-        CurrentCut = myCut + " & (XDWC2 > {0}) & (XDWC2 < {1}) & (YDWC2 > {2}) & (YDWC2 < {3})".format(cut_x_min[index], cut_x_max[index], cut_y_min[index], cut_y_max[index]) 
+        CurrentCut = runCuts[index]
 
         data, funcS, funcC, eneSprof, eneCprof = GetDFparametrization(run, CurrentCut, filename, energy)
-        # remove events on which the calibration was performed
-        if(energy==calib_energy):
-            data = data.iloc[cutCalib:]
 
         # Apply and test recalibration
-        A_S = np.array([
-            data['TS55'].to_numpy(), data['TS54'].to_numpy(), data['TS53'].to_numpy(),
-            data['TS45'].to_numpy(), data['TS44'].to_numpy(), data['TS43'].to_numpy(),
-            data['TS35'].to_numpy(), data['TS34'].to_numpy(), data['TS33'].to_numpy(),
-            data['TS25'].to_numpy(), data['TS24'].to_numpy(), data['TS23'].to_numpy(),
-            data['TS16'].to_numpy(), data['TS15'].to_numpy(), data['TS14'].to_numpy(),
-            data['TS17'].to_numpy(), data['TS00'].to_numpy(), data['TS13'].to_numpy(),
-            data['TS10'].to_numpy(), data['TS11'].to_numpy(), data['TS12'].to_numpy(),
-            data['TS20'].to_numpy(), data['TS21'].to_numpy(), data['TS22'].to_numpy(),
-            data['TS30'].to_numpy(), data['TS31'].to_numpy(), data['TS32'].to_numpy(),
-            data['TS40'].to_numpy(), data['TS41'].to_numpy(), data['TS42'].to_numpy(),
-            data['TS50'].to_numpy(), data['TS51'].to_numpy(), data['TS52'].to_numpy(),
-            data['TS60'].to_numpy(), data['TS61'].to_numpy(), data['TS62'].to_numpy()
-            ])
-
-        A_C = np.array([
-            data['TC55'].to_numpy(), data['TC54'].to_numpy(), data['TC53'].to_numpy(),
-            data['TC45'].to_numpy(), data['TC44'].to_numpy(), data['TC43'].to_numpy(),
-            data['TC35'].to_numpy(), data['TC34'].to_numpy(), data['TC33'].to_numpy(),
-            data['TC25'].to_numpy(), data['TC24'].to_numpy(), data['TC23'].to_numpy(),
-            data['TC16'].to_numpy(), data['TC15'].to_numpy(), data['TC14'].to_numpy(),
-            data['TC17'].to_numpy(), data['TC00'].to_numpy(), data['TC13'].to_numpy(),
-            data['TC10'].to_numpy(), data['TC11'].to_numpy(), data['TC12'].to_numpy(),
-            data['TC20'].to_numpy(), data['TC21'].to_numpy(), data['TC22'].to_numpy(),
-            data['TC30'].to_numpy(), data['TC31'].to_numpy(), data['TC32'].to_numpy(),
-            data['TC40'].to_numpy(), data['TC41'].to_numpy(), data['TC42'].to_numpy(),
-            data['TC50'].to_numpy(), data['TC51'].to_numpy(), data['TC52'].to_numpy(),
-            data['TC60'].to_numpy(), data['TC61'].to_numpy(), data['TC62'].to_numpy()
-            ])
+        # tower energies as a float32 (events x 36) matrix per channel (TBAna_Towers),
+        # transposed as the stacked tower columns used before
+        towers = TowerMatrix(data)
+        A_S = TowersS(towers).T
+        A_C = TowersC(towers).T
 
 
         data["totPMTSene"] = np.dot(A_S.T, weights_Sci)
@@ -639,11 +562,10 @@ def main():
         HistCombCorrected = ROOT.TH1D("HistCombcorrected_{0}GeV".format(energy), "Combined Energy (corrected) {0}GeV; E [GeV]; Counts".format(energy), 100, energy-0.4*energy, energy+0.4*energy)
 
 
-        for eneS, pmtS, eneC, pmtC in zip(data["energyS"].values, data["totPMTSene"].values, data["energyC"].values, data["totPMTCene"].values):
-            HistScorrected.Fill(eneS)
-            HistSraw.Fill(pmtS)
-            HistCcorrected.Fill(eneC)
-            HistCraw.Fill(pmtC)
+        FillROOT(HistScorrected, data["energyS"].values)
+        FillROOT(HistSraw, data["totPMTSene"].values)
+        FillROOT(HistCcorrected, data["energyC"].values)
+        FillROOT(HistCraw, data["totPMTCene"].values)
 
 
         dfCorrected_array.append(data)
@@ -653,10 +575,9 @@ def main():
         #data_filtered = data[ (np.abs(data["AsymS"])<AsymCut ) & (np.abs(data["AsymC"])<AsymCut ) & (np.abs(data["BaryS"])<4) & (np.abs(data["BaryC"])<4) ]
         data_filtered = data[ (np.abs(data["AsymS"])<AsymCut ) & (np.abs(data["AsymC"])<AsymCut ) ]
 
-        for eneS, eneC in zip(data_filtered["energyS"].values, data_filtered["energyC"].values):
-            HistScorrected_Asymcut.Fill(eneS)
-            HistCcorrected_Asymcut.Fill(eneC)
-            HistCombCorrected.Fill( (eneS+eneC)/2 )
+        FillROOT(HistScorrected_Asymcut, data_filtered["energyS"].values)
+        FillROOT(HistCcorrected_Asymcut, data_filtered["energyC"].values)
+        FillROOT(HistCombCorrected, (data_filtered["energyS"].values+data_filtered["energyC"].values)/2)
 
 
 
@@ -673,11 +594,10 @@ def main():
 
 
 
-        for pmtS, eneS, pmtC, eneC, ydwc2 in zip(data["totPMTSene"], data["energyS"], data["totPMTCene"], data["energyC"], data["YDWC2"]):
-            SciEneVsYDWCprof.Fill(ydwc2, eneS)
-            SpmtVsYDWCprof.Fill(ydwc2, pmtS)
-            CerEneVsYDWCprof.Fill(ydwc2, eneC)
-            CpmtVsYDWCprof.Fill(ydwc2, pmtC)
+        FillROOT(SciEneVsYDWCprof, data["YDWC2"].values, data["energyS"].values)
+        FillROOT(SpmtVsYDWCprof, data["YDWC2"].values, data["totPMTSene"].values)
+        FillROOT(CerEneVsYDWCprof, data["YDWC2"].values, data["energyC"].values)
+        FillROOT(CpmtVsYDWCprof, data["YDWC2"].values, data["totPMTCene"].values)
 
 
         SciEneVsYDWCprof.SetLineColor(ROOT.kRed); SciEneVsYDWCprof.SetLineWidth(2); SciEneVsYDWCprof.SetMarkerColor(ROOT.kRed); SciEneVsYDWCprof.SetMarkerStyle(55)
@@ -724,15 +644,13 @@ def main():
 
 
 
-        for pmtS, pmtC, ydwc2, barS, barC in zip(data["totPMTSene"], data["totPMTCene"], data["YDWC2"], data["BaryS"], data["BaryC"]):
-            BarycenterEneProfS.Fill(barS, pmtS)
-            YDWCBarycenterProfS.Fill(ydwc2, barS)
-            BarycenterEneProfC.Fill(barC, pmtC)
-            YDWCBarycenterProfC.Fill(ydwc2, barC)
+        FillROOT(BarycenterEneProfS, data["BaryS"].values, data["totPMTSene"].values)
+        FillROOT(YDWCBarycenterProfS, data["YDWC2"].values, data["BaryS"].values)
+        FillROOT(BarycenterEneProfC, data["BaryC"].values, data["totPMTCene"].values)
+        FillROOT(YDWCBarycenterProfC, data["YDWC2"].values, data["BaryC"].values)
 
-        for pmtS, barS, asymS, pmtC, barC, asymC in zip(data["totPMTSene"], data["BaryS"], data["AsymS"], data["totPMTCene"], data["BaryC"], data["AsymC"]):    
-            SpmtAsymBarHist.Fill(asymS, barS, pmtS)
-            CpmtAsymBarHist.Fill(asymC, barC, pmtC)
+        FillROOT(SpmtAsymBarHist, data["AsymS"].values, data["BaryS"].values, data["totPMTSene"].values)
+        FillROOT(CpmtAsymBarHist, data["AsymC"].values, data["BaryC"].values, data["totPMTCene"].values)
 
 
         
@@ -840,21 +758,9 @@ def main():
                    
             
 
-        HistScorrected_Asymcut.Fit("gaus", "Q")
-        fitS = HistScorrected_Asymcut.GetFunction("gaus")
-
-        HistCcorrected_Asymcut.Fit("gaus", "Q")
-        fitC = HistCcorrected_Asymcut.GetFunction("gaus")
-
-        HistCombCorrected.Fit("gaus","Q")
-        fitComb = HistCombCorrected.GetFunction("gaus")
-
-
         ROOT.gStyle.SetOptFit(111)
-        # refit within -1.5 and +3 sigma
-        HistScorrected_Asymcut.Fit("gaus", "Q", "", fitS.GetParameter(1)-1.5*fitS.GetParameter(2), fitS.GetParameter(1)+3*fitS.GetParameter(2)) 
-        HistCcorrected_Asymcut.Fit("gaus", "Q", "", fitC.GetParameter(1)-1.5*fitC.GetParameter(2), fitC.GetParameter(1)+3*fitC.GetParameter(2)) 
-        HistCombCorrected.Fit("gaus", "Q", "", fitComb.GetParameter(1)-1.5*fitComb.GetParameter(2), fitComb.GetParameter(1)+3*fitComb.GetParameter(2)) 
+        # fit, then refit within -1.5 and +3 sigma (all three histograms at once)
+        FitGaus([HistScorrected_Asymcut, HistCcorrected_Asymcut, HistCombCorrected], 1.5, 3)
 
 
         scihist = ROOT.TCanvas("cSciEnergy{0}".format(energy), "cSciEnergy{0}".format(energy), 1400, 1200)
@@ -879,18 +785,14 @@ def main():
         sigmaC = BestFitC.GetParameter(2)
 
         weightedEneHist = ROOT.TH1D("WeightedEne_{0}".format(energy), "Combined Energy (weighted for RMS, {0}GeV);E [GeV];Counts".format(energy), 100, energy-0.4*energy, energy+0.4*energy)
-        for eneS, eneC in zip(data["energyS"], data["energyC"]):
-            s2 = sigmaS*sigmaS
-            c2 = sigmaC*sigmaC
-            num = (eneS/s2) + (eneC/c2)
-            denum = (1/s2) + (1/c2)
-            weightedE = num/denum
-            weightedEneHist.Fill(weightedE)
-
-
-        weightedEneHist.Fit("gaus","Q")
-        fitWeightEne = weightedEneHist.GetFunction("gaus")
-        weightedEneHist.Fit("gaus", "Q", "", fitWeightEne.GetParameter(1)-1.5*fitWeightEne.GetParameter(2), fitWeightEne.GetParameter(1)+3*fitWeightEne.GetParameter(2)) 
+        s2 = sigmaS*sigmaS
+        c2 = sigmaC*sigmaC
+        num = (data["energyS"].values/s2) + (data["energyC"].values/c2)
+        denum = (1/s2) + (1/c2)
+        FillROOT(weightedEneHist, num/denum)
+
+
+        FitGaus([weightedEneHist], 1.5, 3)
         BestFitWeighted = weightedEneHist.GetFunction("gaus")
 
         cWeight = ROOT.TCanvas("cWeightedEnergy{0}".format(energy), "cWeightedEnergy{0}".format(energy), 1400, 1200)
@@ -0,0 +1,77 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Versioned parametrisation store     #####
+#############################################
+# The correction functions (asymmetry and TDC polynomials, TBAna_Func) are
+# saved in parfile under a label (e.g. "TBAna_Had 40GeV"), with the run they
+# were fitted on and a key of their inputs: the ntuple (path, mtime, size),
+# the cut and the settings (chi, containment, normalisation, selections...),
+# as the keys of the event cache (TBAna_Store). Each new key of a label is a
+# new version; the older versions are kept. A script asking for a label and
+# key gets the stored functions if nothing changed, and rebuilds them only
+# when the key is not in the store.
+# The store is JSON (plain numbers, no ROOT), rewritten through a temporary
+# file so an interrupted job never leaves it truncated.
+
+import os
+import json
+import time
+from TBAna_Store import CacheKey
+
+parfile = "TBAna_Parametrisations.json"
+
+
+def ParKey(filename, Cut, settings):
+    # Key of the inputs of a parametrisation: ntuple, cut and settings (dict)
+    return CacheKey(filename, Cut, ["{0} = {1!r}".format(name, settings[name]) for name in sorted(settings)])
+
+
+def LoadStore():
+    # {label: [versions]} of parfile, empty if there is none
+    if(parfile is None or not os.path.exists(parfile)):
+        return {}
+    with open(parfile) as infile:
+        return json.load(infile)
+
+
+def WriteStore(store):
+    tmp = "{0}.{1}.tmp".format(parfile, os.getpid())
+    with open(tmp, "w") as out:
+        json.dump(store, out, indent=1)
+    os.replace(tmp, parfile)
+
+
+def LoadPars(label, key=None):
+    # {name: Poly} of the version of label with this key (the latest version
+    # if key is None), or None if it is not in the store
+    versions = LoadStore().get(label, [])
+    matching = [version for version in versions if key is None or version["key"] == key]
+    if(not matching):
+        return None
+    version = matching[-1]
+    print("Using parametrisation '{0}' version {1} ({2})".format(label, version["version"], version["created"]))
+    return version["polys"]
+
+
+def SavePars(label, key, polys, info={}):
+    # Store {name: Poly} as a new version of label; info (run, file, cut,
+    # settings...) is saved with it
+    if(parfile is None):
+        return
+    store = LoadStore()
+    versions = store.setdefault(label, [])
+    version = {"version": len(versions)+1, "key": key, "created": time.strftime("%Y-%m-%d %H:%M:%S"), "info": info, "polys": polys}
+    versions.append(version)
+    WriteStore(store)
+    print("Saved parametrisation '{0}' version {1}".format(label, version["version"]))
+
+
+def StoredPars(label, key, build, info={}):
+    # Stored {name: Poly} of label and key, or build() saved as a new version
+    # when the inputs changed (or the label is new)
+    polys = LoadPars(label, key)
+    if(polys is None):
+        polys = build()
+        SavePars(label, key, polys, info)
+    return polys
@@ -0,0 +1,26 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Per-run processing in process pools #####
+#############################################
+# The runs of an energy scan are independent until the parametrisations are
+# compared, so the per-run stage can be fanned out to a pool of processes.
+# The function must be defined at module level (it is pickled by name) and
+# its arguments and results must be picklable (numbers, strings, dataframes).
+
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+# number of worker processes, 1 runs everything sequentially in this process
+nWorkers = min(8, os.cpu_count() or 1)
+
+
+def MapRuns(func, *args, workers=None):
+    # Same as list(map(func, *args)), with one task per run in a process pool
+    # The results are returned in the order of the runs
+    if(workers is None):
+        workers = nWorkers
+    if(workers <= 1):
+        return list(map(func, *args))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        return list(pool.map(func, *args))
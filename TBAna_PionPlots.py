@@ -11,6 +11,9 @@ import pandas as pd
 import numpy as np
 import ROOT 
 import uproot
+from TBAna_Reader import ReadDF, PrefetchDF
+from TBAna_Hist import FillROOT
+from TBAna_Fit import FitPoly
 from scipy import optimize
 
 calibfolder = "/home/storage/data_apareti/TB24/ElectronEnergyScan/"
@@ -22,6 +25,26 @@ treename = "Ftree"
 chi_value = 0.35
 #chi_value = 0.75
 
+# Variables derived from the Ftree branches in GetDF
+derivedVars = {
+    # define Asymmetry variable
+    "AsymS" : "(TS24 - TS21) / (TS24 + TS21)",
+    "AsymC" : "(TC24 - TC21) / (TC24 + TC21)",
+    # define partial barycenter variable
+    "BaryS" : "(TS00 - 28.3*TS11 + 28.3*TS15) / (TS00 + TS11 + TS15)",
+    "BaryC" : "(TC00 - 28.3*TC11 + 28.3*TC15) / (TC00 + TC11 + TC15)",
+    # leakage counters grouped in rings around the module
+    "leakRing1" : "L02 + L04 + L03",
+    "leakRing2" : "L05 + L07 + L08 + L09",
+    "leakRing3" : "L10 + L11 + L12 + L13",
+    "leakRing4" : "L14 + L15 + L16 + L20",
+    # dual-readout energy
+    "totDRene" : "(totPMTSene - {0}*totPMTCene) / (1 - {0})".format(chi_value)
+}
+
+# Other branches used after GetDF (timing cleanup and profiles)
+readBranches = ["totPMTSene", "totPMTCene", "TDC_TS00", "TDC_TS11", "TDC_TS15", "TDC_TC00", "TDC_TC11", "TDC_TC15"]
+
 #containment = 0.875
 
 
@@ -32,17 +55,8 @@ chi_value = 0.35
 
 def GetDF(run, Cut, filename, energy, containment): 
     print("Using file: ", filename, energy)
-    root_file = uproot.open(infolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=Cut, library="pd")
-
-    # define Asymmetry variable 
-    data["AsymS"] = (data["TS24"] - data["TS21"]) / (data["TS24"] + data["TS21"] )
-    data["AsymC"] = (data["TC24"] - data["TC21"]) / (data["TC24"] + data["TC21"] )
-
-    # define partial barycenter variable 
-    data["BaryS"] = (data["TS00"]-28.3*data["TS11"]+28.3*data["TS15"])/(data["TS00"]+data["TS11"]+data["TS15"])
-    data["BaryC"] = (data["TC00"]-28.3*data["TC11"]+28.3*data["TC15"])/(data["TC00"]+data["TC11"]+data["TC15"])
+    # read only the branches used by the cut, the derived variables and main()
+    data = ReadDF(infolder+filename, Cut, derivedVars, readBranches)
 
     data["pmtS_cont"] = data["totPMTSene"]/containment
     data["pmtC_cont"] = data["totPMTCene"]/containment
@@ -50,7 +64,6 @@ def GetDF(run, Cut, filename, energy, containment):
     #data["pmtS_cont_att"] = data["totPMTSene"]/containment/S_attenuation_correction
     #data["pmtC_cont_att"] = data["totPMTCene"]/containment/C_attenuation_correction
 
-    data["totDRene"] = (data["totPMTSene"]-chi_value*data["totPMTCene"]) / (1-chi_value)
     data["totDRene_cont"] = data["totDRene"]/containment
     #data["totDRene_cont_att"] = (data["totPMTSene"]/S_attenuation_correction-chi_value*data["totPMTCene"]/C_attenuation_correction) / (1-chi_value) / containment
 
@@ -70,27 +83,14 @@ def GetAsymProfiles(data, energy):
     SciAsymprof = ROOT.TProfile("sciprof_{0}GeV".format(energy), "totPMTSene profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; totPMTSene/E".format(energy), 100, -1, 1)
     CerAsymprof = ROOT.TProfile("cerprof_{0}GeV".format(energy), "totPMTCene profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; totPMTCene/E".format(energy), 100, -1, 1)
 
-    for DRene, asymS,  asymC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values):
-        #if(asymS < 0.9 and asymS > -0.9 and asymC < 0.9 and asymC > -0.9):
-        DReneAsymSprof.Fill(asymS, DRene/energy)
-        DReneAsymCprof.Fill(asymC, DRene/energy)
-
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        #if(asymS < 0.9 and asymS > -0.9 and asymC < 0.9 and asymC > -0.9):
-        #SciAsymHist.Fill(asymS, pmtS)
-        #CerAsymHist.Fill(asymC, pmtC)
-        SciAsymprof.Fill(asymS, pmtS/energy)
-        CerAsymprof.Fill(asymC, pmtC/energy)
-        #if(tdcS > 512):
-        #    ScieneStdcProf.Fill(tdcS, pmtS/energy)
-        #if(tdcC>512):
-        #    CereneCtdcProf.Fill(tdcC, pmtC/energy)
-
-    # Fit asymmetry with 5 degree polynomial
-    DReneAsymSprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    DReneAsymCprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    SciAsymprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    CerAsymprof.Fit("pol5", "Q", "", -0.9, 0.9) 
+    FillROOT(DReneAsymSprof, data["AsymS"].values, data["totDRene_cont"].values/energy)
+    FillROOT(DReneAsymCprof, data["AsymC"].values, data["totDRene_cont"].values/energy)
+
+    FillROOT(SciAsymprof, data["AsymS"].values, data["pmtS_cont"].values/energy)
+    FillROOT(CerAsymprof, data["AsymC"].values, data["pmtC_cont"].values/energy)
+
+    # Fit asymmetry with 5 degree polynomial (all the profiles at once)
+    FitPoly([DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof], 5, -0.9, 0.9)
     # Get fitted function
     fDReneAsymS = DReneAsymSprof.GetFunction("pol5")
     fDReneAsymC = DReneAsymCprof.GetFunction("pol5")
@@ -120,8 +120,7 @@ def GetAsymProfiles(data, energy):
 def DrawColzPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, nbinY, ymin, ymax):
     cCanva = ROOT.TCanvas(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), 1400, 1200)
     colHist = ROOT.TH2D(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), nbinX, xmin, xmax, nbinY, ymin, ymax)
-    for xval, yval in zip(varX, varY):
-        colHist.Fill(xval, yval)
+    FillROOT(colHist, varX, varY)
     colHist.Draw("colz")
     cCanva.SaveAs(outfile)
 
@@ -129,8 +128,7 @@ def DrawColzPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX,
 def DrawProfPlot(outfile, ctitle, varX, varY, labelPlot, labelX, labelY, nbinX, xmin, xmax, markerStyle=20, markerColor=ROOT.kBlue):
     cCanva = ROOT.TCanvas(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), 1400, 1200)
     myProf = ROOT.TProfile(ctitle, "{0};{1};{2}".format(labelPlot, labelX, labelY), nbinX, xmin, xmax)
-    for xval, yval in zip(varX, varY):
-        myProf.Fill(xval, yval)
+    FillROOT(myProf, varX, varY)
     myProf.SetMarkerStyle(markerStyle); myProf.SetMarkerColor(markerColor)
     myProf.Draw("colz")
     cCanva.SaveAs(outfile)
@@ -146,21 +144,16 @@ def GetTDCProfiles(data, energy):
     CereneCtdcProf = ROOT.TProfile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), 100, 600, 720)
 
     # Fill profiles
-    for DRene, asymS,  asymC, tdcS, tdcC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values, data["TDC_TS11"].values, data["TDC_TC11"].values):
-        DReneStdcProf.Fill(tdcS, DRene/energy)
-        DReneCtdcProf.Fill(tdcC, DRene/energy)
+    FillROOT(DReneStdcProf, data["TDC_TS11"].values, data["totDRene_cont"].values/energy)
+    FillROOT(DReneCtdcProf, data["TDC_TC11"].values, data["totDRene_cont"].values/energy)
 
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        ScieneStdcProf.Fill(tdcS, pmtS/energy)
-        CereneCtdcProf.Fill(tdcC, pmtC/energy)
+    FillROOT(ScieneStdcProf, data["TDC_TS11"].values, data["pmtS_cont"].values/energy)
+    FillROOT(CereneCtdcProf, data["TDC_TC11"].values, data["pmtC_cont"].values/energy)
 
     UpLimit = [680, 680, 680, 680]
 
-    # Fit TDC with a straight line
-    f1 = DReneStdcProf.Fit("pol1", "SQ", "", 620, UpLimit[0])
-    f2 = DReneCtdcProf.Fit("pol1", "SQ", "", 620, UpLimit[1])
-    f3 = ScieneStdcProf.Fit("pol1", "SQ", "", 620, UpLimit[2])
-    f4 = CereneCtdcProf.Fit("pol1", "SQ", "", 620, UpLimit[3])
+    # Fit TDC with a straight line (all the profiles at once)
+    FitPoly([DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf], 1, 620, UpLimit)
     # Get fitted function
     fDReneStdc = DReneStdcProf.GetFunction("pol1")
     fDReneCtdc = DReneCtdcProf.GetFunction("pol1")
@@ -211,9 +204,12 @@ def GetTDCProfiles(data, energy):
 
 def GetProfileFit(data, energy, funcname, varx, vary, nbinsX, xmin, xmax, profname, labelX, labelY, fitmin, fitmax):
     prof = ROOT.TProfile("{0}_{1}".format(profname, energy), "{0}_{1};{2};{3}".format(profname, energy, labelX, labelY), nbinsX, xmin, xmax)
-    for x, y in zip(data[varx], data[vary]):
-        prof.Fill(x, y/energy)
-    prof.Fit(funcname, "Q", "", fitmin, fitmax)
+    FillROOT(prof, data[varx].values, data[vary].values/energy)
+    # polynomials as linear least squares (TBAna_Fit), other functions with Minuit
+    if(funcname.startswith("pol")):
+        FitPoly([prof], int(funcname[3:]), fitmin, fitmax)
+    else:
+        prof.Fit(funcname, "Q", "", fitmin, fitmax)
     fit = prof.GetFunction(funcname)
     cTestProfile = ROOT.TCanvas("cProfile_{0}".format(profname), "{0}_{1}".format(profname, energy), 1400, 1200)
     prof.SetMarkerStyle(20); prof.SetMarkerColor(ROOT.kBlack); prof.SetMarkerSize(2); fit.SetLineColor(ROOT.kRed)
@@ -235,11 +231,10 @@ def DrawEnergyHist(dfs, energies, binning_S, binning_C, varname_S, varname_C):
         histDRcorr = ROOT.TH1D("histDRcorr{0}".format(energy), "histDRcorr{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
 
 
-        for varS, varC, varDR, varDRcorr in zip(df[varname_S], df[varname_C], df["totDRene"], df["totDRene_cont"]): 
-            histS.Fill(varS)
-            histC.Fill(varC)
-            histDR.Fill(varDR)
-            histDRcorr.Fill(varDRcorr)
+        FillROOT(histS, df[varname_S].values)
+        FillROOT(histC, df[varname_C].values)
+        FillROOT(histDR, df["totDRene"].values)
+        FillROOT(histDRcorr, df["totDRene_cont"].values)
 
         histS.SetLineColor(i+1)
         histC.SetLineColor(i+1)
@@ -320,8 +315,7 @@ def DrawFem(energy, eneS, eneC, labelS, labelC, title, outname):
     ROOT.gStyle.SetOptStat(0)
     cFem = ROOT.TCanvas(title, title, 1400, 1200)
     histfem = ROOT.TH2D("histfem{0}GeV".format(energy), "{3}, {0}GeV;{1}/E;{2}/E".format(energy, labelS, labelC, title), 50, 0., 1.5, 50, 0., 1.5)
-    for s, c in zip(eneS, eneC):
-        histfem.Fill(s/energy, c/energy)
+    FillROOT(histfem, np.asarray(eneS)/energy, np.asarray(eneC)/energy)
     histfem.Draw("colz")
     cFem.SaveAs("{0}{1}.png".format(outname, energy))
     ROOT.gStyle.SetOptStat(1)
@@ -375,9 +369,8 @@ def main():
         row = nBinsY-int(index/3)-1
         print(tow, "\t", row, "\t", column)
 
-        for pmtS in data[tow]:
-            #mapSpmt.Fill(index+1, pmtS/energy)
-            mapSpmt.Fill(column+.5, row+.5, pmtS/calib_energy)
+        #FillROOT(mapSpmt, np.full(len(data), index+1.), data[tow].values/energy)
+        FillROOT(mapSpmt, np.full(len(data), column+.5), np.full(len(data), row+.5), data[tow].values/calib_energy)
         #mapSpmt.GetXaxis().SetBinLabel(column+1,  )    
         
 
@@ -488,6 +481,9 @@ def main():
 
 
     # First loop: prepare data and extract parametrizations for asymmetry and TDC information    
+    # read the next run in the background while the current one is analysed
+    PrefetchDF([(infolder + "physics_sps2024_run" + run + ".root", myCut, derivedVars, readBranches) for run in runs])
+
     for index, (run, energy, cont) in enumerate(zip(runs, energies, exp_containment)):
         filename = "physics_sps2024_run" + run + ".root"
         #print(filename, energy, cont)
@@ -531,13 +527,7 @@ def main():
         # plot TDC profiles and return
         DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf, fDReneStdc, fDReneCtdc, fScieneStdc, fCereneCtdc = GetTDCProfiles(df, energy)
 
-        # Define some variable of interest 
-        # Plot dependency of "leakage rings" with timing 
-        df["leakRing1"] = df["L02"]+df["L04"]+df["L03"]
-        df["leakRing2"] = df["L05"]+df["L07"]+df["L08"]+df["L09"]
-        df["leakRing3"] = df["L10"]+df["L11"]+df["L12"]+df["L13"]
-        df["leakRing4"] = df["L14"]+df["L15"]+df["L16"]+df["L20"]
-
+        # Plot dependency of "leakage rings" (defined in derivedVars) with timing 
         leakrings = ["leakRing1", "leakRing2", "leakRing3", "leakRing4"]
         for i, lRing in enumerate(leakrings):
             print("LeakRing{0}VsTdcTS11_{1}GeV.png".format(i+1, energy))
@@ -576,11 +566,10 @@ def main():
             Ring3Prof = ROOT.TProfile("Ring3Prof{1}{0}".format(energy, tdcvar), "{0}, {3}GeV;{1};{2}".format("Ring3Prof", labelX, labelY, energy), nbinX, xmin, xmax)
             Ring4Prof = ROOT.TProfile("Ring4Prof{1}{0}".format(energy, tdcvar), "{0}, {3}GeV;{1};{2}".format("Ring4Prof", labelX, labelY, energy), nbinX, xmin, xmax)
 
-            for tdc, lring1, lring2, lring3, lring4 in zip(df[tdcvar], df["leakRing1"], df["leakRing2"], df["leakRing3"], df["leakRing4"]):
-                Ring1Prof.Fill(tdc, lring1)
-                Ring2Prof.Fill(tdc, lring2)
-                Ring3Prof.Fill(tdc, lring3)
-                Ring4Prof.Fill(tdc, lring4)
+            FillROOT(Ring1Prof, df[tdcvar].values, df["leakRing1"].values)
+            FillROOT(Ring2Prof, df[tdcvar].values, df["leakRing2"].values)
+            FillROOT(Ring3Prof, df[tdcvar].values, df["leakRing3"].values)
+            FillROOT(Ring4Prof, df[tdcvar].values, df["leakRing4"].values)
 
             #myProf.SetMarkerStyle(markerStyle); myProf.SetMarkerColor(markerColor)
             #myProf.Draw("colz")
@@ -3,45 +3,10 @@ import numpy as np
 import ROOT
 import argparse
 import uproot
+from TBAna_Noise import GetPMTnoise
 
-pedfolder = "/home/storage/data_apareti/TB24/PedestalRuns/"
 treename = "Ftree"
 
-def GetPMTnoise():
-    print("\n... Calculating PMT noise")
-
-    PedestalRuns = ["0771", "0777", "0780", "0781", "0784", "0796"]
-
-    PmtNoiseHistS = ROOT.TH1D("PmtNoiseHistS", "PmtNoiseHistS", 100, -5., 5.)
-    PmtNoiseHistC = ROOT.TH1D("PmtNoiseHistC", "PmtNoiseHistC", 100, -5., 5.)
-
-    for index, run in enumerate(PedestalRuns):
-        filename = "physics_sps2024_run" + run + ".root"
-
-        root_file = uproot.open(pedfolder+filename)
-        tree = root_file[treename]
-        data = tree.arrays(library="pd")    
-
-        print(filename, data)
-        for pmtS, pmtC in zip(data["totPMTSene"], data["totPMTCene"]):
-            PmtNoiseHistS.Fill(pmtS)
-            PmtNoiseHistC.Fill(pmtC)
-
-    cNoise = ROOT.TCanvas("cNoise", "cNoise", 1400, 1200)
-    PmtNoiseHistS.SetLineColor(ROOT.kRed); PmtNoiseHistS.SetLineWidth(2);  PmtNoiseHistS.Draw()      
-    PmtNoiseHistC.SetLineColor(ROOT.kBlue); PmtNoiseHistC.SetLineWidth(2);  PmtNoiseHistC.Draw("same")
-
-    PmtNoiseHistS.Fit("gaus"); PmtNoiseHistC.Fit("gaus")
-    RmsNoiseS = PmtNoiseHistS.GetFunction("gaus").GetParameter(2)
-    RmsNoiseC = PmtNoiseHistC.GetFunction("gaus").GetParameter(2)
-    print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
-
-    cNoise.Draw()
-    cNoise.SaveAs("Noise.png")
-    return(RmsNoiseS, RmsNoiseC)
-
-
-
 def main():
     print("Hello there")
     # Create the argument parser
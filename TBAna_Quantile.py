@@ -0,0 +1,134 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Streaming quantile sketches         #####
+#############################################
+# Quantile estimators (IQR, shortest interval / sigma_eff) which are updated
+# chunk by chunk and merged across workers without keeping the events.
+# A sketch counts the values in logarithmic buckets, (gamma^(i-1), gamma^i] with
+# gamma = (1+alpha)/(1-alpha), for the positive and (mirrored) negative values,
+# and values with |x| <= minValue in a zero bucket. The bucket value 2 gamma^i/(gamma+1)
+# is within a relative error alpha of every value in the bucket, so:
+#  - a quantile is within alpha*|x| of the exact value of the same rank
+#  - the shortest interval [a, b] is within alpha*(|a|+|b|) of the exact one
+# Merging two sketches adds the bucket counts, so it is exact (same sketch
+# as the one updated with all the values). The memory is one count per
+# non-empty bucket, ln(xmax/xmin)/(2 alpha) buckets at most (about 11500 per
+# decade for alpha = 1e-4), bounded by maxBuckets: beyond it the buckets
+# of the smallest |x| are merged and lose the alpha guarantee.
+
+import numpy as np
+
+# relative accuracy of the sketches
+quantileAlpha = 1e-4
+# bucket limit per sign
+maxBuckets = 65536
+# values with smaller |x| are counted as 0
+minValue = 1e-9
+
+
+def Sketch(alpha=None):
+    # Empty sketch with relative accuracy alpha (quantileAlpha if None)
+    alpha = quantileAlpha if alpha is None else alpha
+    return {"alpha": alpha, "gamma": (1+alpha)/(1-alpha), "count": 0, "zero": 0, "min": np.inf, "max": -np.inf,
+            "posKeys": np.zeros(0, dtype=np.int64), "posCounts": np.zeros(0, dtype=np.int64),
+            "negKeys": np.zeros(0, dtype=np.int64), "negCounts": np.zeros(0, dtype=np.int64)}
+
+
+def AddBuckets(keys, counts, newKeys, newCounts):
+    # Sum the counts of the same bucket, keys in increasing order; over
+    # maxBuckets the lowest buckets (smallest |x|) are merged into one
+    keys, inverse = np.unique(np.concatenate((keys, newKeys)), return_inverse=True)
+    counts = np.bincount(inverse, weights=np.concatenate((counts, newCounts)), minlength=len(keys)).astype(np.int64)
+    if(len(keys) > maxBuckets):
+        extra = len(keys) - maxBuckets
+        counts = np.concatenate(([counts[:extra+1].sum()], counts[extra+1:]))
+        keys = keys[extra:]
+    return keys, counts
+
+
+def Update(sketch, values):
+    # Add the values (array) to the sketch and return it; NaN and inf are skipped
+    values = np.asarray(values, dtype=np.float64)
+    values = values[np.isfinite(values)]
+    if(len(values) == 0):
+        return sketch
+    sketch["count"] += len(values)
+    sketch["min"] = min(sketch["min"], values.min())
+    sketch["max"] = max(sketch["max"], values.max())
+    logGamma = np.log(sketch["gamma"])
+    for sign in ["pos", "neg"]:
+        part = values[values > minValue] if sign == "pos" else -values[values < -minValue]
+        keys, counts = np.unique(np.ceil(np.log(part)/logGamma).astype(np.int64), return_counts=True)
+        sketch[sign+"Keys"], sketch[sign+"Counts"] = AddBuckets(sketch[sign+"Keys"], sketch[sign+"Counts"], keys, counts)
+    sketch["zero"] += int(np.count_nonzero(np.abs(values) <= minValue))
+    return sketch
+
+
+def MergeSketch(sketch, other):
+    # Add the counts of other (same alpha) to sketch and return it
+    if(sketch["alpha"] != other["alpha"]):
+        raise ValueError("sketches with alpha {0} and {1} cannot be merged".format(sketch["alpha"], other["alpha"]))
+    for sign in ["pos", "neg"]:
+        sketch[sign+"Keys"], sketch[sign+"Counts"] = AddBuckets(sketch[sign+"Keys"], sketch[sign+"Counts"], other[sign+"Keys"], other[sign+"Counts"])
+    sketch["zero"] += other["zero"]
+    sketch["count"] += other["count"]
+    sketch["min"] = min(sketch["min"], other["min"])
+    sketch["max"] = max(sketch["max"], other["max"])
+    return sketch
+
+
+def Buckets(sketch):
+    # Bucket values in increasing order, and their cumulative counts
+    gamma = sketch["gamma"]
+    posValues = 2*gamma**sketch["posKeys"].astype(np.float64)/(gamma+1)
+    negValues = -2*gamma**sketch["negKeys"][::-1].astype(np.float64)/(gamma+1)
+    values = np.concatenate((negValues, [0.], posValues))
+    counts = np.concatenate((sketch["negCounts"][::-1], [sketch["zero"]], sketch["posCounts"]))
+    keep = counts > 0
+    # the smallest and largest values are known exactly
+    return np.clip(values[keep], sketch["min"], sketch["max"]), np.cumsum(counts[keep])
+
+
+def RankValues(sketch, ranks):
+    # Values of the given ranks (0 to count-1, integers) of the sorted values
+    values, cumulative = Buckets(sketch)
+    return values[np.searchsorted(cumulative, np.asarray(ranks), side="right")]
+
+
+def Quantile(sketch, q):
+    # q quantile (0 to 1), interpolated between ranks as np.percentile(x, 100*q)
+    if(sketch["count"] == 0):
+        return None
+    rank = q*(sketch["count"]-1)
+    low, high = RankValues(sketch, [int(np.floor(rank)), int(np.ceil(rank))])
+    return low + (rank-np.floor(rank))*(high-low)
+
+
+def IQRSigma(sketch):
+    # Interquartile range / 1.349, the sigma of a gaussian with the same IQR
+    # (interquatile of TowerResponseOverY)
+    if(sketch["count"] == 0):
+        return None
+    return (Quantile(sketch, 0.75) - Quantile(sketch, 0.25)) / 1.349
+
+
+def ShortestInterval(sketch, integral=0.6826894921370888):
+    # Width of the smallest interval containing the fraction integral of the
+    # values, as smallestInterval of TowerResponseOverY on the full array
+    N = sketch["count"]
+    D = int(np.floor(integral * N))
+    if(N == 0 or D == 0):
+        return None
+    values, cumulative = Buckets(sketch)
+    # the lowest value of an interval is the first of a bucket
+    starts = np.concatenate(([0], cumulative[:-1]))
+    starts = starts[starts + D < N]
+    widths = RankValues(sketch, starts + D) - RankValues(sketch, starts)
+    return widths.min()
+
+
+def SigmaEff(sketch, integral=0.6826894921370888):
+    # Half width of the shortest interval with 68.3% of the values
+    width = ShortestInterval(sketch, integral)
+    return None if width is None else width/2
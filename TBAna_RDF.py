@@ -0,0 +1,115 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### RDataFrame backend (implicit MT)    #####
+#############################################
+# The cut and the derived variables, written for pandas/uproot, are translated
+# to C++ and run as one RDataFrame graph with ROOT.EnableImplicitMT, so all the
+# cores work on a single run. The histograms booked on the graph are filled in
+# the same event loop that collects the columns with AsNumpy.
+# The branches read must be doubles (checked with GetColumnType before the
+# expressions are made, other types would not give the same arithmetic as
+# pandas): the C++ expressions keep the python grouping of every operation
+# (fully parenthesised), so the derived columns are the same numbers as with
+# pandas. The events come back from the threads in any order: they are sorted
+# by rdfentry_ (for a TTree, the entry number in the tree, unique), as the
+# dataframes of TBAna_Reader.
+
+import ast
+import numpy as np
+import pandas as pd
+import ROOT
+from TBAna_Reader import treename, GetBranches, AddCutflow
+from TBAna_Cut import IsBoolNode
+
+# threads of the implicit multithreading (0: all the cores)
+nThreads = 0
+
+cppOperators = {ast.Add: "+", ast.Sub: "-", ast.Mult: "*", ast.Div: "/"}
+cppCompare = {ast.Lt: "<", ast.LtE: "<=", ast.Gt: ">", ast.GtE: ">=", ast.Eq: "==", ast.NotEq: "!="}
+cppLogical = {ast.BitAnd: "&&", ast.BitOr: "||", ast.BitXor: "!="}
+# functions allowed in the expressions, as cutFunctions of TBAna_Cut
+cppFunctions = {"abs": "std::abs"}
+# column types the expressions are written for
+cppTypes = ["double", "Double_t"]
+
+
+def CppExpr(expr):
+    # C++ version of a python cut or derived-variable expression for
+    # RDataFrame Filter/Define: "&", "|", "^", "~" of masks become logical
+    # operators, numbers become double literals
+    def Emit(node):
+        if(isinstance(node, ast.BinOp) and type(node.op) in cppLogical):
+            if(not (IsBoolNode(node.left) and IsBoolNode(node.right))):
+                print("Warning: in '{0}' a '&'/'|' is applied to something which is not a comparison, add parentheses".format(expr))
+            left, right = Emit(node.left), Emit(node.right)
+            if(isinstance(node.op, ast.BitXor)):
+                left, right = "bool{0}".format(left), "bool{0}".format(right)
+            return "({0} {1} {2})".format(left, cppLogical[type(node.op)], right)
+        if(isinstance(node, ast.BinOp) and type(node.op) in cppOperators):
+            return "({0} {1} {2})".format(Emit(node.left), cppOperators[type(node.op)], Emit(node.right))
+        if(isinstance(node, ast.BinOp) and isinstance(node.op, ast.Pow)):
+            return "std::pow({0}, {1})".format(Emit(node.left), Emit(node.right))
+        if(isinstance(node, ast.UnaryOp) and isinstance(node.op, ast.Invert)):
+            return "(!{0})".format(Emit(node.operand))
+        if(isinstance(node, ast.UnaryOp) and isinstance(node.op, (ast.USub, ast.UAdd))):
+            return "({0}{1})".format("-" if isinstance(node.op, ast.USub) else "+", Emit(node.operand))
+        if(isinstance(node, ast.Compare)):
+            # a < b < c is (a < b) && (b < c), as in python
+            terms = []; left = Emit(node.left)
+            for op, comparator in zip(node.ops, node.comparators):
+                right = Emit(comparator)
+                terms.append("({0} {1} {2})".format(left, cppCompare[type(op)], right))
+                left = right
+            return terms[0] if len(terms) == 1 else "({0})".format(" && ".join(terms))
+        if(isinstance(node, ast.Call) and isinstance(node.func, ast.Name) and node.func.id in cppFunctions):
+            return "{0}({1})".format(cppFunctions[node.func.id], ", ".join(Emit(arg) for arg in node.args))
+        if(isinstance(node, ast.Name)):
+            return node.id
+        if(isinstance(node, ast.Constant) and isinstance(node.value, (int, float)) and not isinstance(node.value, bool)):
+            return repr(float(node.value))
+        raise ValueError("'{0}' cannot be translated to an RDataFrame expression".format(ast.unparse(node)))
+    return Emit(ast.parse(expr.strip(), mode="eval").body)
+
+
+def EnableMT():
+    # Switch on the implicit multithreading once, before the first RDataFrame
+    if(not ROOT.IsImplicitMTEnabled()):
+        ROOT.EnableImplicitMT(nThreads)
+
+
+def ReadRDF(filename, Cut=None, derived={}, branches=[], hists=[], cutflow=None):
+    # Same dataframe as ReadDF (branches needed by Cut, derived and branches,
+    # then the derived variables, indexed by entry number), from one
+    # multithreaded RDataFrame event loop
+    # hists is a list of (ROOT TH1D, column) filled in the same event loop
+    # If cutflow is a list, the events before and after the cut are added to it
+    EnableMT()
+    rdf = ROOT.RDataFrame(treename, filename)
+    needed = GetBranches([str(name) for name in rdf.GetColumnNames()], Cut, derived, branches)
+    wrongTypes = ["{0} ({1})".format(name, rdf.GetColumnType(name)) for name in needed if str(rdf.GetColumnType(name)) not in cppTypes]
+    if(wrongTypes):
+        raise ValueError("{0}: the RDataFrame backend needs double branches, not {1}; use the pandas backend".format(filename, ", ".join(wrongTypes)))
+    if(Cut):
+        rdf = rdf.Filter(CppExpr(Cut), Cut)
+        report = rdf.Report()
+    for var, expr in derived.items():
+        rdf = rdf.Define(var, CppExpr(expr))
+    # tree entry number of the event, also with the implicit multithreading
+    rdf = rdf.Define("entry", "(Long64_t)rdfentry_")
+    booked = [(hist, rdf.Histo1D(ROOT.RDF.TH1DModel(hist), var)) for hist, var in hists]
+
+    # AsNumpy runs the event loop, filling the booked histograms too
+    columns = rdf.AsNumpy(needed + list(derived) + ["entry"])
+    entries = np.asarray(columns["entry"], dtype=np.int64)
+    order = np.argsort(entries, kind="stable")
+    entries = entries[order]
+    if(len(entries) > 1 and np.any(entries[1:] == entries[:-1])):
+        raise ValueError("{0}: rdfentry_ is not the tree entry number, the events cannot be indexed as in ReadDF".format(filename))
+    data = pd.DataFrame({var: np.asarray(columns[var])[order] for var in needed + list(derived)}, index=entries)
+    for hist, result in booked:
+        hist.Add(result.GetValue())
+    if(Cut):
+        cutInfo = list(report.GetValue())[0]
+        AddCutflow(cutflow, [("all", cutInfo.GetAll()), (Cut, cutInfo.GetPass())])
+    return data
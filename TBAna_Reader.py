@@ -0,0 +1,212 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Shared reader for the Ftree ntuples #####
+#############################################
+# Only the branches a pass actually needs are decompressed: they are worked out
+# from the cut string, the derived-variable definitions and the extra columns
+# requested by the caller.
+
+import re
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pandas as pd
+import uproot
+from TBAna_Store import CacheKey, LoadCache, SaveCache, LoadNpy
+from TBAna_Cut import CompileCut, ApplyCut, IndexEntries
+
+treename = "Ftree"
+
+# read the branches from the memory-mapped .npy store (TBAna_Store) instead of
+# decompressing the ROOT file
+npystore = False
+# with npystore, select the events with the per-run bitset index of TBAna_Cut
+# (each cut term evaluated once per run, no cutflow)
+cutindex = False
+
+# Tower ordering used by the equalisation (inputs_name_S / inputC_name_C),
+# from the top row of the module down to the bottom one, three columns per row
+towerIDs = ['55', '54', '53', '45', '44', '43',
+            '35', '34', '33', '25', '24', '23', '16',
+            '15', '14', '17', '00', '13', '10', '11',
+            '12', '20', '21', '22', '30', '31', '32',
+            '40', '41', '42', '50', '51', '52', '60',
+            '61', '62']
+towerBranchesS = ["TS" + tow for tow in towerIDs]
+towerBranchesC = ["TC" + tow for tow in towerIDs]
+
+# any python identifier appearing in a cut or in a derived-variable expression
+identifier = re.compile(r"[A-Za-z_][A-Za-z0-9_]*")
+
+
+def GetBranches(keys, Cut="", derived={}, branches=[]):
+    # Return, in order of appearance, the branches of the tree (keys) used by the
+    # cut, by the derived variables and by the requested columns
+    # Names which are not branches (abs, derived columns, constants) are dropped
+    keys = set(keys)
+    expressions = [Cut or ""] + list(derived.values()) + list(branches)
+    needed = []
+    for expr in expressions:
+        for name in identifier.findall(expr):
+            if name in keys and name not in needed:
+                needed.append(name)
+    return needed
+
+
+def AddDerivedVars(data, derived):
+    # Evaluate the derived-variable definitions on the dataframe, in order,
+    # so that a definition can use a variable defined before it
+    # (python engine: same floating point results as plain pandas arithmetic)
+    for var, expr in derived.items():
+        data[var] = data.eval(expr, engine="python")
+    return data
+
+
+def CutEntries(Cut, keys, GetBranch, nEntries, cutflow=None):
+    # Entry numbers passing Cut (all of them without a cut), evaluated with the
+    # compiled cut of TBAna_Cut; GetBranch(name) returns the array of a branch
+    # If cutflow is a list, the cutflow rows are added to it (summed with the
+    # rows already there, e.g. over chunks or runs)
+    if(not Cut):
+        return np.arange(nEntries)
+    entries, flow = ApplyCut(CompileCut(Cut, keys), GetBranch, nEntries)
+    AddCutflow(cutflow, flow)
+    return entries
+
+
+def AddCutflow(cutflow, flow):
+    # Add the rows of flow to the cutflow list (if it is one), summing the
+    # events of the rows already there
+    if(cutflow is not None and len(cutflow) == len(flow)):
+        cutflow[:] = [(term, events + newEvents) for (term, events), (newTerm, newEvents) in zip(cutflow, flow)]
+    elif(cutflow is not None):
+        cutflow.extend(flow)
+
+
+def ReadDF(filename, Cut=None, derived={}, branches=[], cache=True, cutflow=None):
+    # Read only the branches needed by Cut, derived and branches, apply the cut
+    # and add the derived variables
+    # With cache, the selected events are taken from (or saved to) the Parquet
+    # cache of TBAna_Store, so the ROOT file is only decompressed once
+    # (cached events have no cutflow)
+    # Runs announced with PrefetchDF are taken from the background reads
+    call = PrefetchKey(filename, Cut, derived, branches, cache)
+    if(call in prefetched):
+        data, flow = prefetched.pop(call).result()
+        prefetchSizes.append(data.memory_usage(index=True).sum())
+        SchedulePrefetch()
+        AddCutflow(cutflow, flow)
+        return data
+    # an announced run asked for before its read started is read here, and not
+    # again in the background
+    prefetchCalls[:] = [announced for announced in prefetchCalls if PrefetchKey(*announced) != call]
+    return ReadRun(filename, Cut, derived, branches, cache, cutflow)
+
+
+def ReadRun(filename, Cut=None, derived={}, branches=[], cache=True, cutflow=None):
+    # ReadDF without the prefetching
+    key = CacheKey(filename, Cut, list(derived.values()) + list(branches))
+    data = LoadCache(filename, key) if cache else None
+    if(data is None and npystore):
+        # indexed by entry number, as the dataframes from uproot
+        entries, arrays = SelectNpy(filename, Cut, derived, branches, cutflow)
+        data = pd.DataFrame(arrays, index=entries)
+    elif(data is None):
+        root_file = uproot.open(filename)
+        tree = root_file[treename]
+        needed = GetBranches(tree.keys(), Cut, derived, branches)
+        # each branch is decompressed once, by the cut or for the dataframe
+        columns = {}
+        def GetBranch(name):
+            if(name not in columns):
+                columns[name] = tree[name].array(library="np")
+            return columns[name]
+        entries = CutEntries(Cut, tree.keys(), GetBranch, tree.num_entries, cutflow)
+        data = pd.DataFrame({branch: GetBranch(branch)[entries] for branch in needed}, index=entries)
+        if(cache):
+            SaveCache(filename, key, data)
+    return AddDerivedVars(data, derived)
+
+
+def IterateDF(filename, Cut=None, derived={}, branches=[], step_size="100 MB", cutflow=None):
+    # Same as ReadDF, but yield the selected events in chunks of step_size
+    # (number of entries or memory size, as in uproot.iterate) so that a run
+    # never has to fit in memory at once
+    root_file = uproot.open(filename)
+    tree = root_file[treename]
+    needed = GetBranches(tree.keys(), Cut, derived, branches)
+    for arrays, report in tree.iterate(needed, step_size=step_size, library="np", report=True):
+        nEntries = report.tree_entry_stop - report.tree_entry_start
+        entries = CutEntries(Cut, needed, arrays.__getitem__, nEntries, cutflow)
+        data = pd.DataFrame({branch: arrays[branch][entries] for branch in needed}, index=entries + report.tree_entry_start)
+        yield AddDerivedVars(data, derived)
+
+
+def SelectNpy(filename, Cut=None, derived={}, branches=[], cutflow=None):
+    # Entry numbers passing Cut and {branch: array} of the selected events for
+    # the branches used by Cut, derived and branches, from the .npy store
+    # Without a cut the arrays are read-only views of the store (no copy),
+    # with a cut only the selected events are copied
+    arrays = LoadNpy(filename)
+    needed = GetBranches(arrays.keys(), Cut, derived, branches)
+    nEntries = len(arrays[needed[0]])
+    if(not Cut):
+        return np.arange(nEntries), {branch: arrays[branch] for branch in needed}
+    if(cutindex):
+        entries = IndexEntries(filename, Cut)
+    else:
+        entries = CutEntries(Cut, arrays.keys(), arrays.__getitem__, nEntries, cutflow)
+    return entries, {branch: arrays[branch][entries] for branch in needed}
+
+
+def ReadNpy(filename, Cut=None, derived={}, branches=[], cutflow=None):
+    # Same selection as ReadDF, as {branch: array} from the memory-mapped .npy
+    # store (derived variables are not added)
+    entries, arrays = SelectNpy(filename, Cut, derived, branches, cutflow)
+    return arrays
+
+
+# Background prefetching: while a run is analysed, the next prefetchDepth runs
+# announced with PrefetchDF are read on background threads (uproot and numpy
+# release the GIL while decompressing). A new read is only started if the runs
+# held in memory, estimated from the largest run read so far, stay below
+# prefetchMemory bytes. ReadDF returns the runs in the order they are asked for.
+prefetchDepth = 1
+prefetchMemory = 4 * 1024**3
+
+prefetchCalls = []      # announced reads not started yet, in order
+prefetched = {}         # started reads, by PrefetchKey
+prefetchSizes = []      # memory of the runs read so far
+prefetchPool = None
+
+
+def PrefetchKey(filename, Cut, derived, branches, cache=True):
+    return (filename, Cut, tuple(derived.items()), tuple(branches), cache)
+
+
+def ReadWithCutflow(filename, Cut, derived, branches, cache):
+    flow = []
+    data = ReadRun(filename, Cut, derived, branches, cache, flow)
+    return data, flow
+
+
+def SchedulePrefetch():
+    # Start the next announced reads, within prefetchDepth and prefetchMemory
+    global prefetchPool
+    if(prefetchPool is None):
+        prefetchPool = ThreadPoolExecutor(max_workers=max(prefetchDepth, 1))
+    while(prefetchCalls and len(prefetched) < prefetchDepth):
+        runSize = max(prefetchSizes, default=0)
+        # the run being analysed, the ones already read ahead and the new one
+        if(prefetched and (len(prefetched) + 2) * runSize > prefetchMemory):
+            break
+        filename, Cut, derived, branches, cache = prefetchCalls.pop(0)
+        call = PrefetchKey(filename, Cut, derived, branches, cache)
+        prefetched[call] = prefetchPool.submit(ReadWithCutflow, filename, Cut, derived, branches, cache)
+
+
+def PrefetchDF(calls, cache=True):
+    # Announce the ReadDF calls of a scan, as a list of
+    # (filename, Cut, derived, branches), in the order they will be made
+    prefetchCalls.extend((filename, Cut, derived, branches, cache) for filename, Cut, derived, branches in calls)
+    SchedulePrefetch()
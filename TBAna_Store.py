@@ -0,0 +1,112 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### On-disk stores of the Ftree events  #####
+#############################################
+# The post-cut events of a run are stored as Parquet files in cachefolder, one
+# file per (ntuple path, ntuple mtime, cut, requested columns). Re-running a
+# script on unchanged inputs then reads the Parquet file instead of
+# decompressing the ROOT baskets again. Changing the ntuple (mtime/size), the
+# cut or the columns gives a new key, so stale entries are never used.
+
+import os
+import shutil
+import hashlib
+import numpy as np
+import pandas as pd
+import uproot
+
+cachefolder = "/home/storage/data_apareti/TB24/FtreeCache/"
+
+
+def CacheKey(filename, Cut, expressions):
+    # Hash of everything the cached events depend on
+    stat = os.stat(filename)
+    key = "|".join([os.path.abspath(filename), str(stat.st_mtime_ns), str(stat.st_size), Cut or ""] + list(expressions))
+    return hashlib.sha1(key.encode()).hexdigest()
+
+
+def CacheFile(filename, key):
+    # e.g. physics_sps2024_run0786_<key>.parquet
+    run = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(cachefolder, "{0}_{1}.parquet".format(run, key[:16]))
+
+
+def LoadCache(filename, key):
+    # Return the cached events, or None if they are not in the cache
+    if(cachefolder is None):
+        return None
+    path = CacheFile(filename, key)
+    if(not os.path.exists(path)):
+        return None
+    print("Reading cached events: ", path)
+    return pd.read_parquet(path)
+
+
+def SaveCache(filename, key, data):
+    # Write to a temporary file first, so that an interrupted job (or two jobs
+    # on the same run) never leave a truncated cache file behind
+    if(cachefolder is None):
+        return
+    os.makedirs(cachefolder, exist_ok=True)
+    path = CacheFile(filename, key)
+    tmp = "{0}.{1}.tmp".format(path, os.getpid())
+    # the index (entry numbers of the selected events) is stored too
+    data.to_parquet(tmp)
+    os.replace(tmp, path)
+
+
+# Memory-mapped store: each flat branch of a run is exported once to
+# npyfolder/<run>/<branch>.npy and then opened with np.load(mmap_mode="r"),
+# so loading a run costs no decompression and no copy, and processes working
+# on the same run share the pages through the OS page cache
+npyfolder = "/home/storage/data_apareti/TB24/FtreeNpy/"
+
+
+def NpyFolder(filename):
+    run = os.path.splitext(os.path.basename(filename))[0]
+    return os.path.join(npyfolder, run)
+
+
+def NpyStamp(filename):
+    # mtime and size of the ntuple the store was exported from
+    stat = os.stat(filename)
+    return "{0} {1}".format(stat.st_mtime_ns, stat.st_size)
+
+
+def ExportNpy(filename, treename="Ftree"):
+    # Write every flat (one number per event) branch of the run to its .npy
+    # file; the stamp is written last, so a partial export is never used
+    # Each file is written under a temporary name and renamed, so processes
+    # still mapping the old version of a branch keep valid pages
+    folder = NpyFolder(filename)
+    stampfile = os.path.join(folder, "stamp.txt")
+    os.makedirs(folder, exist_ok=True)
+    if(os.path.exists(stampfile)):
+        os.remove(stampfile)
+    # selection bitsets of the previous version of the run (TBAna_Cut)
+    shutil.rmtree(os.path.join(folder, "cuts"), ignore_errors=True)
+    tree = uproot.open(filename)[treename]
+    print("Exporting to .npy store: ", folder)
+    for branch in tree.keys():
+        array = tree[branch].array(library="np")
+        if(array.dtype == object or array.ndim != 1):
+            continue
+        tmp = os.path.join(folder, "{0}.{1}.tmp.npy".format(branch, os.getpid()))
+        np.save(tmp, array)
+        os.replace(tmp, os.path.join(folder, branch + ".npy"))
+    with open(stampfile, "w") as stamp:
+        stamp.write(NpyStamp(filename))
+
+
+def LoadNpy(filename, branches=None):
+    # Return {branch: read-only memory-mapped array} for the run, exporting it
+    # first if the store is missing or older than the ntuple
+    # branches=None loads every branch in the store
+    folder = NpyFolder(filename)
+    stampfile = os.path.join(folder, "stamp.txt")
+    if(not os.path.exists(stampfile) or open(stampfile).read() != NpyStamp(filename)):
+        ExportNpy(filename)
+    if(branches is None):
+        branches = [f[:-4] for f in sorted(os.listdir(folder)) if f.endswith(".npy") and not f.endswith(".tmp.npy")]
+    return {branch: np.load(os.path.join(folder, branch + ".npy"), mmap_mode="r") for branch in branches}
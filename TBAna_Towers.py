@@ -0,0 +1,41 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### float32 matrix of tower energies    #####
+#############################################
+# The 36 S and 36 C tower energies of a run are kept in one contiguous float32
+# array, matrix[channel, event, tower], channel 0 = S and 1 = C, towers in the
+# order of inputs_name_S (towerIDs of TBAna_Reader). Each channel is then a
+# contiguous (events x 36) block, ready for the calibration dot products, and
+# takes half the memory of the float64 dataframe columns.
+
+import numpy as np
+from TBAna_Reader import towerIDs
+
+# position of each tower in the matrix, e.g. towerIndex["24"]
+towerIndex = {tow: index for index, tow in enumerate(towerIDs)}
+
+
+def TowerMatrix(data):
+    # Build the matrix from the TSxx/TCxx columns of a dataframe
+    matrix = np.empty((2, len(data), len(towerIDs)), dtype=np.float32)
+    for index, tow in enumerate(towerIDs):
+        matrix[0, :, index] = data["TS" + tow].to_numpy()
+        matrix[1, :, index] = data["TC" + tow].to_numpy()
+    return matrix
+
+
+def TowersS(matrix):
+    # (events x 36) S energies, view of the matrix
+    return matrix[0]
+
+
+def TowersC(matrix):
+    # (events x 36) C energies, view of the matrix
+    return matrix[1]
+
+
+def Tower(matrix, name):
+    # Energies of one tower channel, e.g. "TS24" or "TC00", view of the matrix
+    channel = 0 if name.startswith("TS") else 1
+    return matrix[channel, :, towerIndex[name[2:]]]
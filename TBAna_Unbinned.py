@@ -0,0 +1,205 @@
+#############################################
+### Analysis script for 2024 Test Beam  #####
+### of the dual-readout prototype DRAGO #####
+### Unbinned energy-peak fits           #####
+#############################################
+# Maximum-likelihood fits of the energy peak on the event energies, without
+# filling a histogram: a gaussian (or a Crystal Ball, gaussian core with a
+# power-law low tail) truncated to the fit window [xmin, xmax], normalised in
+# the window, as the binned fit in [mu - low*sigma, mu + high*sigma].
+# The values are sorted once, with the cumulative sums of x and x^2: the
+# events in a window and their sums are found with two binary searches, so the
+# gaussian likelihood and its gradient cost the same for 1e3 or 1e7 events
+# (sufficient statistics n, sum(x), sum(x^2)). The Crystal Ball likelihood
+# uses the sums for the gaussian core and loops only on the tail events.
+# The negative log-likelihood is minimised with analytic gradients; the errors
+# come from the inverse of the hessian (differences of the analytic gradient).
+
+import numpy as np
+from scipy import optimize, special
+
+sqrt2pi = np.sqrt(2*np.pi)
+
+
+def SortedSums(values):
+    # Sorted finite values and the cumulative sums of (x-shift), (x-shift)^2,
+    # with shift the median (no cancellation in the sums)
+    x = np.sort(np.asarray(values, dtype=np.float64)[np.isfinite(values)])
+    shift = x[len(x)//2] if len(x) else 0.
+    y = x - shift
+    return {"x": x, "shift": shift,
+            "s1": np.concatenate(([0.], np.cumsum(y))), "s2": np.concatenate(([0.], np.cumsum(y*y)))}
+
+
+def WindowSums(sums, xmin, xmax):
+    # Values in [xmin, xmax]: first and last+1 index, number and sums of
+    # (x-shift), (x-shift)^2
+    first = np.searchsorted(sums["x"], xmin, side="left")
+    last = np.searchsorted(sums["x"], xmax, side="right")
+    return {"xmin": xmin, "xmax": xmax, "first": first, "last": last, "n": last-first,
+            "s1": sums["s1"][last]-sums["s1"][first], "s2": sums["s2"][last]-sums["s2"][first]}
+
+
+def Phi(z):
+    return 0.5*special.erfc(-z/np.sqrt(2))
+
+
+def ZTimes(f, z):
+    # f(z)*z, 0 at infinite z (f(z) goes to 0 faster)
+    return f*z if np.isfinite(z) else 0.
+
+
+def GausNLL(p, sums, window):
+    # Negative log-likelihood of the gaussian (mu, sigma) truncated to the
+    # window, and its gradient
+    mu, sigma = p
+    n, s1, s2 = window["n"], window["s1"], window["s2"]
+    m = mu - sums["shift"]
+    # sum(z), sum(z^2) of the events in the window
+    sz = (s1 - n*m)/sigma
+    szz = (s2 - 2*m*s1 + n*m*m)/sigma**2
+    za, zb = (window["xmin"] - mu)/sigma, (window["xmax"] - mu)/sigma
+    norm = Phi(zb) - Phi(za)
+    fa, fb = np.exp(-0.5*za*za)/sqrt2pi, np.exp(-0.5*zb*zb)/sqrt2pi
+    nll = 0.5*szz + n*np.log(sigma) + n*np.log(norm)
+    dmu = -(sz + n*(fb - fa)/norm)/sigma
+    dsigma = (-szz + n + n*(ZTimes(fa, za) - ZTimes(fb, zb))/norm)/sigma
+    return nll, np.array([dmu, dsigma])
+
+
+def CrystalBall(z, alpha, n):
+    # Crystal Ball shape (1 at z = 0) with the power-law tail below -alpha
+    A = (n/alpha)**n*np.exp(-0.5*alpha*alpha); B = n/alpha - alpha
+    z = np.asarray(z, dtype=np.float64)
+    return np.where(z > -alpha, np.exp(-0.5*z*z), A*np.abs(B - np.minimum(z, -alpha))**(-n))
+
+
+def CrystalBallIntegral(za, zb, alpha, n):
+    # Integral of CrystalBall from za to zb and its derivatives in alpha and n
+    logA = n*np.log(n/alpha) - 0.5*alpha*alpha; A = np.exp(logA); B = n/alpha - alpha
+    integral = 0.; dalpha = 0.; dn = 0.
+    if(zb > -alpha):
+        integral += sqrt2pi*(Phi(zb) - Phi(max(za, -alpha)))
+    if(za < -alpha):
+        # the moving boundary -alpha gives opposite terms in the core and the
+        # tail (continuous shape), only the tail shape depends on alpha and n
+        t = min(zb, -alpha)
+        gt, ga = (B - t)**(1-n), ((B - za)**(1-n) if np.isfinite(za) else 0.)
+        tail = A/(n-1)*(gt - ga)
+        integral += tail
+        dalpha = tail*(-n/alpha - alpha) - A*(-n/alpha**2 - 1)*((B - t)**(-n) - ((B - za)**(-n) if np.isfinite(za) else 0.))
+        dgt = gt*(-np.log(B - t) + (1-n)/(alpha*(B - t)))
+        dga = ga*(-np.log(B - za) + (1-n)/(alpha*(B - za))) if np.isfinite(za) else 0.
+        dn = tail*(np.log(n/alpha) + 1 - 1/(n-1)) + A/(n-1)*(dgt - dga)
+    return integral, dalpha, dn
+
+
+def CrystalBallNLL(p, sums, window):
+    # Negative log-likelihood of the Crystal Ball (mu, sigma, alpha, n)
+    # truncated to the window, and its gradient
+    mu, sigma, alpha, n = p
+    first, last, N = window["first"], window["last"], window["n"]
+    # tail events: x <= mu - alpha*sigma, the first ones of the window
+    split = min(max(np.searchsorted(sums["x"], mu - alpha*sigma, side="right"), first), last)
+    zTail = (sums["x"][first:split] - mu)/sigma
+    nCore = last - split
+    m = mu - sums["shift"]
+    c1 = sums["s1"][last] - sums["s1"][split]; c2 = sums["s2"][last] - sums["s2"][split]
+    szCore = (c1 - nCore*m)/sigma
+    szzCore = (c2 - 2*m*c1 + nCore*m*m)/sigma**2
+    # -log of the shape: z^2/2 in the core, -log(A) + n*log(B-z) in the tail
+    logA = n*np.log(n/alpha) - 0.5*alpha*alpha; B = n/alpha - alpha
+    logBz = np.log(B - zTail)
+    h = 0.5*szzCore + len(zTail)*(-logA) + n*logBz.sum()
+    # dh/dz = z (core), -n/(B-z) (tail)
+    dhdz = szCore - n*np.sum(1/(B - zTail))
+    zdhdz = szzCore - n*np.sum(zTail/(B - zTail))
+    dhdalpha = len(zTail)*(n/alpha + alpha) + n*(-n/alpha**2 - 1)*np.sum(1/(B - zTail))
+    dhdn = -len(zTail)*(np.log(n/alpha) + 1) + logBz.sum() + n/alpha*np.sum(1/(B - zTail))
+
+    za, zb = (window["xmin"] - mu)/sigma, (window["xmax"] - mu)/sigma
+    norm, dnormdalpha, dnormdn = CrystalBallIntegral(za, zb, alpha, n)
+    fa, fb = CrystalBall(za, alpha, n), CrystalBall(zb, alpha, n)
+    nll = h + N*np.log(sigma) + N*np.log(norm)
+    dmu = -(dhdz + N*(fb - fa)/norm)/sigma
+    dsigma = (-zdhdz + N + N*(ZTimes(fa, za) - ZTimes(fb, zb))/norm)/sigma
+    dalpha = dhdalpha + N*dnormdalpha/norm
+    dn = dhdn + N*dnormdn/norm
+    return nll, np.array([dmu, dsigma, dalpha, dn])
+
+
+def Hessian(gradient, p):
+    # Hessian from central differences of the analytic gradient
+    p = np.asarray(p, dtype=np.float64)
+    H = np.zeros((len(p), len(p)))
+    for i in range(len(p)):
+        h = 1e-5*max(abs(p[i]), 1e-3)
+        up = p.copy(); up[i] += h
+        down = p.copy(); down[i] -= h
+        H[:, i] = (gradient(up) - gradient(down))/(2*h)
+    return 0.5*(H + H.T)
+
+
+def MinimiseNLL(nll, p0, bounds):
+    # Minimum of nll (returning value and gradient), errors from the hessian
+    result = optimize.minimize(nll, p0, jac=True, method="L-BFGS-B", bounds=bounds,
+                               options={"ftol": 1e-14, "gtol": 1e-8, "maxiter": 1000})
+    try:
+        cov = np.linalg.inv(Hessian(lambda p: nll(p)[1], result.x))
+        errors = np.sqrt(np.abs(np.diag(cov)))
+    except np.linalg.LinAlgError:
+        errors = np.full(len(result.x), np.nan)
+    return result.x, errors, result.fun
+
+
+def StartValues(sums):
+    # Median and IQR/1.349 of the values
+    x = sums["x"]
+    q1, q2, q3 = np.percentile(x, [25, 50, 75])
+    return q2, max((q3 - q1)/1.349, 1e-9)
+
+
+def UnbinnedGausFit(values, windows=[(1.5, 1.5)]*3, fitRange=None):
+    # Gaussian fit of the values (array), starting from the median and the
+    # IQR, then refitted in [mean - low*sigma, mean + high*sigma] for each
+    # (low, high) of windows
+    # fitRange (xmin, xmax): first fit in this range before the windows, as
+    # the first fit of a binned fit over the histogram range (TBAna_Fit)
+    # Return a dict: mean, sigma, their errors (...Err), nll, the events and
+    # the range of the last fit
+    sums = SortedSums(values)
+    mu, sigma = StartValues(sums)
+    result = {"mean": mu, "sigma": sigma, "meanErr": np.nan, "sigmaErr": np.nan, "nll": np.nan, "events": 0, "xmin": -np.inf, "xmax": np.inf}
+    # fitRange first (fixed range), then the windows around the previous fit
+    steps = ([("range", fitRange)] if fitRange is not None else []) + [("window", window) for window in windows]
+    for kind, (low, high) in steps:
+        if(kind == "range"):
+            window = WindowSums(sums, low, high)
+        else:
+            window = WindowSums(sums, mu - low*sigma, mu + high*sigma)
+        if(window["n"] < 3):
+            break
+        (mu, sigma), errors, nll = MinimiseNLL(lambda p: GausNLL(p, sums, window), [mu, sigma], [(None, None), (1e-9, None)])
+        result = {"mean": mu, "sigma": sigma, "meanErr": errors[0], "sigmaErr": errors[1], "nll": nll,
+                  "events": window["n"], "xmin": window["xmin"], "xmax": window["xmax"]}
+    return result
+
+
+def UnbinnedCrystalBallFit(values, windows=[(3., 1.5)]*3, alpha=1.5, n=5.):
+    # Crystal Ball fit of the values, in the windows as UnbinnedGausFit
+    # (a wider low side for the tail), starting from the gaussian fit of the
+    # core and the tail parameters alpha, n
+    # Return the dict of UnbinnedGausFit, with alpha, n and their errors
+    sums = SortedSums(values)
+    gaus = UnbinnedGausFit(values)
+    mu, sigma = gaus["mean"], gaus["sigma"]
+    result = dict(gaus, alpha=np.nan, n=np.nan, alphaErr=np.nan, nErr=np.nan)
+    for low, high in windows:
+        window = WindowSums(sums, mu - low*sigma, mu + high*sigma)
+        if(window["n"] < 5):
+            break
+        (mu, sigma, alpha, n), errors, nll = MinimiseNLL(lambda p: CrystalBallNLL(p, sums, window), [mu, sigma, alpha, n],
+                                                         [(None, None), (1e-9, None), (1e-3, None), (1.001, 1e3)])
+        result = {"mean": mu, "sigma": sigma, "alpha": alpha, "n": n, "meanErr": errors[0], "sigmaErr": errors[1],
+                  "alphaErr": errors[2], "nErr": errors[3], "nll": nll, "events": window["n"], "xmin": window["xmin"], "xmax": window["xmax"]}
+    return result
@@ -2,19 +2,36 @@ import pandas as pd
 import numpy as np
 import ROOT 
 import uproot
+from TBAna_Reader import ReadDF, PrefetchDF
+from TBAna_Noise import GetPMTnoise
+from TBAna_Hist import FillROOT
+from TBAna_Fit import FitGaus, FitPoly, AttachStoredPoly
+from TBAna_Func import PolyFunction, PolyFromTF1
+from TBAna_ParStore import ParKey, LoadPars, SavePars
 from xgboost import XGBClassifier
 import torch
 
 #infolder = "/home/storage/data_apareti/TB24/PionScan_OldHVsaturated/"
 infolder = "/home/storage/data_apareti/TB24/PionEnergyScan/"
 #infolder = "/home/storage/data_apareti/TB24/PionScanCorrected/pion24/"
-pedfolder = "/home/storage/data_apareti/TB24/PedestalRuns/"
 treename = "Ftree"
 chi_value = 0.35
 #chi_value = 0.75
 
 containment = 0.875
 
+# Asymmetry and TDC corrections of the loop. They are also the settings in the
+# key of the stored parametrisations (TBAna_ParStore), so a change here gives a
+# new version
+# asymmetry profiles, polynomial degree and fit range
+asymProfBins = (100, -1, 1)
+asymFitDegree = 5; asymFitRange = (-0.9, 0.9)
+# TDC selection: TDC_TS11 and TDC_TC11 inside these ranges
+tdcRangeS11 = (645, 670); tdcRangeC11 = (630, 650)
+# TDC profiles, polynomial degree and fit ranges over TDC_TS11 and TDC_TC11
+tdcProfBins = (100, 600, 720)
+tdcFitDegree = 1; tdcFitRangeS = (620, 675); tdcFitRangeC = (620, 670)
+
 
 # Mean Z barycenter for electromagnetic showers at 40 GeV
 meanZbarS_ele = 227.718  # in mm
@@ -35,58 +52,30 @@ att_length_C = 4000.
 S_attenuation_correction = (ROOT.TMath.Exp(-(2500-meanZbarS_had)/att_length_S) ) / (ROOT.TMath.Exp(-(2500-meanZbarS_ele)/att_length_S) );
 C_attenuation_correction = (ROOT.TMath.Exp(-(2500-meanZbarC_had)/att_length_C) ) / (ROOT.TMath.Exp(-(2500-meanZbarC_ele)/att_length_C) );
 
+# Variables derived from the Ftree branches in GetDFparametrization
+derivedVars = {
+    # define Asymmetry variable
+    "AsymS" : "(TS24 - TS21) / (TS24 + TS21)",
+    "AsymC" : "(TC24 - TC21) / (TC24 + TC21)",
+    # define partial barycenter variable
+    "BaryS" : "(TS00 - 28.3*TS11 + 28.3*TS15) / (TS00 + TS11 + TS15)",
+    "BaryC" : "(TC00 - 28.3*TC11 + 28.3*TC15) / (TC00 + TC11 + TC15)",
+    # dual-readout energy
+    "totDRene" : "(totPMTSene - {0}*totPMTCene) / (1 - {0})".format(chi_value)
+}
 
-
-
-def GetPMTnoise():
-    print("\n... Calculating PMT noise")
-
-    PedestalRuns = ["0771", "0777", "0780", "0781", "0784", "0796"]
-
-    PmtNoiseHistS = ROOT.TH1D("PmtNoiseHistS", "PmtNoiseHistS", 100, -5., 5.)
-    PmtNoiseHistC = ROOT.TH1D("PmtNoiseHistC", "PmtNoiseHistC", 100, -5., 5.)
-
-    for index, run in enumerate(PedestalRuns):
-        filename = "physics_sps2024_run" + run + ".root"
-
-        root_file = uproot.open(pedfolder+filename)
-        tree = root_file[treename]
-        data = tree.arrays(library="pd")    
-
-        print(filename, data)
-        for pmtS, pmtC in zip(data["totPMTSene"], data["totPMTCene"]):
-            PmtNoiseHistS.Fill(pmtS)
-            PmtNoiseHistC.Fill(pmtC)
-
-    cNoise = ROOT.TCanvas("cNoise", "cNoise", 1400, 1200)
-    PmtNoiseHistS.SetLineColor(ROOT.kRed); PmtNoiseHistS.SetLineWidth(2);  PmtNoiseHistS.Draw()      
-    PmtNoiseHistC.SetLineColor(ROOT.kBlue); PmtNoiseHistC.SetLineWidth(2);  PmtNoiseHistC.Draw("same")
-
-    PmtNoiseHistS.Fit("gaus"); PmtNoiseHistC.Fit("gaus")
-    RmsNoiseS = PmtNoiseHistS.GetFunction("gaus").GetParameter(2)
-    RmsNoiseC = PmtNoiseHistC.GetFunction("gaus").GetParameter(2)
-    print("rms S: ", RmsNoiseS, "\trms C: ", RmsNoiseC)
-
-    cNoise.Draw()
-    cNoise.SaveAs("Noise.png")
-    return(RmsNoiseS, RmsNoiseC)
+# Other branches used after GetDFparametrization (timing cleanup and profiles)
+readBranches = ["totPMTSene", "totPMTCene", "TDC_TS11", "TDC_TC11"]
 
 
 
 
-def GetDFparametrization(run, Cut, filename, energy): 
+def GetDFparametrization(run, Cut, filename, energy, stored=None): 
+    # stored: the four asymmetry polynomials (TBAna_Func) of the
+    # parametrisation store, attached to the profiles instead of refitting them
     print("Using file: ", filename, energy)
-    root_file = uproot.open(infolder+filename)
-    tree = root_file[treename]
-    data = tree.arrays(cut=Cut, library="pd")
-
-    # define Asymmetry variable 
-    data["AsymS"] = (data["TS24"] - data["TS21"]) / (data["TS24"] + data["TS21"] )
-    data["AsymC"] = (data["TC24"] - data["TC21"]) / (data["TC24"] + data["TC21"] )
-
-    # define partial barycenter variable 
-    data["BaryS"] = (data["TS00"]-28.3*data["TS11"]+28.3*data["TS15"])/(data["TS00"]+data["TS11"]+data["TS15"])
-    data["BaryC"] = (data["TC00"]-28.3*data["TC11"]+28.3*data["TC15"])/(data["TC00"]+data["TC11"]+data["TC15"])
+    # read only the branches used by the cut, the derived variables and main()
+    data = ReadDF(infolder+filename, Cut, derivedVars, readBranches)
 
     data["pmtS_cont"] = data["totPMTSene"]/containment
     data["pmtC_cont"] = data["totPMTCene"]/containment
@@ -94,7 +83,6 @@ def GetDFparametrization(run, Cut, filename, energy):
     data["pmtS_cont_att"] = data["totPMTSene"]/containment/S_attenuation_correction
     data["pmtC_cont_att"] = data["totPMTCene"]/containment/C_attenuation_correction
 
-    data["totDRene"] = (data["totPMTSene"]-chi_value*data["totPMTCene"]) / (1-chi_value)
     data["totDRene_cont"] = data["totDRene"]/containment
     data["totDRene_cont_att"] = (data["totPMTSene"]/S_attenuation_correction-chi_value*data["totPMTCene"]/C_attenuation_correction) / (1-chi_value) / containment
 
@@ -108,12 +96,12 @@ def GetDFparametrization(run, Cut, filename, energy):
 
 
     # Profile normalised energy Vs Asymmetry
-    DReneAsymSprof = ROOT.TProfile("DReneAsymSprof_{0}GeV".format(energy), r" DR Energy profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; E_DR/E".format(energy), 100, -1, 1)
-    DReneAsymCprof = ROOT.TProfile("DReneAsymCprof_{0}GeV".format(energy), r"DR Energy profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; E_DR/E".format(energy), 100, -1, 1)
+    DReneAsymSprof = ROOT.TProfile("DReneAsymSprof_{0}GeV".format(energy), r" DR Energy profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; E_DR/E".format(energy), *asymProfBins)
+    DReneAsymCprof = ROOT.TProfile("DReneAsymCprof_{0}GeV".format(energy), r"DR Energy profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; E_DR/E".format(energy), *asymProfBins)
 
     # Profile normalised energy Vs Asymmetry
-    SciAsymprof = ROOT.TProfile("sciprof_{0}GeV".format(energy), "totPMTSene profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; totPMTSene/E".format(energy), 100, -1, 1)
-    CerAsymprof = ROOT.TProfile("cerprof_{0}GeV".format(energy), "totPMTCene profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; totPMTCene/E".format(energy), 100, -1, 1)
+    SciAsymprof = ROOT.TProfile("sciprof_{0}GeV".format(energy), "totPMTSene profile over Asymmetry(S) {0}GeV; TS24-TS21 / TS24 + TS21; totPMTSene/E".format(energy), *asymProfBins)
+    CerAsymprof = ROOT.TProfile("cerprof_{0}GeV".format(energy), "totPMTCene profile over Asymmetry(C) {0}GeV; TC24-TC21 / TC24 + TC21; totPMTCene/E".format(energy), *asymProfBins)
 
     # profile energy over TS11 or TC11 TDC information
     #DReneStdcProf = ROOT.TProfile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), 100, 600, 720)
@@ -127,26 +115,11 @@ def GetDFparametrization(run, Cut, filename, energy):
 
     # Fill profiles
     #for DRene, asymS,  asymC, tdcS, tdcC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values, data["TDC_TS11"].values, data["TDC_TC11"].values):
-    for DRene, asymS,  asymC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values):
-        #if(asymS < 0.9 and asymS > -0.9 and asymC < 0.9 and asymC > -0.9):
-        DReneAsymSprof.Fill(asymS, DRene/energy)
-        DReneAsymCprof.Fill(asymC, DRene/energy)
-        #if(tdcS > 512):
-        #    DReneStdcProf.Fill(tdcS, DRene)
-        #if(tdcC>512):
-        #    DReneCtdcProf.Fill(tdcC, DRene)
-
-    #for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        #if(asymS < 0.9 and asymS > -0.9 and asymC < 0.9 and asymC > -0.9):
-        #SciAsymHist.Fill(asymS, pmtS)
-        #CerAsymHist.Fill(asymC, pmtC)
-        SciAsymprof.Fill(asymS, pmtS/energy)
-        CerAsymprof.Fill(asymC, pmtC/energy)
-        #if(tdcS > 512):
-        #    ScieneStdcProf.Fill(tdcS, pmtS/energy)
-        #if(tdcC>512):
-        #    CereneCtdcProf.Fill(tdcC, pmtC/energy)
+    FillROOT(DReneAsymSprof, data["AsymS"].values, data["totDRene_cont"].values/energy)
+    FillROOT(DReneAsymCprof, data["AsymC"].values, data["totDRene_cont"].values/energy)
+
+    FillROOT(SciAsymprof, data["AsymS"].values, data["pmtS_cont"].values/energy)
+    FillROOT(CerAsymprof, data["AsymC"].values, data["pmtC_cont"].values/energy)
 
     # Drawing colz plots
     #cSciAsym = ROOT.TCanvas("cSciAsym{}".format(energy), "cSciAsymS{}".format(energy), 1400, 1200)
@@ -157,16 +130,17 @@ def GetDFparametrization(run, Cut, filename, energy):
     #cCerAsym.SaveAs("CervsAysm{0}GeV.png".format(energy))  
 
 
-    # Fit asymmetry with 5 degree polynomial
-    DReneAsymSprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    DReneAsymCprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    SciAsymprof.Fit("pol5", "Q", "", -0.9, 0.9)
-    CerAsymprof.Fit("pol5", "Q", "", -0.9, 0.9) 
+    if(stored is None):
+        # Fit asymmetry with 5 degree polynomial (all the profiles at once)
+        FitPoly([DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof], asymFitDegree, *asymFitRange)
+    else:
+        for prof, poly in zip([DReneAsymSprof, DReneAsymCprof, SciAsymprof, CerAsymprof], stored):
+            AttachStoredPoly(prof, poly)
     # Get fitted function
-    fDReneAsymS = DReneAsymSprof.GetFunction("pol5")
-    fDReneAsymC = DReneAsymCprof.GetFunction("pol5")
-    fPMTSeneAsym = SciAsymprof.GetFunction("pol5")
-    fPMTCeneAsym = CerAsymprof.GetFunction("pol5")
+    fDReneAsymS = DReneAsymSprof.GetFunction("pol{0}".format(asymFitDegree))
+    fDReneAsymC = DReneAsymCprof.GetFunction("pol{0}".format(asymFitDegree))
+    fPMTSeneAsym = SciAsymprof.GetFunction("pol{0}".format(asymFitDegree))
+    fPMTCeneAsym = CerAsymprof.GetFunction("pol{0}".format(asymFitDegree))
 
     # Fit TDC with a straight line
     #DReneStdcProf.Fit("pol1", "", "", 620, 675)
@@ -230,49 +204,42 @@ def GetDFparametrization(run, Cut, filename, energy):
 
 
 
-def GetTDCProfiles(data, energy):
+def GetTDCProfiles(data, energy, stored=None):
+    # stored: the DR polynomials over TDC_TS11 and TDC_TC11 of the
+    # parametrisation store, as in GetDFparametrization
 
     # profile energy over TS11 or TC11 TDC information
-    DReneStdcProf = ROOT.TProfile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), 100, 600, 720)
-    DReneCtdcProf = ROOT.TProfile("DReneCtdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_DR/E".format(energy), 100, 600, 720)
-    ScieneStdcProf = ROOT.TProfile("ScieneStdcprof_{0}GeV".format(energy), r"S Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_S/E".format(energy), 100, 600, 720)
-    CereneCtdcProf = ROOT.TProfile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), 100, 600, 720)
+    DReneStdcProf = ROOT.TProfile("DReneStdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_DR/E".format(energy), *tdcProfBins)
+    DReneCtdcProf = ROOT.TProfile("DReneCtdcprof_{0}GeV".format(energy), r" DR Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_DR/E".format(energy), *tdcProfBins)
+    ScieneStdcProf = ROOT.TProfile("ScieneStdcprof_{0}GeV".format(energy), r"S Energy profile over TDC_TS11 {0}GeV; TDC_TS11 (adc); E_S/E".format(energy), *tdcProfBins)
+    CereneCtdcProf = ROOT.TProfile("CereneStdcprof_{0}GeV".format(energy), r"C Energy profile over TDC_TC11 {0}GeV; TDC_TC11 (adc); E_C/E".format(energy), *tdcProfBins)
 
     # Show reco energy Vs Asymmetry
     #SciAsymHist = ROOT.TH2D("ScivsAsymHist_{0}GeV".format(energy), "ScivsAsymHist_{0}GeV; TS24-TS21/TS24+TS21; totPMTSene".format(energy), 50, -1.5, 1.5, 50, 0., 2*energy)
     #CerAsymHist = ROOT.TH2D("CervsAsymHist_{0}GeV".format(energy), "CervsAsymHist_{0}GeV; TSC4-TC21/TC24+TC21; totPMTCene".format(energy), 50, -1.5, 1.5, 50, 0., 2*energy)
 
     # Fill profiles
-    for DRene, asymS,  asymC, tdcS, tdcC in zip(data["totDRene_cont"].values, data["AsymS"].values, data["AsymC"].values, data["TDC_TS11"].values, data["TDC_TC11"].values):
-        #if(asymS < 0.9 and asymS > -0.9 and asymC < 0.9 and asymC > -0.9):
-        #DReneAsymSprof.Fill(asymS, DRene/energy)
-        #DReneAsymCprof.Fill(asymC, DRene/energy)
-        if(tdcS > 512):
-            DReneStdcProf.Fill(tdcS, DRene/energy)
-        if(tdcC>512):
-            DReneCtdcProf.Fill(tdcC, DRene/energy)
-
-    for pmtS, pmtC, asymS, asymC, tdcS, tdcC  in zip(data["pmtS_cont"], data["pmtC_cont"], data["AsymS"], data["AsymC"], data["TDC_TS11"].values, data["TDC_TC11"].values):
-        #if(asymS < 0.9 and asymS > -0.9 and asymC < 0.9 and asymC > -0.9):
-        #SciAsymHist.Fill(asymS, pmtS)
-        #CerAsymHist.Fill(asymC, pmtC)
-        #SciAsymprof.Fill(asymS, pmtS/energy)
-        #CerAsymprof.Fill(asymC, pmtC/energy)
-        if(tdcS > 512):
-            ScieneStdcProf.Fill(tdcS, pmtS/energy)
-        if(tdcC>512):
-            CereneCtdcProf.Fill(tdcC, pmtC/energy)
+    tdcS = data["TDC_TS11"].values; tdcC = data["TDC_TC11"].values
+    FillROOT(DReneStdcProf, tdcS[tdcS > 512], data["totDRene_cont"].values[tdcS > 512]/energy)
+    FillROOT(DReneCtdcProf, tdcC[tdcC > 512], data["totDRene_cont"].values[tdcC > 512]/energy)
+
+    FillROOT(ScieneStdcProf, tdcS[tdcS > 512], data["pmtS_cont"].values[tdcS > 512]/energy)
+    FillROOT(CereneCtdcProf, tdcC[tdcC > 512], data["pmtC_cont"].values[tdcC > 512]/energy)
 
     # Fit TDC with a straight line
-    DReneStdcProf.Fit("pol1", "Q", "", 620, 675)
-    DReneCtdcProf.Fit("pol1", "Q", "", 620, 670)
-    ScieneStdcProf.Fit("pol1", "Q", "", 620, 675)
-    CereneCtdcProf.Fit("pol1", "Q", "", 620, 670)
+    # (all the profiles at once, each over its fit range)
+    if(stored is None):
+        FitPoly([DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf], tdcFitDegree,
+                [tdcFitRangeS[0], tdcFitRangeC[0], tdcFitRangeS[0], tdcFitRangeC[0]], [tdcFitRangeS[1], tdcFitRangeC[1], tdcFitRangeS[1], tdcFitRangeC[1]])
+    else:
+        for prof, poly in zip([DReneStdcProf, DReneCtdcProf], stored):
+            AttachStoredPoly(prof, poly)
+        FitPoly([ScieneStdcProf, CereneCtdcProf], tdcFitDegree, [tdcFitRangeS[0], tdcFitRangeC[0]], [tdcFitRangeS[1], tdcFitRangeC[1]])
     # Get fitted function
-    fDReneStdc = DReneStdcProf.GetFunction("pol1")
-    fDReneCtdc = DReneCtdcProf.GetFunction("pol1")
-    fScieneStdc = ScieneStdcProf.GetFunction("pol1")
-    fCereneCtdc = CereneCtdcProf.GetFunction("pol1")
+    fDReneStdc = DReneStdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fDReneCtdc = DReneCtdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fScieneStdc = ScieneStdcProf.GetFunction("pol{0}".format(tdcFitDegree))
+    fCereneCtdc = CereneCtdcProf.GetFunction("pol{0}".format(tdcFitDegree))
 
     # Get fitted function
     fDReneStdc.SetRange(600, 750)
@@ -326,11 +293,10 @@ def DrawEnergyHist(dfs, energies, binning_S, binning_C, varname_S, varname_C):
         histDRcorr = ROOT.TH1D("histDRcorr{0}".format(energy), "histDRcorr{0}; E [GeV]; Normalized Counts".format(energy), 160, 0., 160)
 
 
-        for varS, varC, varDR, varDRcorr in zip(df[varname_S], df[varname_C], df["totDRene"], df["totDRene_cont"]): 
-            histS.Fill(varS)
-            histC.Fill(varC)
-            histDR.Fill(varDR)
-            histDRcorr.Fill(varDRcorr)
+        FillROOT(histS, df[varname_S].values)
+        FillROOT(histC, df[varname_C].values)
+        FillROOT(histDR, df["totDRene"].values)
+        FillROOT(histDRcorr, df["totDRene_cont"].values)
 
         histS.SetLineColor(i+1)
         histC.SetLineColor(i+1)
@@ -411,8 +377,7 @@ def DrawFem(energy, eneS, eneC, labelS, labelC, title, outname):
     ROOT.gStyle.SetOptStat(0)
     cFem = ROOT.TCanvas(title, title, 1400, 1200)
     histfem = ROOT.TH2D("histfem{0}GeV".format(energy), "{3}, {0}GeV;{1}/E;{2}/E".format(energy, labelS, labelC, title), 50, 0., 1.5, 50, 0., 1.5)
-    for s, c in zip(eneS, eneC):
-        histfem.Fill(s/energy, c/energy)
+    FillROOT(histfem, np.asarray(eneS)/energy, np.asarray(eneC)/energy)
     histfem.Draw("colz")
     cFem.SaveAs("{0}{1}.png".format(outname, energy))
     ROOT.gStyle.SetOptStat(1)
@@ -462,6 +427,24 @@ def main():
     MeanVec_Comb=[]; RmsVec_Comb=[]; MeanErrVec_Comb=[]; RmsErrVec_Comb=[] 
     MeanVec_Comb_Asym=[]; RmsVec_Comb_Asym=[]; MeanErrVec_Comb_Asym=[]; RmsErrVec_Comb_Asym=[] 
     
+    # The 40 GeV asymmetry and 60 GeV TDC parametrisations are kept in the
+    # parametrisation store (TBAna_ParStore). They are looked up before the
+    # loop: if nothing changed, these profiles are not refitted and the stored
+    # functions are drawn on them; otherwise the new fits are saved after the loop
+    asymIndex = 1; tdcIndex = 2
+    parSettings = {"chi_value": chi_value, "containment": containment, "derivedVars": derivedVars, "normalisation": "energy",
+                   "asymProfBins": asymProfBins, "asymFit": (asymFitDegree, asymFitRange), "tdcSelection": (tdcRangeS11, tdcRangeC11),
+                   "tdcProfBins": tdcProfBins, "tdcFit": (tdcFitDegree, tdcFitRangeS, tdcFitRangeC)}
+    asymLabel = "TBAna_XGB asymmetry {0}GeV".format(energies[asymIndex])
+    asymKey = ParKey(infolder+"physics_sps2024_run" + runs[asymIndex] + ".root", myCut, parSettings)
+    asymPars = LoadPars(asymLabel, asymKey)
+    tdcLabel = "TBAna_XGB TDC {0}GeV".format(energies[tdcIndex])
+    tdcKey = ParKey(infolder+"physics_sps2024_run" + runs[tdcIndex] + ".root", myCut, parSettings)
+    tdcPars = LoadPars(tdcLabel, tdcKey)
+
+    # read the next run in the background while the current one is analysed
+    PrefetchDF([(infolder + "physics_sps2024_run" + run + ".root", myCut, derivedVars, readBranches) for run in runs])
+
     for index, (run, energy, cont) in enumerate(zip(runs, energies, exp_containment)):
         filename = "physics_sps2024_run" + run + ".root"
         #print(filename, energy, cont)
@@ -473,18 +456,22 @@ def main():
 
         #df = GetDFparametrization(run, CurrentCut, filename, energy)
         # read data and add asymmetry variable
-        df, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof,  fSciAsymProf, fCerAsymProf, SciAsymProf, CerAsymProf = GetDFparametrization(run, CurrentCut, filename, energy)
+        # the stored parametrisations of this run, if any, are not refitted
+        storedAsym = storedTdc = None
+        if(asymPars is not None and index == asymIndex):
+            storedAsym = [asymPars[name] for name in ["DRS_Asym", "DRC_Asym", "Sci_Asym", "Cer_Asym"]]
+        if(tdcPars is not None and index == tdcIndex):
+            storedTdc = [tdcPars[name] for name in ["DRS_Tdc", "DRC_Tdc"]]
+        df, fDReneAsymS, fDReneAsymC, DReneAsymSprof, DReneAsymCprof,  fSciAsymProf, fCerAsymProf, SciAsymProf, CerAsymProf = GetDFparametrization(run, CurrentCut, filename, energy, storedAsym)
 
 
         # clean events with TS11<100
         df = df[df["TDC_TS11"]>100]
-        df = df[df["TDC_TS11"]>645]
-        df = df[df["TDC_TS11"]<670]
-        df = df[df["TDC_TC11"]>630]
-        df = df[df["TDC_TC11"]<650]
+        df = df[(df["TDC_TS11"] > tdcRangeS11[0]) & (df["TDC_TS11"] < tdcRangeS11[1])]
+        df = df[(df["TDC_TC11"] > tdcRangeC11[0]) & (df["TDC_TC11"] < tdcRangeC11[1])]
 
         # plot TDC profiles and return
-        DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf, fDReneStdc, fDReneCtdc, fScieneStdc, fCereneCtdc = GetTDCProfiles(df, energy)
+        DReneStdcProf, DReneCtdcProf, ScieneStdcProf, CereneCtdcProf, fDReneStdc, fDReneCtdc, fScieneStdc, fCereneCtdc = GetTDCProfiles(df, energy, storedTdc)
 
 
 
@@ -525,8 +512,16 @@ def main():
         
 
     # comment since I'm only using 40 GeV parametrisation
+    # new fits (not in the store): saved as new versions
+    if(asymPars is None):
+        asymPars = {"DRS_Asym": PolyFromTF1(DReneAsymFitSvec[asymIndex]), "DRC_Asym": PolyFromTF1(DReneAsymFitCvec[asymIndex]),
+                    "Sci_Asym": PolyFromTF1(SciAsymFitvec[asymIndex]), "Cer_Asym": PolyFromTF1(CerAsymFitvec[asymIndex])}
+        SavePars(asymLabel, asymKey, asymPars, {"run": runs[asymIndex], "energy": energies[asymIndex], "cut": myCut, "settings": repr(parSettings)})
+    if(tdcPars is None):
+        tdcPars = {"DRS_Tdc": PolyFromTF1(DReneTdcFitSvec[tdcIndex]), "DRC_Tdc": PolyFromTF1(DReneTdcFitCvec[tdcIndex])}
+        SavePars(tdcLabel, tdcKey, tdcPars, {"run": runs[tdcIndex], "energy": energies[tdcIndex], "cut": myCut, "settings": repr(parSettings)})
     #fDRS20  = np.vectorize(DReneAsymFitS[0].Eval); fDRC20  = np.vectorize(DReneAsymFitC[0].Eval)
-    fDRS40  = np.vectorize(DReneAsymFitSvec[1].Eval); fDRC40  = np.vectorize(DReneAsymFitCvec[1].Eval)
+    fDRS40  = PolyFunction(asymPars["DRS_Asym"]); fDRC40  = PolyFunction(asymPars["DRC_Asym"])
     #fDRS60  = np.vectorize(DReneAsymFitS[2].Eval); fDRC60  = np.vectorize(DReneAsymFitC[2].Eval)
     #fDRS80  = np.vectorize(DReneAsymFitS[3].Eval); fDRC80  = np.vectorize(DReneAsymFitC[3].Eval)
     #fDRS100  = np.vectorize(DReneAsymFitS[4].Eval); fDRC100  = np.vectorize(DReneAsymFitC[4].Eval)
@@ -534,9 +529,9 @@ def main():
  
     
    
-    fSci40  = np.vectorize(SciAsymFitvec[1].Eval); fCer40  = np.vectorize(CerAsymFitvec[1].Eval)
+    fSci40  = PolyFunction(asymPars["Sci_Asym"]); fCer40  = PolyFunction(asymPars["Cer_Asym"])
 
-    fDReneStdc40  = np.vectorize(DReneTdcFitSvec[2].Eval); fDReneCtdc40  = np.vectorize(DReneTdcFitCvec[2].Eval)
+    fDReneStdc40  = PolyFunction(tdcPars["DRS_Tdc"]); fDReneCtdc40  = PolyFunction(tdcPars["DRC_Tdc"])
 
 
     binning_S = [0, 30, 60, 90]
@@ -648,26 +643,24 @@ def main():
         HistCombCorrected_tdc = ROOT.TH1D("HistDRene_TdcCorrected_{0}GeV".format(energy), r"(S-#chi C)/(1-#chi)/avg_containment (CorrectedTDC, {0}GeV); E [GeV]; Counts".format(energy), 100, energy-0.7*energy, energy+0.7*energy)
 
 
-        for pmtS, pmtC, eneDR_cont, eneDR_corrected in zip(data["pmtS_cont"].values, data["pmtC_cont"].values, data["totDRene_cont"].values, data["energyDR_TdcCorrected"]):
-            HistSraw.Fill(pmtS)
-            HistCraw.Fill(pmtC)
-            HistComb.Fill(eneDR_cont)
-            HistCombCorrected.Fill(eneDR_cont)
-            HistCombCorrected_tdc.Fill(eneDR_corrected)
+        FillROOT(HistSraw, data["pmtS_cont"].values)
+        FillROOT(HistCraw, data["pmtC_cont"].values)
+        FillROOT(HistComb, data["totDRene_cont"].values)
+        FillROOT(HistCombCorrected, data["totDRene_cont"].values)
+        FillROOT(HistCombCorrected_tdc, data["energyDR_TdcCorrected"].values)
 
-        for eneS, eneC, eneDR_corrected in zip(data_filtered["energyS_AsymCorrected"], data_filtered["energyC_AsymCorrected"], data_filtered["energyDR_AsymCorrected"]):
-            HistScorrected_Asymcut.Fill(eneS)
-            HistCcorrected_Asymcut.Fill(eneC)
-            HistCombCorrected_Asymcut.Fill(eneDR_corrected)
+        FillROOT(HistScorrected_Asymcut, data_filtered["energyS_AsymCorrected"].values)
+        FillROOT(HistCcorrected_Asymcut, data_filtered["energyC_AsymCorrected"].values)
+        FillROOT(HistCombCorrected_Asymcut, data_filtered["energyDR_AsymCorrected"].values)
 
 
         # Show reco energy Vs Asymmetry
         RecoEvsAsymSHist = ROOT.TH2D("RecoEvsAsymSHist_{0}GeV".format(energy), "RecoEvsAsymSHist_{0}GeV; TS24-TS21/TS24+TS21; Reco E_dr".format(energy), 50, -1.5, 1.5, 50, 0., 2*energy)
         RecoEvsAsymCHist = ROOT.TH2D("RecoEvsAsymCHist_{0}GeV".format(energy), "RecoEvsAsymCHist_{0}GeV; TSC4-TC21/TC24+TC21; Reco E_dr".format(energy), 50, -1.5, 1.5, 50, 0., 2*energy)
 
-        for recoE, ts24, ts21, tc24, tc21 in zip(data["totDRene_cont"].values, data["TS24"].values, data["TS21"].values, data["TC24"].values, data["TC21"].values):
-            RecoEvsAsymSHist.Fill(((ts24-ts21)/(ts24+ts21)), recoE)
-            RecoEvsAsymCHist.Fill(((ts24-ts21)/(tc24+tc21)), recoE)
+        ts24 = data["TS24"].values; ts21 = data["TS21"].values
+        FillROOT(RecoEvsAsymSHist, (ts24-ts21)/(ts24+ts21), data["totDRene_cont"].values)
+        FillROOT(RecoEvsAsymCHist, (ts24-ts21)/(data["TC24"].values+data["TC21"].values), data["totDRene_cont"].values)
         cAsymS = ROOT.TCanvas("cAsymS{}".format(energy), "cAsymS{}".format(energy), 1400, 1200)
         RecoEvsAsymSHist.Draw("colz")
         cAsymS.SaveAs("RecoEvsAysmS{0}GeV.png".format(energy))    
@@ -678,40 +671,10 @@ def main():
 
             
 
-        HistSraw.Fit("gaus", "Q")
-        totPMTSeneFit = HistSraw.GetFunction("gaus")
-        HistScorrected_Asymcut.Fit("gaus", "Q")
-        SeneFit = HistScorrected_Asymcut.GetFunction("gaus")
-
-        HistCraw.Fit("gaus", "Q")
-        HistCcorrected_Asymcut.Fit("gaus", "Q")
-        totPMTCeneFit = HistCraw.GetFunction("gaus")
-        CeneFit = HistCcorrected_Asymcut.GetFunction("gaus")
-
-        HistComb.Fit("gaus","Q")
-        DReneFit = HistComb.GetFunction("gaus")
-
-        HistCombCorrected.Fit("gaus","Q")
-        DReneFitCorrected = HistCombCorrected.GetFunction("gaus")
-
-        HistCombCorrected_Asymcut.Fit("gaus","Q")
-        DReneFitCorrected_Asymcut = HistCombCorrected_Asymcut.GetFunction("gaus")
-
-        HistCombCorrected_tdc.Fit("gaus","")
-        DReneFitCorrected_tdc = HistCombCorrected_tdc.GetFunction("gaus")
-
-
         ROOT.gStyle.SetOptFit(111)
-        # refit within -1.5 and +3 sigma
-        HistSraw.Fit("gaus", "Q", "", totPMTSeneFit.GetParameter(1)-1.5*totPMTSeneFit.GetParameter(2), totPMTSeneFit.GetParameter(1)+1.5*totPMTSeneFit.GetParameter(2)) 
-        HistCraw.Fit("gaus", "Q", "", totPMTCeneFit.GetParameter(1)-1.5*totPMTCeneFit.GetParameter(2), totPMTCeneFit.GetParameter(1)+1.5*totPMTCeneFit.GetParameter(2)) 
-        HistComb.Fit("gaus", "Q", "", DReneFit.GetParameter(1)-1.5*DReneFit.GetParameter(2), DReneFit.GetParameter(1)+1.5*DReneFit.GetParameter(2)) 
-        HistCombCorrected.Fit("gaus", "Q", "", DReneFitCorrected.GetParameter(1)-1.5*DReneFitCorrected.GetParameter(2), DReneFitCorrected.GetParameter(1)+1.5*DReneFitCorrected.GetParameter(2)) 
-        HistCombCorrected_Asymcut.Fit("gaus", "Q", "", DReneFitCorrected_Asymcut.GetParameter(1)-1.5*DReneFitCorrected_Asymcut.GetParameter(2), DReneFitCorrected_Asymcut.GetParameter(1)+1.5*DReneFitCorrected_Asymcut.GetParameter(2)) 
-        HistScorrected_Asymcut.Fit("gaus", "Q", "", SeneFit.GetParameter(1)-1.5*SeneFit.GetParameter(2), SeneFit.GetParameter(1)+1.5*SeneFit.GetParameter(2)) 
-        HistCcorrected_Asymcut.Fit("gaus", "Q", "", CeneFit.GetParameter(1)-1.5*CeneFit.GetParameter(2), CeneFit.GetParameter(1)+1.5*CeneFit.GetParameter(2)) 
-
-        HistCombCorrected_tdc.Fit("gaus", "Q", "", DReneFitCorrected_tdc.GetParameter(1)-1.5*DReneFitCorrected_tdc.GetParameter(2), DReneFitCorrected_tdc.GetParameter(1)+1.5*DReneFitCorrected_tdc.GetParameter(2)) 
+        # fit, then refit within -1.5 and +1.5 sigma (all the histograms at once)
+        FitGaus([HistSraw, HistScorrected_Asymcut, HistCraw, HistCcorrected_Asymcut,
+                 HistComb, HistCombCorrected, HistCombCorrected_Asymcut, HistCombCorrected_tdc], 1.5, 1.5)
 
 
 
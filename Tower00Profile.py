@@ -2,6 +2,7 @@ import pandas as pd
 import numpy as np
 import ROOT
 import uproot
+from TBAna_Hist import FillROOT
 
 
 ROOT.gStyle.SetOptStat(0)
@@ -81,16 +82,15 @@ def main():
             totEProf = ROOT.TProfile("totEProfRun{0}".format(colrun[index]), "T{1}ProfRun{0}{2}; {3} [mm]; E [GeV]".format(colrun[index], totE, colname, varProf), 30, min_bin, max_bin)
 
 
-            for datarow in data.itertuples(index=False):
-                t00Prof.Fill(getattr(datarow, varProf), getattr(datarow, t00))
-                t11Prof.Fill(getattr(datarow, varProf), getattr(datarow, t11))
-                t12Prof.Fill(getattr(datarow, varProf), getattr(datarow, t12))
-                t13Prof.Fill(getattr(datarow, varProf), getattr(datarow, t13))
-                t14Prof.Fill(getattr(datarow, varProf), getattr(datarow, t14))
-                t15Prof.Fill(getattr(datarow, varProf), getattr(datarow, t15))
-                t16Prof.Fill(getattr(datarow, varProf), getattr(datarow, t16))
-                t17Prof.Fill(getattr(datarow, varProf), getattr(datarow, t17))
-                totEProf.Fill(getattr(datarow, varProf), getattr(datarow, totE))
+            FillROOT(t00Prof, data[varProf].values, data[t00].values)
+            FillROOT(t11Prof, data[varProf].values, data[t11].values)
+            FillROOT(t12Prof, data[varProf].values, data[t12].values)
+            FillROOT(t13Prof, data[varProf].values, data[t13].values)
+            FillROOT(t14Prof, data[varProf].values, data[t14].values)
+            FillROOT(t15Prof, data[varProf].values, data[t15].values)
+            FillROOT(t16Prof, data[varProf].values, data[t16].values)
+            FillROOT(t17Prof, data[varProf].values, data[t17].values)
+            FillROOT(totEProf, data[varProf].values, data[totE].values)
 
 
             totEProf.SetLineWidth(2); totEProf.SetLineColor(ROOT.kAzure+1); totEProf.SetMarkerStyle(53);  totEProf.SetMarkerColor(ROOT.kAzure+1);  totEProf.SetMarkerSize(2) 
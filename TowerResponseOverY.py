@@ -3,6 +3,9 @@ import json
 import numpy as np
 import  pandas as pd 
 import  time
+from TBAna_Reader import ReadDF
+from TBAna_Hist import FillROOT
+from TBAna_Fit import FitGaus
 #INPUTDIR="/afs/cern.ch/user/i/ideadr/scratch/TB2024_H8/physicsNtuples/"
 INPUTDIR="/home/storage/data_apareti/TB24/EqualisationRuns/"
 
@@ -105,39 +108,25 @@ def main():
             HitTowProfCut = ROOT.TProfile("HitTowProfCut{0}".format(tow), "HitTowProfCut{0}".format(tow), 20, -20, 10)
 
 
-            file = ROOT.TFile.Open(rootfile)
-            tree = file.Get("Ftree")
-            file.cd()
+            # read the run once (only the branches used here) and apply the cut
+            # on all events at once, the profiles are filled from the arrays
+            adcvar = var0 + "_adc"
+            events = ReadDF(rootfile, cut, branches=[var0, varUp, varDown, varTotS, "YDWC2", adcvar])
+            ydwc2 = events["YDWC2"].to_numpy(dtype=np.float64)
+            tow0val = events[var0].to_numpy(dtype=np.float64)
+            towUpval = events[varUp].to_numpy(dtype=np.float64)
+            towDownval = events[varDown].to_numpy(dtype=np.float64)
+            totS = events[varTotS].to_numpy(dtype=np.float64)
             mean = 0
 
-            # array with energy content of each event
-            data = []
-
-            for i in range(tree.GetEntries()):
-                tree.GetEntry(i)
-                cut_formula = ROOT.TTreeFormula("cut", cut, tree)
-
-                tow0val = tree.GetLeaf(var0).GetValue()
-                towUpval = tree.GetLeaf(varUp).GetValue()
-                towDownval = tree.GetLeaf(varDown).GetValue()
-                totS = tree.GetLeaf(varTotS).GetValue()
-
-
-                ydwc2 = tree.GetLeaf("YDWC2").GetValue()
-                #print("\n value: ",value)
-                #value = getattr(tree, key)
+            FillROOT(towCenterProf, ydwc2, tow0val)
+            FillROOT(towUpProf, ydwc2, towUpval)
+            FillROOT(towDownProf, ydwc2, towDownval)
+            FillROOT(towSumProf, ydwc2, tow0val+towUpval+towDownval)
+            FillROOT(totSProf, ydwc2, totS)
 
-                if (cut_formula.EvalInstance()):
-                    towCenterProf.Fill(ydwc2, tow0val, 1) 
-                    towUpProf.Fill(ydwc2, towUpval, 1)
-                    towDownProf.Fill(ydwc2, towDownval, 1)
-                    towSumProf.Fill(ydwc2, tow0val+towUpval+towDownval, 1)
-                    totSProf.Fill(ydwc2, totS, 1)
-                    data.append(tow0val)
-
-                    #if(tow0val>8.):
-                    #    HitTowProfCut.Fill(ydwc2, tow0val)
-                    #if(ydwc2<0.1 and ydwc2>-1): print("YDWC2==0! TotS: ", totS, "\tYDWC2 value: ", ydwc2)
+            # array with energy content of each event
+            data = tow0val
 
             #x = smallestInterval(data)
             #interquantile = interquatile(data)
@@ -149,14 +138,9 @@ def main():
 
             print("\nData max: ", np.array(data).max(), "\tInterquantile: ",  x0, x1, x2)
 
-            for i in range(tree.GetEntries()):
-                tree.GetEntry(i)
-                cut_formula = ROOT.TTreeFormula("cut", cut, tree)
-                ydwc2 = tree.GetLeaf("YDWC2").GetValue()
-                tow0val = tree.GetLeaf(var0).GetValue()
-                if (cut_formula.EvalInstance() and tow0val>x1):
-                    HitTowProfCut.Fill(ydwc2, tow0val)
-                    #if(ydwc2<0.1 and ydwc2>-1): print("YDWC2==0! TotS: ", totS, "\tYDWC2 value: ", ydwc2)            
+            # Central tower profile, with low-energy events removed
+            hit = tow0val>x1
+            FillROOT(HitTowProfCut, ydwc2[hit], tow0val[hit])
 
 
             #enemin = np.percentile(x, 25)+(np.percentile(x, 75) - np.percentile(x, 25))/2 
@@ -181,7 +165,6 @@ def main():
             xlow = xmax - 8
             xhigh = xmax + 8
  
-            adcvar = var0 + "_adc"
             parabola = ROOT.TF1("parabola", "pol2", xlow, xhigh)
             HitTowProfCut.Fit(parabola, "Q", "", xlow, xhigh)
 
@@ -240,23 +223,12 @@ def main():
 
             adchist = ROOT.TH1F("adchist{0}".format(col[tow]), "adchist{0}".format(col[tow]), 512, 0., 4096)
 
-            for i in range(tree.GetEntries()):
-                tree.GetEntry(i)
-                cut_formula = ROOT.TTreeFormula("cut", cut, tree)
-
-                adc_val = tree.GetLeaf(adcvar).GetValue()
-                ydwc2 = tree.GetLeaf("YDWC2").GetValue()
-                #print("\n value: ",value)
-                #value = getattr(tree, key)
-
-                if (cut_formula.EvalInstance() and ydwc2>xlow and ydwc2<xhigh):
-                    adchist.Fill(adc_val)
+            inRange = (ydwc2>xlow) & (ydwc2<xhigh)
+            adcvals = events[adcvar].to_numpy(dtype=np.float64)[inRange]
+            FillROOT(adchist, adcvals)
 
-            adchist.Fit("gaus", "Q")
-            func = adchist.GetFunction("gaus")
-            mean = func.GetParameter(1)
-            rms = func.GetParameter(2)
-            adchist.Fit("gaus", "Q", "", mean-rms, mean+rms)
+            # gaussian fit over the whole range, then refit within mean +- sigma
+            FitGaus([adchist], 1., 1.)
             gaus2 = adchist.GetFunction("gaus")
             adcmax = gaus2.GetParameter(1)
 
@@ -274,7 +246,6 @@ def main():
 
 
 
-            file.Close()
             #time.sleep(10)
 
         